@@ -1,18 +1,24 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Query, Path, APIRouter
-from sqlalchemy.orm import Session, joinedload
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Query, Path, APIRouter, Request, Response
+from sqlalchemy import exc, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 from typing import List, Optional
-from app.gprmax_generator import generate_script
-from app.tasks import run_gprmax_simulation
+from app.gprmax_generator import generate_script_with_sizing
+from app.catalog import get_catalog
+from app import result_cache, cost_estimator, scheduler, result_slice, storage, preview, similarity, listing, statistics, health, search
+from app import bulk_upload as bulk_upload_engine
 from app.celery_app import celery_app
-import app.tasks
+from app.tasks import script_input_name
 from app import config_schema
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, FileResponse, StreamingResponse
 import json
 import csv
+import os
+import time
 import io
 
 from app import models, schemas
-from app.database import get_db
+from app.database import get_db, get_async_db, pool_status
 
 app = FastAPI(title="GPR Database API", version="1.0.0")
 router = APIRouter()
@@ -20,6 +26,20 @@ router = APIRouter()
 # Здесь собраны все API-запросы для работы с базой данных — создание, чтение, обновление и удаление записей
 
 
+def _list_fields(model, response_schema, fields: Optional[str]):
+    try:
+        return listing.select_fields(model, response_schema.model_fields, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _list_page(response: Response, objects, selected, limit: int):
+    # Пагинация по ключу: клиент передаёт X-Next-Cursor в cursor следующего запроса
+    cursor = listing.next_cursor(objects, limit)
+    if cursor is not None:
+        response.headers["X-Next-Cursor"] = str(cursor)
+    return listing.rows(objects, selected)
+
+
 # SoilType -------------------------------------------------------------------
 
 @router.post("/soil-types/", response_model=schemas.SoilTypeResponse)
@@ -36,27 +56,34 @@ def create_soil_type(soil_type: schemas.SoilTypeCreate, db: Session = Depends(ge
     db.refresh(db_soil_type)
     return db_soil_type
 
-@router.get("/soil-types/", response_model=List[schemas.SoilTypeResponse])
-def get_soil_types(
+@router.get("/soil-types/", response_model=List[schemas.SoilTypeListItem], response_model_exclude_unset=True)
+async def get_soil_types(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     name: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[int] = Query(None, description="id последней записи предыдущей страницы (заголовок X-Next-Cursor)"),
+    fields: Optional[str] = Query(None, description="Поля через запятую или all; по умолчанию — без тяжёлых колонок"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(models.SoilType)
+    query = select(models.SoilType)
     
     if name:
-        query = query.filter(models.SoilType.name.ilike(f"%{name}%"))
+        query = query.where(models.SoilType.name.ilike(f"%{name}%"))
     
-    soil_types = query.offset(skip).limit(limit).all()
-    return soil_types
+    selected = _list_fields(models.SoilType, schemas.SoilTypeResponse, fields)
+    query = listing.keyset(listing.project(query, models.SoilType, selected), models.SoilType, cursor, limit)
+    if cursor is None and skip:
+        query = query.offset(skip)
+    soil_types = (await db.scalars(query)).all()
+    return _list_page(response, soil_types, selected, limit)
 
 @router.get("/soil-types/{soil_type_id}", response_model=schemas.SoilTypeResponse)
-def get_soil_type(
+async def get_soil_type(
     soil_type_id: int = Path(..., gt=0),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    soil_type = db.query(models.SoilType).filter(models.SoilType.id == soil_type_id).first()
+    soil_type = await db.get(models.SoilType, soil_type_id)
     if not soil_type:
         raise HTTPException(status_code=404, detail="Soil type not found")
     return soil_type
@@ -136,30 +163,37 @@ def create_material(material: schemas.MaterialCreate, db: Session = Depends(get_
     db.refresh(db_material)
     return db_material
 
-@router.get("/materials/", response_model=List[schemas.MaterialResponse])
-def get_materials(
+@router.get("/materials/", response_model=List[schemas.MaterialListItem], response_model_exclude_unset=True)
+async def get_materials(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     name: Optional[str] = None,
     parent_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[int] = Query(None, description="id последней записи предыдущей страницы (заголовок X-Next-Cursor)"),
+    fields: Optional[str] = Query(None, description="Поля через запятую или all; по умолчанию — без тяжёлых колонок"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(models.Material)
+    query = select(models.Material)
     
     if name:
-        query = query.filter(models.Material.name.ilike(f"%{name}%"))
+        query = query.where(models.Material.name.ilike(f"%{name}%"))
     
     if parent_id:
-        query = query.filter(models.Material.material_id == parent_id)
+        query = query.where(models.Material.material_id == parent_id)
     else:
-        query = query.filter(models.Material.material_id == None)
+        query = query.where(models.Material.material_id == None)
     
-    materials = query.offset(skip).limit(limit).all()
-    return materials
+    selected = _list_fields(models.Material, schemas.MaterialResponse, fields)
+    query = listing.keyset(listing.project(query, models.Material, selected), models.Material, cursor, limit)
+    if cursor is None and skip:
+        query = query.offset(skip)
+    materials = (await db.scalars(query)).all()
+    return _list_page(response, materials, selected, limit)
 
 @router.get("/materials/{material_id}", response_model=schemas.MaterialResponse)
-def get_material(material_id: int, db: Session = Depends(get_db)):
-    material = db.query(models.Material).filter(models.Material.id == material_id).first()
+async def get_material(material_id: int, db: AsyncSession = Depends(get_async_db)):
+    material = await db.get(models.Material, material_id)
     if not material:
         raise HTTPException(status_code=404, detail="Material not found")
     return material
@@ -235,30 +269,36 @@ def create_target_type(target_type: schemas.TargetTypeCreate, db: Session = Depe
     db.refresh(db_target_type)
     return db_target_type
 
-@router.get("/target-types/", response_model=List[schemas.TargetTypeResponse])
-def get_target_types(
+@router.get("/target-types/", response_model=List[schemas.TargetTypeListItem], response_model_exclude_unset=True)
+async def get_target_types(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     name: Optional[str] = None,
     shape: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[int] = Query(None, description="id последней записи предыдущей страницы (заголовок X-Next-Cursor)"),
+    fields: Optional[str] = Query(None, description="Поля через запятую или all; по умолчанию — без тяжёлых колонок"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(models.TargetType).options(joinedload(models.TargetType.material))
+    # Связанный материал в ответ не входит, поэтому не подгружается
+    query = select(models.TargetType)
     
     if name:
-        query = query.filter(models.TargetType.name.ilike(f"%{name}%"))
+        query = query.where(models.TargetType.name.ilike(f"%{name}%"))
     
     if shape:
-        query = query.filter(models.TargetType.shape == shape)
+        query = query.where(models.TargetType.shape == shape)
     
-    target_types = query.offset(skip).limit(limit).all()
-    return target_types
+    selected = _list_fields(models.TargetType, schemas.TargetTypeResponse, fields)
+    query = listing.keyset(listing.project(query, models.TargetType, selected), models.TargetType, cursor, limit)
+    if cursor is None and skip:
+        query = query.offset(skip)
+    target_types = (await db.scalars(query)).all()
+    return _list_page(response, target_types, selected, limit)
 
 @router.get("/target-types/{target_type_id}", response_model=schemas.TargetTypeResponse)
-def get_target_type(target_type_id: int, db: Session = Depends(get_db)):
-    target_type = db.query(models.TargetType).options(
-        joinedload(models.TargetType.material)
-    ).filter(models.TargetType.id == target_type_id).first()
+async def get_target_type(target_type_id: int, db: AsyncSession = Depends(get_async_db)):
+    target_type = await db.get(models.TargetType, target_type_id)
     
     if not target_type:
         raise HTTPException(status_code=404, detail="Target type not found")
@@ -323,32 +363,39 @@ def create_antenna(antenna: schemas.AntennaCreate, db: Session = Depends(get_db)
     db.refresh(db_antenna)
     return db_antenna
 
-@router.get("/antennas/", response_model=List[schemas.AntennaResponse])
-def get_antennas(
+@router.get("/antennas/", response_model=List[schemas.AntennaListItem], response_model_exclude_unset=True)
+async def get_antennas(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     manufacturer: Optional[str] = None,
     min_frequency: Optional[float] = None,
     max_frequency: Optional[float] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[int] = Query(None, description="id последней записи предыдущей страницы (заголовок X-Next-Cursor)"),
+    fields: Optional[str] = Query(None, description="Поля через запятую или all; по умолчанию — без тяжёлых колонок"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(models.Antenna)
+    query = select(models.Antenna)
     
     if manufacturer:
-        query = query.filter(models.Antenna.manufacturer.ilike(f"%{manufacturer}%"))
+        query = query.where(models.Antenna.manufacturer.ilike(f"%{manufacturer}%"))
     
     if min_frequency:
-        query = query.filter(models.Antenna.frequency >= min_frequency)
+        query = query.where(models.Antenna.frequency >= min_frequency)
     
     if max_frequency:
-        query = query.filter(models.Antenna.frequency <= max_frequency)
+        query = query.where(models.Antenna.frequency <= max_frequency)
     
-    antennas = query.offset(skip).limit(limit).all()
-    return antennas
+    selected = _list_fields(models.Antenna, schemas.AntennaResponse, fields)
+    query = listing.keyset(listing.project(query, models.Antenna, selected), models.Antenna, cursor, limit)
+    if cursor is None and skip:
+        query = query.offset(skip)
+    antennas = (await db.scalars(query)).all()
+    return _list_page(response, antennas, selected, limit)
 
 @router.get("/antennas/{antenna_id}", response_model=schemas.AntennaResponse)
-def get_antenna(antenna_id: int, db: Session = Depends(get_db)):
-    antenna = db.query(models.Antenna).filter(models.Antenna.id == antenna_id).first()
+async def get_antenna(antenna_id: int, db: AsyncSession = Depends(get_async_db)):
+    antenna = await db.get(models.Antenna, antenna_id)
     if not antenna:
         raise HTTPException(status_code=404, detail="Antenna not found")
     return antenna
@@ -399,26 +446,31 @@ def create_pulse_type(pulse_type: schemas.PulseTypeCreate, db: Session = Depends
     db.refresh(db_pulse_type)
     return db_pulse_type
 
-@router.get("/pulse-types/", response_model=List[schemas.PulseTypeResponse])
-def get_pulse_types(
+@router.get("/pulse-types/", response_model=List[schemas.PulseTypeListItem], response_model_exclude_unset=True)
+async def get_pulse_types(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     waveform: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[int] = Query(None, description="id последней записи предыдущей страницы (заголовок X-Next-Cursor)"),
+    fields: Optional[str] = Query(None, description="Поля через запятую или all; по умолчанию — без тяжёлых колонок"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(models.PulseType)
+    query = select(models.PulseType)
     
     if waveform:
-        query = query.filter(models.PulseType.waveform == waveform)
+        query = query.where(models.PulseType.waveform == waveform)
     
-    pulse_types = query.offset(skip).limit(limit).all()
-    return pulse_types
+    selected = _list_fields(models.PulseType, schemas.PulseTypeResponse, fields)
+    query = listing.keyset(listing.project(query, models.PulseType, selected), models.PulseType, cursor, limit)
+    if cursor is None and skip:
+        query = query.offset(skip)
+    pulse_types = (await db.scalars(query)).all()
+    return _list_page(response, pulse_types, selected, limit)
 
 @router.get("/pulse-types/{pulse_type_id}", response_model=schemas.PulseTypeResponse)
-def get_pulse_type(pulse_type_id: int, db: Session = Depends(get_db)):
-    pulse_type = db.query(models.PulseType).filter(
-        models.PulseType.id == pulse_type_id
-    ).first()
+async def get_pulse_type(pulse_type_id: int, db: AsyncSession = Depends(get_async_db)):
+    pulse_type = await db.get(models.PulseType, pulse_type_id)
     if not pulse_type:
         raise HTTPException(status_code=404, detail="Pulse type not found")
     return pulse_type
@@ -482,36 +534,39 @@ def create_soil_boundary(
     db.refresh(db_soil_boundary)
     return db_soil_boundary
 
-@router.get("/soil-boundaries/", response_model=List[schemas.SoilBoundaryResponse])
-def get_soil_boundaries(
+@router.get("/soil-boundaries/", response_model=List[schemas.SoilBoundaryListItem], response_model_exclude_unset=True)
+async def get_soil_boundaries(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     soil_type_id: Optional[int] = None,
     min_angle: Optional[float] = None,
     max_angle: Optional[float] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[int] = Query(None, description="id последней записи предыдущей страницы (заголовок X-Next-Cursor)"),
+    fields: Optional[str] = Query(None, description="Поля через запятую или all; по умолчанию — без тяжёлых колонок"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(models.SoilBoundary).options(
-        joinedload(models.SoilBoundary.soil_type)
-    )
+    query = select(models.SoilBoundary)
     
     if soil_type_id:
-        query = query.filter(models.SoilBoundary.soil_type_id == soil_type_id)
+        query = query.where(models.SoilBoundary.soil_type_id == soil_type_id)
     
     if min_angle:
-        query = query.filter(models.SoilBoundary.angle >= min_angle)
+        query = query.where(models.SoilBoundary.angle >= min_angle)
     
     if max_angle:
-        query = query.filter(models.SoilBoundary.angle <= max_angle)
+        query = query.where(models.SoilBoundary.angle <= max_angle)
     
-    soil_boundaries = query.offset(skip).limit(limit).all()
-    return soil_boundaries
+    selected = _list_fields(models.SoilBoundary, schemas.SoilBoundaryResponse, fields)
+    query = listing.keyset(listing.project(query, models.SoilBoundary, selected), models.SoilBoundary, cursor, limit)
+    if cursor is None and skip:
+        query = query.offset(skip)
+    soil_boundaries = (await db.scalars(query)).all()
+    return _list_page(response, soil_boundaries, selected, limit)
 
 @router.get("/soil-boundaries/{boundary_id}", response_model=schemas.SoilBoundaryResponse)
-def get_soil_boundary(boundary_id: int, db: Session = Depends(get_db)):
-    soil_boundary = db.query(models.SoilBoundary).options(
-        joinedload(models.SoilBoundary.soil_type)
-    ).filter(models.SoilBoundary.id == boundary_id).first()
+async def get_soil_boundary(boundary_id: int, db: AsyncSession = Depends(get_async_db)):
+    soil_boundary = await db.get(models.SoilBoundary, boundary_id)
     
     if not soil_boundary:
         raise HTTPException(status_code=404, detail="Soil boundary not found")
@@ -581,51 +636,139 @@ def create_object_portrait(
     db.refresh(db_portrait)
     return db_portrait
 
-@router.get("/object-portraits/", response_model=List[schemas.ObjectPortraitResponse])
-def get_object_portraits(
+@router.get("/object-portraits/", response_model=List[schemas.ObjectPortraitListItem], response_model_exclude_unset=True)
+async def get_object_portraits(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     target_type_id: Optional[int] = None,
     soil_type_id: Optional[int] = None,
     antenna_id: Optional[int] = None,
     pulse_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[int] = Query(None, description="id последней записи предыдущей страницы (заголовок X-Next-Cursor)"),
+    fields: Optional[str] = Query(None, description="Поля через запятую или all; по умолчанию — без тяжёлых колонок"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(models.ObjectPortrait).options(
-        joinedload(models.ObjectPortrait.target_type),
-        joinedload(models.ObjectPortrait.soil_type),
-        joinedload(models.ObjectPortrait.antenna),
-        joinedload(models.ObjectPortrait.pulse)
-    )
+    # В ответ входят только внешние ключи, связанные записи не подгружаются
+    query = select(models.ObjectPortrait)
     
     if target_type_id:
-        query = query.filter(models.ObjectPortrait.target_type_id == target_type_id)
+        query = query.where(models.ObjectPortrait.target_type_id == target_type_id)
     
     if soil_type_id:
-        query = query.filter(models.ObjectPortrait.soil_type_id == soil_type_id)
+        query = query.where(models.ObjectPortrait.soil_type_id == soil_type_id)
     
     if antenna_id:
-        query = query.filter(models.ObjectPortrait.antenna_id == antenna_id)
+        query = query.where(models.ObjectPortrait.antenna_id == antenna_id)
     
     if pulse_id:
-        query = query.filter(models.ObjectPortrait.pulse_id == pulse_id)
+        query = query.where(models.ObjectPortrait.pulse_id == pulse_id)
     
-    portraits = query.offset(skip).limit(limit).all()
-    return portraits
+    selected = _list_fields(models.ObjectPortrait, schemas.ObjectPortraitResponse, fields)
+    query = listing.keyset(listing.project(query, models.ObjectPortrait, selected), models.ObjectPortrait, cursor, limit)
+    if cursor is None and skip:
+        query = query.offset(skip)
+    portraits = (await db.scalars(query)).all()
+    return _list_page(response, portraits, selected, limit)
 
 @router.get("/object-portraits/{portrait_id}", response_model=schemas.ObjectPortraitResponse)
-def get_object_portrait(portrait_id: int, db: Session = Depends(get_db)):
-    portrait = db.query(models.ObjectPortrait).options(
-        joinedload(models.ObjectPortrait.target_type),
-        joinedload(models.ObjectPortrait.soil_type),
-        joinedload(models.ObjectPortrait.antenna),
-        joinedload(models.ObjectPortrait.pulse)
-    ).filter(models.ObjectPortrait.id == portrait_id).first()
+async def get_object_portrait(portrait_id: int, db: AsyncSession = Depends(get_async_db)):
+    portrait = await db.get(models.ObjectPortrait, portrait_id)
     
     if not portrait:
         raise HTTPException(status_code=404, detail="Object portrait not found")
     return portrait
 
+@router.post("/object-portraits/match")
+def match_object_portraits(
+    file: UploadFile = File(..., description="Измеренный B-скан: HDF5 в формате gprMax или .npy (трассы × отсчёты)"),
+    top_k: int = Query(10, ge=1, le=100),
+    component: Optional[str] = Query(None),
+    target_type_id: Optional[int] = None,
+    soil_type_id: Optional[int] = None,
+    antenna_id: Optional[int] = None,
+    pulse_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Ближайшие по сигналу портреты библиотеки (косинусная близость сигнатур).
+    Обычный def: разбор файла (h5py/numpy) и запросы через синхронную сессию
+    выполняются в пуле потоков, а не в цикле событий.
+    """
+    started = time.perf_counter()
+    try:
+        bscan = similarity.read_upload(file.file, file.filename or "", component)
+        query_vector = similarity.signature(bscan)
+    except (OSError, KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Не удалось прочитать B-скан: {e}")
+
+    index = similarity.get_index(db)
+    candidate_ids = None
+    filters = {
+        "target_type_id": target_type_id,
+        "soil_type_id": soil_type_id,
+        "antenna_id": antenna_id,
+        "pulse_id": pulse_id,
+    }
+    if any(value is not None for value in filters.values()):
+        query = db.query(models.ObjectPortrait.id)
+        for column, value in filters.items():
+            if value is not None:
+                query = query.filter(getattr(models.ObjectPortrait, column) == value)
+        candidate_ids = [row.id for row in query]
+
+    matches = index.match(query_vector, top_k, candidate_ids)[0]
+    return {
+        "matches": similarity.portrait_details(db, matches),
+        "index_size": len(index),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+@router.post("/object-portraits/signatures/rebuild")
+def rebuild_portrait_signatures(limit: Optional[int] = Query(None, ge=1), db: Session = Depends(get_db)):
+    """Досчитать сигнатуры портретов, готовых до появления индекса"""
+    return similarity.index_missing(db, limit)
+
+def _portrait_preview(portrait_id: int, db: Session):
+    portrait = db.query(models.ObjectPortrait).get(portrait_id)
+    if not portrait:
+        raise HTTPException(status_code=404, detail="Object portrait not found")
+    if not portrait.result_file_path or not os.path.isfile(portrait.result_file_path):
+        raise HTTPException(status_code=404, detail="Результат портрета ещё не готов")
+    return preview.PreviewEntry(portrait.result_file_path)
+
+def _preview_headers(etag: str):
+    # Превью неизменно, пока не изменился файл результата
+    return {"ETag": f'"{etag}"', "Cache-Control": "public, max-age=3600"}
+
+def _not_modified(request: Request, etag: str) -> bool:
+    return request.headers.get("if-none-match") in (f'"{etag}"', f'W/"{etag}"')
+
+@router.get("/object-portraits/{portrait_id}/preview")
+def get_object_portrait_preview(portrait_id: int, request: Request, db: Session = Depends(get_db)):
+    """PNG-миниатюра B-скана портрета"""
+    entry = _portrait_preview(portrait_id, db)
+    if _not_modified(request, entry.etag):
+        return Response(status_code=304, headers=_preview_headers(entry.etag))
+    return FileResponse(path=str(entry.thumbnail()), media_type="image/png", headers=_preview_headers(entry.etag))
+
+@router.get("/object-portraits/{portrait_id}/preview/tiles")
+def get_object_portrait_tiles(portrait_id: int, db: Session = Depends(get_db)):
+    """Описание пирамиды тайлов: уровни, число тайлов, порог амплитуды"""
+    return _portrait_preview(portrait_id, db).meta
+
+@router.get("/object-portraits/{portrait_id}/preview/tiles/{level}/{tx}/{ty}.png")
+def get_object_portrait_tile(portrait_id: int, level: int, tx: int, ty: int, request: Request,
+                             db: Session = Depends(get_db)):
+    entry = _portrait_preview(portrait_id, db)
+    if _not_modified(request, entry.etag):
+        return Response(status_code=304, headers=_preview_headers(entry.etag))
+    try:
+        tile_path = entry.tile(level, tx, ty)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return FileResponse(path=str(tile_path), media_type="image/png", headers=_preview_headers(entry.etag))
+
 @router.put("/object-portraits/{portrait_id}", response_model=schemas.ObjectPortraitResponse)
 def update_object_portrait(
     portrait_id: int,
@@ -675,126 +818,33 @@ def delete_object_portrait(portrait_id: int, db: Session = Depends(get_db)):
 # bulk-upload (для всех сущностей) ----------------------------------------------------------
 
 @router.post("/bulk-upload/")
-async def bulk_upload(file: UploadFile = File(...), db: Session = Depends(get_db)):
+def bulk_upload(
+    file: UploadFile = File(...),
+    skip_invalid: bool = Query(False, description="Сохранить корректные записи, если часть записей с ошибками"),
+    db: Session = Depends(get_db)
+):
+    """
+    Загрузка JSON {"soil_types": [...], "materials": [...], ...} одной транзакцией.
+    Файл разбирается потоково, записи вставляются пачками (app/bulk_upload.py).
+    Ошибки — по записям; без skip_invalid любая ошибка отменяет всю загрузку.
+    """
     try:
-        content = await file.read()
-        data = json.loads(content)
-        bulk_data = schemas.BulkUpload(**data)
-        
-        results = {}
-        
-        if bulk_data.soil_types:
-            for soil_type in bulk_data.soil_types:
-                db_soil_type = models.SoilType(**soil_type.dict())
-                db.add(db_soil_type)
-            db.commit()
-            results["soil_types"] = f"Added {len(bulk_data.soil_types)} soil types"
-        
-        if bulk_data.materials:
-            for material in bulk_data.materials:
-                if material.material_id:
-                    parent = db.query(models.Material).filter(
-                        models.Material.id == material.material_id
-                    ).first()
-                    if not parent:
-                        raise HTTPException(
-                            status_code=400, 
-                            detail=f"Parent material {material.material_id} not found"
-                        )
-                
-                db_material = models.Material(**material.dict())
-                db.add(db_material)
-            db.commit()
-            results["materials"] = f"Added {len(bulk_data.materials)} materials"
-
-        if bulk_data.target_types:
-            for target_type in bulk_data.target_types:
-                if target_type.material_id:
-                    material = db.query(models.Material).filter(
-                        models.Material.id == target_type.material_id
-                    ).first()
-                    if not material:
-                        raise HTTPException(
-                            status_code=400, 
-                            detail=f"Material {target_type.material_id} not found"
-                        )
-                
-                db_target_type = models.TargetType(**target_type.dict())
-                db.add(db_target_type)
-            db.commit()
-            results["target_types"] = f"Added {len(bulk_data.target_types)} target types"
-
-        if bulk_data.antennas:
-            for antenna in bulk_data.antennas:
-                db_antenna = models.Antenna(**antenna.dict())
-                db.add(db_antenna)
-            db.commit()
-            results["antennas"] = f"Added {len(bulk_data.antennas)} antennas"
-
-        if bulk_data.pulse_types:
-            for pulse_type in bulk_data.pulse_types:
-                db_pulse_type = models.PulseType(**pulse_type.dict())
-                db.add(db_pulse_type)
-            db.commit()
-            results["pulse_types"] = f"Added {len(bulk_data.pulse_types)} pulse types"
-
-        if bulk_data.soil_boundaries:
-            for boundary in bulk_data.soil_boundaries:
-                soil_type = db.query(models.SoilType).filter(
-                    models.SoilType.id == boundary.soil_type_id
-                ).first()
-                if not soil_type:
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"Soil type {boundary.soil_type_id} not found"
-                    )
-                
-                db_boundary = models.SoilBoundary(**boundary.dict())
-                db.add(db_boundary)
-            db.commit()
-            results["soil_boundaries"] = f"Added {len(bulk_data.soil_boundaries)} soil boundaries"
-
-        if bulk_data.object_portraits:
-            for portrait in bulk_data.object_portraits:
-                checks = [
-                    (models.TargetType, portrait.target_type_id, "Target type"),
-                    (models.SoilType, portrait.soil_type_id, "Soil type"),
-                    (models.Antenna, portrait.antenna_id, "Antenna"),
-                    (models.PulseType, portrait.pulse_id, "Pulse type"),
-                ]
-                
-                for model, id_value, name in checks:
-                    if not db.query(model).filter(model.id == id_value).first():
-                        raise HTTPException(
-                            status_code=400, 
-                            detail=f"{name} {id_value} not found"
-                        )
-                
-                db_portrait = models.ObjectPortrait(**portrait.dict())
-                db.add(db_portrait)
-            db.commit()
-            results["object_portraits"] = f"Added {len(bulk_data.object_portraits)} object portraits"
-        
-        return {
-            "message": "Bulk upload completed successfully",
-            "results": results,
-            "total_records": sum(len(lst) for lst in [
-                bulk_data.soil_types or [],
-                bulk_data.materials or [],
-                bulk_data.target_types or [],
-                bulk_data.antennas or [],
-                bulk_data.pulse_types or [],
-                bulk_data.soil_boundaries or [],
-                bulk_data.object_portraits or []
-            ])
-        }
-    
-    except HTTPException:
-        db.rollback()
-        raise
-    except Exception as e:
-        db.rollback()
+        report = bulk_upload_engine.load(db, file.file, skip_invalid=skip_invalid)
+    except bulk_upload_engine.BulkRejected as e:
+        raise HTTPException(status_code=400, detail={
+            "message": "Bulk upload rejected, nothing was saved",
+            **{key: e.report[key] for key in ("failed", "errors", "errors_truncated")},
+        })
+    except bulk_upload_engine.BulkFormatError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except exc.IntegrityError as e:
+        raise HTTPException(status_code=409, detail=f"Bulk upload rolled back: {str(e.orig).splitlines()[0]}")
+
+    return {
+        "message": "Bulk upload completed successfully" if not report["failed"] else "Bulk upload completed with errors",
+        "results": {section: f"Added {count} {section.replace('_', ' ')}" for section, count in report["inserted"].items()},
+        **report,
+    }
 
 # CVS Добавление ---------------------------------------------------------------
 
@@ -867,65 +917,45 @@ async def import_csv(
 # Эндпоинты для статистики и поиска ----------------------------------
 
 @router.get("/statistics/")
-def get_statistics(db: Session = Depends(get_db)):
-    """Получение статистики по всем сущностям"""
-    stats = {
-        "soil_types": db.query(models.SoilType).count(),
-        "materials": db.query(models.Material).count(),
-        "target_types": db.query(models.TargetType).count(),
-        "antennas": db.query(models.Antenna).count(),
-        "pulse_types": db.query(models.PulseType).count(),
-        "soil_boundaries": db.query(models.SoilBoundary).count(),
-        "object_portraits": db.query(models.ObjectPortrait).count(),
-    }
-    
+def get_statistics(response: Response, db: Session = Depends(get_db)):
+    """
+    Статистика: записи в справочниках, скрипты по статусам, прогресс по кампаниям.
+    Один запрос к БД, результат кэшируется на GPRMAX_STATISTICS_TTL_SEC (app/statistics.py).
+    """
+    stats = statistics.get_statistics(db)
+    age = time.time() - stats["collected_at"]
+    response.headers["Cache-Control"] = f"max-age={max(0, int(statistics.STATISTICS_TTL_SEC - age))}"
     return {
         "message": "Database statistics",
-        "statistics": stats,
-        "total": sum(stats.values())
+        **stats,
+        "age_sec": round(age, 3),
     }
 
 @router.get("/search/")
 def search_entities(
-    query: str = Query(..., min_length=2),
+    query: Optional[str] = Query(None, min_length=2),
+    entity: Optional[str] = Query(None, description="Сущности через запятую: soil_types, materials, target_types, object_portraits"),
+    epsilon_min: Optional[float] = None,
+    epsilon_max: Optional[float] = None,
+    sigma_min: Optional[float] = None,
+    sigma_max: Optional[float] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
     db: Session = Depends(get_db)
 ):
-    """Поиск по всем сущностям"""
-    results = {}
-
-    soil_results = db.query(models.SoilType).filter(
-        models.SoilType.name.ilike(f"%{query}%") |
-        models.SoilType.description.ilike(f"%{query}%")
-    ).limit(10).all()
-    if soil_results:
-        results["soil_types"] = [
-            {"id": s.id, "name": s.name, "description": s.description[:100] if s.description else ""}
-            for s in soil_results
-        ]
-
-    material_results = db.query(models.Material).filter(
-        models.Material.name.ilike(f"%{query}%")
-    ).limit(10).all()
-    if material_results:
-        results["materials"] = [
-            {"id": m.id, "name": m.name}
-            for m in material_results
-        ]
-
-    target_results = db.query(models.TargetType).filter(
-        models.TargetType.name.ilike(f"%{query}%")
-    ).limit(10).all()
-    if target_results:
-        results["target_types"] = [
-            {"id": t.id, "name": t.name, "shape": t.shape}
-            for t in target_results
-        ]
-    
-    return {
-        "query": query,
-        "results": results,
-        "total_results": sum(len(r) for r in results.values())
-    }
+    """
+    Поиск по грунтам, материалам, типам целей и портретам: текст и/или диапазоны
+    epsilon/sigma (например, грунты с 10 ≤ ε ≤ 20). Результаты ранжированы по
+    совпадению текста; индексы — миграция 0005, подробности в app/search.py.
+    """
+    ranges = {"epsilon": (epsilon_min, epsilon_max), "sigma": (sigma_min, sigma_max)}
+    if not query and all(value == (None, None) for value in ranges.values()):
+        raise HTTPException(status_code=400, detail="Нужен query или диапазон epsilon/sigma")
+    entities = [e.strip() for e in entity.split(",") if e.strip()] if entity else search.ENTITIES
+    try:
+        return search.search(db, query, entities, ranges, limit=limit, offset=offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # Health check и корневой эндпоинт ------------------------------
 
@@ -950,31 +980,32 @@ def read_root():
         }
     }
 
+@router.get("/livez")
+def liveness():
+    """Процесс API жив (без обращения к БД и другим зависимостям)"""
+    return {"status": "alive"}
+
+@router.get("/readyz")
+def readiness(response: Response):
+    """Готовность принимать запросы: БД (SELECT 1 через пул), брокер Redis, том результатов"""
+    result = health.readiness()
+    if not result["ready"]:
+        response.status_code = 503
+    return result
+
 @router.get("/health/")
-def health_check(db: Session = Depends(get_db)):
-    """Проверка работоспособности API и БД"""
+def health_check():
+    """Проверка работоспособности API и БД (подсчёт строк — в /admin/diagnostics)"""
     try:
-        from sqlalchemy import text
-        db.execute(text("SELECT 1"))
-
-        tables = [
-            "soil_types", "materials", "target_types", 
-            "antennas", "pulse_types", "soil_boundaries", "object_portraits"
-        ]
-        
-        counts = {}
-        for table in tables:
-            count = db.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
-            counts[table] = count
-        
-        return {
-            "status": "healthy",
-            "database": "connected",
-            "table_counts": counts
-        }
-    
+        health.check_database()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Health check failed: {str(e)}")
+    return {"status": "healthy", "database": "connected"}
+
+@router.get("/metrics")
+def get_metrics():
+    """Пулы соединений с БД этого процесса API: выдачи, ожидание свободного соединения, таймауты"""
+    return {"pid": os.getpid(), "db_pools": pool_status()}
     
 @router.post("/seed")
 def seed_db(db: Session = Depends(get_db)):
@@ -987,22 +1018,74 @@ def generate_script_endpoint(
     config: config_schema.SimulationConfig,
     db: Session = Depends(get_db)
 ):
-    script_content = generate_script(config, db)
+    script_content, sizing = generate_script_with_sizing(config, get_catalog(db))
     db_script = models.Script(
         name=config.name,
         description=config.description,
         config_json=config.dict(),
         script_content=script_content,
-        status="generated"
+        status="generated",
+        content_hash=result_cache.content_hash(script_content, config.dict()),
+        solver_version=result_cache.SOLVER_VERSION,
+        cell_count=sizing["cell_count"],
+        iteration_count=sizing["iteration_count"]
     )
     db.add(db_script)
     db.commit()
     db.refresh(db_script)
     return db_script
 
-@router.get("/scripts/{script_id}", response_model=schemas.ScriptResponse)
-def get_script(script_id: int, db: Session = Depends(get_db)):
+@router.get("/scripts/cost")
+def get_scripts_cost(
+    status: Optional[str] = None,
+    campaign: Optional[str] = None,
+    name: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Суммарная оценка стоимости для набора скриптов (фильтры как у /scripts/)"""
+    calibration = cost_estimator.get_calibration(db)
+    query = db.query(models.Script)
+    if status:
+        query = query.filter(models.Script.status == status)
+    if campaign:
+        query = query.filter(models.Script.campaign == campaign)
+    if name:
+        query = query.filter(models.Script.name.ilike(f"%{name}%"))
+
+    estimates = []
+    failed = []
+    for script in query.yield_per(1000):
+        try:
+            estimates.append(cost_estimator.estimate_script(script, calibration))
+        except (KeyError, ValueError) as e:
+            failed.append({"script_id": script.id, "error": str(e)})
+    return {
+        "calibration": calibration.to_dict(),
+        "summary": cost_estimator.aggregate(estimates),
+        "not_estimated": failed
+    }
+
+@router.get("/scripts/cost/calibration")
+def get_cost_calibration(refresh: bool = False, db: Session = Depends(get_db)):
+    """Калибровка оценщика по фактическому времени выполненных задач"""
+    return cost_estimator.get_calibration(db, refresh=refresh).to_dict()
+
+@router.get("/scripts/{script_id}/cost")
+def get_script_cost(script_id: int, db: Session = Depends(get_db)):
     script = db.query(models.Script).get(script_id)
+    if not script:
+        raise HTTPException(status_code=404, detail="Script not found")
+    try:
+        estimate = cost_estimator.estimate_script(script, cost_estimator.get_calibration(db))
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Cannot estimate script cost: {e}")
+    if script.runtime_sec is not None:
+        estimate["measured_runtime_sec"] = script.runtime_sec
+    return estimate
+
+@router.get("/scripts/{script_id}", response_model=schemas.ScriptResponse)
+async def get_script(script_id: int, db: AsyncSession = Depends(get_async_db)):
+    script = await db.get(models.Script, script_id)
     if not script:
         raise HTTPException(status_code=404, detail="Script not found")
     return script
@@ -1018,30 +1101,56 @@ def download_script(script_id: int, db: Session = Depends(get_db)):
         headers={"Content-Disposition": f"attachment; filename=script_{script_id}.in"}
     )
 
+@router.post("/simulate/batch")
+def simulate_batch(request: schemas.SimulationBatchRequest, db: Session = Depends(get_db)):
+    """
+    Пакетный запуск (например, целой кампании): задачи отправляются
+    в порядке убывания оценки времени и распределяются по очередям.
+    """
+    if not request.script_ids and not request.campaign:
+        raise HTTPException(status_code=400, detail="Specify script_ids or campaign")
+    query = db.query(models.Script).filter(models.Script.status.in_(scheduler.RUNNABLE_STATUSES))
+    if request.script_ids:
+        query = query.filter(models.Script.id.in_(request.script_ids))
+    if request.campaign:
+        query = query.filter(models.Script.campaign == request.campaign)
+    return scheduler.submit_batch(db, query.all())
+
 @router.post("/simulate/{script_id}")
-def simulate_script(script_id: int, db: Session = Depends(get_db)):
+def simulate_script(
+    script_id: int,
+    trace_chunks: int = Query(1, ge=1, le=256, description="Число частей B-скана для параллельного запуска"),
+    db: Session = Depends(get_db)
+):
     script = db.query(models.Script).filter(models.Script.id == script_id).first()
     if not script:
         raise HTTPException(status_code=404, detail="Script not found")
-    if script.status not in ["generated", "failed"]:
+    if script.status not in scheduler.RUNNABLE_STATUSES:
         raise HTTPException(status_code=400, detail=f"Script cannot be run, status: {script.status}")
 
-    task = run_gprmax_simulation.delay(script_id)
-    
-    script.status = "pending"
-    script.celery_task_id = task.id
+    # Идентичный входной файл уже посчитан или считается — не запускаем повторно,
+    # иначе задача уходит в очередь по оценке стоимости
+    response = scheduler.submit_script(db, script, trace_chunks=trace_chunks)
     db.commit()
+    return response
 
-    return {"task_id": task.id, "script_id": script_id}
+@router.get("/result-cache/report")
+def get_result_cache_report(campaign: Optional[str] = None, db: Session = Depends(get_db)):
+    """Сколько часов решателя сэкономил кэш результатов (по кампаниям)"""
+    return result_cache.cache_report(db, campaign)
 
 @router.get("/tasks/{task_id}")
 def get_task_status(task_id: str):
     task = celery_app.AsyncResult(task_id)
-    return {
+    response = {
         "task_id": task_id,
         "status": task.status,
         "result": task.result if task.ready() else None
     }
+    if task.status == "PROGRESS" and isinstance(task.info, dict):
+        # Процент выполнения и ETA публикует задача по выводу gprMax
+        response["progress"] = task.info
+    return response
 
 @router.get("/antennas/plastram/info")
 def get_plastram_info():
@@ -1062,74 +1171,163 @@ def get_plastram_info():
         "notes": "Аппроксимация антенной bowtie в gprMax. Для точного моделирования требуется геометрия."
     }
 
-@router.get("/scripts/{script_id}/download-result")
-def download_result(script_id: int, db: Session = Depends(get_db)):
+def _completed_result_dir(script_id: int, db: Session):
     script = db.query(models.Script).get(script_id)
     if not script or script.status != "completed":
         raise HTTPException(status_code=404, detail="Результат не найден или ещё не готов")
+    # Для кэшированных результатов — папка исходного скрипта
+    source_id = script.result_source_id or script_id
+    return storage.result_dir(source_id), source_id
+
+def _parse_range(range_header: str, size: int):
+    """Один диапазон из заголовка Range: (start, end) включительно; None — отдать файл целиком."""
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # bytes=-N — последние N байт
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+def _iter_file(file_path, start: int, length: int, block_size: int = 256 * 1024):
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(block_size, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
 
-    # Ищем файл .h5 или .out в папке результатов
-    result_dir = Path(f"./results/{script_id}")
-    if not result_dir.exists():
-        raise HTTPException(status_code=404, detail="Папка с результатами не найдена")
-
-    h5_files = list(result_dir.glob("*.h5"))
-    out_files = list(result_dir.glob("*.out"))
-    if h5_files:
-        file_path = h5_files[0]
-    elif out_files:
-        file_path = out_files[0]
-    else:
+@router.get("/scripts/{script_id}/download-result")
+def download_result(script_id: int, request: Request, db: Session = Depends(get_db)):
+    result_dir, _ = _completed_result_dir(script_id, db)
+    file_path = result_slice.find_result_file(result_dir)
+    if file_path is None:
         raise HTTPException(status_code=404, detail="Файл результата отсутствует")
 
+    # Поддержка HTTP Range: просмотрщик может докачивать файл частями
+    range_header = request.headers.get("range")
+    if range_header:
+        size = file_path.stat().st_size
+        byte_range = _parse_range(range_header, size)
+        if byte_range:
+            start, end = byte_range
+            return StreamingResponse(
+                _iter_file(file_path, start, end - start + 1),
+                status_code=206,
+                media_type="application/octet-stream",
+                headers={
+                    "Content-Range": f"bytes {start}-{end}/{size}",
+                    "Content-Length": str(end - start + 1),
+                    "Accept-Ranges": "bytes",
+                    "Content-Disposition": f'attachment; filename="{file_path.name}"',
+                },
+            )
+
     return FileResponse(
         path=str(file_path),
         media_type="application/octet-stream",
-        filename=file_path.name
+        filename=file_path.name,
+        headers={"Accept-Ranges": "bytes"}
     )
 
-@router.get("/debug/db-check")
-def debug_db_check(db: Session = Depends(get_db)):
-    """Отладка: проверка подключения к БД"""
-    from sqlalchemy import text
-    
-    # Получаем имя текущей базы данных
-    db_name = db.execute(text("SELECT current_database()")).scalar()
-    
-    # Прямые запросы через SQL
-    sql_counts = {}
-    for table in ["soil_types", "materials", "target_types", "antennas", "pulse_types"]:
-        count = db.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
-        sql_counts[table] = count
-    
-    # Запросы через SQLAlchemy ORM
-    orm_counts = {
-        "soil_types": db.query(models.SoilType).count(),
-        "materials": db.query(models.Material).count(),
-        "target_types": db.query(models.TargetType).count(),
-        "antennas": db.query(models.Antenna).count(),
-        "pulse_types": db.query(models.PulseType).count(),
-    }
-    
-    return {
-        "database": db_name,
-        "sql_counts": sql_counts,
-        "orm_counts": orm_counts,
-    }
+@router.get("/scripts/{script_id}/result/slice")
+def get_result_slice(
+    script_id: int,
+    component: Optional[str] = Query(None, description="Компонента поля (Ex..Hz), по умолчанию первая сохранённая E"),
+    rx: str = Query("rx1"),
+    first_trace: Optional[int] = Query(None, ge=0),
+    last_trace: Optional[int] = Query(None, ge=0, description="Последняя трасса включительно"),
+    trace_step: int = Query(1, ge=1),
+    t_start: Optional[float] = Query(None, ge=0, description="Начало временного окна, с"),
+    t_end: Optional[float] = Query(None, ge=0, description="Конец временного окна, с"),
+    decimate: int = Query(1, ge=1, description="Прореживание по времени"),
+    product: str = Query("raw", pattern="^(raw|processed)$", description="Исходный или обработанный результат"),
+    db: Session = Depends(get_db)
+):
+    """
+    Часть результата: сырые float32 little-endian (трассы × отсчёты, по строкам).
+    Форма и шкалы — в заголовках X-Shape, X-Dtype, X-Dt, X-T0, X-First-Trace, X-Trace-Step.
+    """
+    result_dir, source_id = _completed_result_dir(script_id, db)
+    try:
+        data, meta = result_slice.read_slice(
+            result_dir, script_input_name(source_id), rx=rx, component=component,
+            first_trace=first_trace, last_trace=last_trace, trace_step=trace_step,
+            t_start=t_start, t_end=t_end, decimate=decimate, product=product,
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"{rx}: {e.args[0]}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/scripts/", response_model=List[schemas.ScriptResponse])
-def get_scripts(
+    return Response(
+        content=data.tobytes(),
+        media_type="application/octet-stream",
+        headers={
+            "X-Shape": f"{meta['shape'][0]},{meta['shape'][1]}",
+            "X-Dtype": meta["dtype"],
+            "X-Component": meta["component"],
+            "X-Dt": repr(meta["dt"]),
+            "X-T0": repr(meta["t0"]),
+            "X-First-Trace": str(meta["first_trace"]),
+            "X-Trace-Step": str(meta["trace_step"]),
+            "X-Traces-Total": str(meta["traces_total"]),
+            "X-Samples-Total": str(meta["samples_total"]),
+        },
+    )
+
+@router.get("/admin/diagnostics")
+def admin_diagnostics(response: Response, refresh: bool = False, db: Session = Depends(get_db)):
+    """
+    Диагностика: имя БД, ревизия схемы, число строк по таблицам, скрипты по статусам,
+    пулы соединений, место на томе результатов. Кэшируется (GPRMAX_DIAGNOSTICS_TTL_SEC);
+    refresh=true пересчитывает, но не чаще GPRMAX_DIAGNOSTICS_MIN_INTERVAL_SEC.
+    """
+    try:
+        result = health.diagnostics(db, refresh=refresh)
+    except health.RateLimited as e:
+        raise HTTPException(status_code=429, detail=str(e),
+                            headers={"Retry-After": str(int(e.retry_after) + 1)})
+    response.headers["Cache-Control"] = "no-store"
+    return dict(result, age_sec=round(time.time() - result["collected_at"], 3))
+
+@router.get("/scripts/", response_model=List[schemas.ScriptListItem], response_model_exclude_unset=True)
+async def get_scripts(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[int] = Query(None, description="id последней записи предыдущей страницы (заголовок X-Next-Cursor)"),
+    fields: Optional[str] = Query(None, description="Поля через запятую или all; по умолчанию — без тяжёлых колонок"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Получить список сгенерированных скриптов с пагинацией.
+    Получить список сгенерированных скриптов с пагинацией (новые первыми).
     Можно отфильтровать по статусу (generated, pending, running, completed, failed).
+    Следующая страница — cursor из заголовка X-Next-Cursor; текст скрипта, config_json
+    и error возвращаются только по запросу: fields=all или fields=id,status,script_content.
     """
-    query = db.query(models.Script)
+    query = select(models.Script)
     if status:
-        query = query.filter(models.Script.status == status)
-    scripts = query.order_by(models.Script.id.desc()).offset(skip).limit(limit).all()
-    return scripts
\ No newline at end of file
+        query = query.where(models.Script.status == status)
+    selected = _list_fields(models.Script, schemas.ScriptResponse, fields)
+    query = listing.keyset(listing.project(query, models.Script, selected), models.Script, cursor, limit, descending=True)
+    if cursor is None and skip:
+        query = query.offset(skip)
+    scripts = (await db.scalars(query)).all()
+    return _list_page(response, scripts, selected, limit)
\ No newline at end of file
@@ -0,0 +1,119 @@
+import re
+from pathlib import Path
+from typing import List, Optional
+
+import h5py
+import numpy as np
+
+# Сборка выходных файлов gprMax (по одному .out на трассу) в один HDF5-файл
+# B-скана: для каждого приёмника и компоненты поля — непрерывный массив
+# (трассы × отсчёты), координаты трасс и dt — в атрибутах.
+# После проверки собранного файла исходные файлы трасс удаляются.
+
+MERGED_FILENAME = "bscan.h5"
+LAYOUT = "traces x samples"
+FORMAT_VERSION = 1
+
+# Целевой размер чанка HDF5: достаточно большой для чтения по времени
+# и небольшой по числу трасс, чтобы чтение одной трассы не тянуло весь файл
+CHUNK_TRACES = 32
+CHUNK_TARGET_BYTES = 256 * 1024
+
+
+def trace_files(result_dir: Path, stem: str) -> List[Path]:
+    """Файлы трасс {stem}{n}.out по возрастанию n (или единственный {stem}.out)."""
+    pattern = re.compile(re.escape(stem) + r"(\d*)\.out$")
+    numbered = []
+    for path in result_dir.glob(f"{stem}*.out"):
+        match = pattern.match(path.name)
+        if match:
+            numbered.append((int(match.group(1) or 1), path))
+    return [path for _, path in sorted(numbered)]
+
+
+def chunk_shape(traces: int, samples: int, itemsize: int):
+    rows = min(traces, CHUNK_TRACES)
+    cols = max(1, min(samples, CHUNK_TARGET_BYTES // (rows * itemsize)))
+    return rows, cols
+
+
+def merge_bscan(files: List[Path], output_path: Path, remove_sources: bool = True) -> Path:
+    """Собрать файлы трасс в один HDF5; исходники удаляются только после проверки."""
+    if not files:
+        raise FileNotFoundError("Нет файлов трасс для сборки B-скана")
+    traces = len(files)
+    tmp_path = output_path.with_suffix(output_path.suffix + ".tmp")
+
+    with h5py.File(files[0], "r") as first:
+        samples = int(first.attrs["Iterations"])
+        dt = float(first.attrs["dt"])
+        receivers = sorted(first["rxs"].keys(), key=lambda name: int(name[2:]))
+        components = {rx: sorted(first["rxs"][rx].keys()) for rx in receivers}
+        dtypes = {rx: {c: first["rxs"][rx][c].dtype for c in components[rx]} for rx in receivers}
+        root_attrs = {k: v for k, v in first.attrs.items()}
+
+    with h5py.File(tmp_path, "w") as out:
+        for key, value in root_attrs.items():
+            out.attrs[key] = value
+        out.attrs["traces"] = traces
+        out.attrs["samples"] = samples
+        out.attrs["dt"] = dt
+        out.attrs["layout"] = LAYOUT
+        out.attrs["bscan_format"] = FORMAT_VERSION
+        out.attrs["source_files"] = [f.name for f in files]
+
+        datasets = {}
+        for rx in receivers:
+            group = out.create_group(f"rxs/{rx}")
+            for comp in components[rx]:
+                dtype = dtypes[rx][comp]
+                datasets[(rx, comp)] = group.create_dataset(
+                    comp, shape=(traces, samples), dtype=dtype,
+                    chunks=chunk_shape(traces, samples, dtype.itemsize),
+                )
+        rx_positions = {rx: np.zeros((traces, 3)) for rx in receivers}
+        src_positions = np.full((traces, 3), np.nan)
+
+        for i, path in enumerate(files):
+            with h5py.File(path, "r") as f:
+                if int(f.attrs["Iterations"]) != samples:
+                    raise ValueError(f"{path.name}: другое число итераций")
+                for rx in receivers:
+                    rx_positions[rx][i] = f["rxs"][rx].attrs.get("Position", (np.nan,) * 3)
+                    for comp in components[rx]:
+                        datasets[(rx, comp)][i, :] = f["rxs"][rx][comp][()]
+                if "srcs/src1" in f:
+                    src_positions[i] = f["srcs/src1"].attrs.get("Position", (np.nan,) * 3)
+
+        for rx in receivers:
+            out["rxs"][rx].attrs["positions"] = rx_positions[rx]
+        out.attrs["src_positions"] = src_positions
+
+    verify_bscan(files, tmp_path)
+    tmp_path.replace(output_path)
+
+    if remove_sources:
+        for path in files:
+            path.unlink()
+    return output_path
+
+
+def verify_bscan(files: List[Path], merged_path: Path):
+    """Поэлементное сравнение собранного файла с исходными трассами."""
+    with h5py.File(merged_path, "r") as merged:
+        if int(merged.attrs["traces"]) != len(files):
+            raise ValueError("Число трасс в собранном файле не совпадает")
+        for i, path in enumerate(files):
+            with h5py.File(path, "r") as f:
+                for rx in f["rxs"]:
+                    for comp in f["rxs"][rx]:
+                        if not np.array_equal(merged["rxs"][rx][comp][i, :], f["rxs"][rx][comp][()]):
+                            raise ValueError(f"{path.name}: {rx}/{comp} не совпадает после сборки")
+
+
+def merge_result_dir(result_dir: Path, stem: str) -> Optional[Path]:
+    """Собрать B-скан в папке результатов; None, если файлов трасс нет."""
+    files = trace_files(result_dir, stem)
+    if not files:
+        return None
+    return merge_bscan(files, result_dir / MERGED_FILENAME)
@@ -0,0 +1,296 @@
+import codecs
+import json
+import os
+import time
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.catalog import bump_catalog_version, invalidate_catalog
+
+# Загрузка справочников и портретов из одного JSON-файла (/bulk-upload/).
+# Файл читается потоково: разбирается по одной записи, в памяти — только
+# текущая пачка, поэтому размер файла не ограничен памятью процесса.
+# Внешние ключи пачки проверяются одним запросом IN на таблицу, записи
+# вставляются многострочными INSERT по BATCH_SIZE, всё — в одной транзакции.
+# Ошибки проверки относятся к конкретной записи (раздел и номер в массиве).
+#
+# Разделы обрабатываются в порядке следования в файле, ссылаться можно на
+# записи из БД и из разделов выше по файлу.
+#
+# Вставка идёт через Core, мимо сессии ORM, поэтому версия справочников
+# (app/catalog.py) увеличивается явно в той же транзакции, а снимок процесса
+# сбрасывается после коммита. Таблицу поиска search_fts на SQLite
+# поддерживают триггеры БД (миграция 0005).
+#
+# Переменные окружения:
+#   GPRMAX_BULK_BATCH_SIZE  — записей в одном INSERT (по умолчанию 1000)
+#   GPRMAX_BULK_MAX_ERRORS  — сколько ошибок возвращать в ответе (по умолчанию 1000)
+
+BATCH_SIZE = int(os.getenv("GPRMAX_BULK_BATCH_SIZE", "1000"))
+MAX_ERRORS = int(os.getenv("GPRMAX_BULK_MAX_ERRORS", "1000"))
+
+READ_CHUNK = 1 << 20
+# Запись больше этого размера считается испорченным JSON (буфер не растёт без границ)
+MAX_RECORD_CHARS = 16 << 20
+NUMBER_LOOKAHEAD = 64
+
+# Раздел файла -> (модель, схема записи, {поле: модель, на которую ссылается})
+SECTIONS = {
+    "soil_types": (models.SoilType, schemas.SoilTypeCreate, {}),
+    "materials": (models.Material, schemas.MaterialCreate, {"material_id": models.Material}),
+    "target_types": (models.TargetType, schemas.TargetTypeCreate, {"material_id": models.Material}),
+    "antennas": (models.Antenna, schemas.AntennaCreate, {}),
+    "pulse_types": (models.PulseType, schemas.PulseTypeCreate, {}),
+    "soil_boundaries": (models.SoilBoundary, schemas.SoilBoundaryCreate, {"soil_type_id": models.SoilType}),
+    "object_portraits": (models.ObjectPortrait, schemas.ObjectPortraitCreate, {
+        "target_type_id": models.TargetType,
+        "soil_type_id": models.SoilType,
+        "antenna_id": models.Antenna,
+        "pulse_id": models.PulseType,
+    }),
+}
+
+
+# Уникальные колонки: проверяются так же, как внешние ключи, до вставки.
+# Транзакция одна, без точек сохранения, поэтому нарушение ограничения
+# на вставке отменяет всю загрузку.
+UNIQUE = {"soil_types": ("name",)}
+
+
+class BulkFormatError(ValueError):
+    """Файл не является JSON-объектом вида {"раздел": [записи], ...}."""
+
+
+class BulkRejected(Exception):
+    """Есть ошибочные записи, а режим загрузки — всё или ничего; транзакция отменена."""
+
+    def __init__(self, report: Dict[str, Any]):
+        super().__init__(f"Ошибок в записях: {report['failed']}")
+        self.report = report
+
+
+class JsonStream:
+    """Потоковый разбор JSON верхнего уровня {"ключ": [значение, ...], ...}."""
+
+    def __init__(self, source: BinaryIO, chunk_size: int = READ_CHUNK):
+        self._source = source
+        self._chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._offset = 0  # символов отброшено из начала буфера
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._source.read(self._chunk_size)
+        self._eof = not chunk
+        self._offset += self._pos
+        self._buffer = self._buffer[self._pos:] + self._decoder.decode(chunk or b"", final=self._eof)
+        self._pos = 0
+        return True
+
+    def _error(self, message: str) -> BulkFormatError:
+        return BulkFormatError(f"{message} (символ {self._offset + self._pos})")
+
+    def _peek(self) -> str:
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if not char or char not in chars:
+            raise self._error(f"Ожидалось {' или '.join(repr(c) for c in chars)}, получено {char or 'конец файла'!r}")
+        self._pos += 1
+        return char
+
+    def _value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                if len(self._buffer) - self._pos > MAX_RECORD_CHARS or not self._fill():
+                    raise self._error(f"Некорректный JSON: {e.msg}")
+                continue
+            # Число у конца буфера могло оборваться на границе чтения ("-1" из "-1.5e10") — дочитать
+            if end + NUMBER_LOOKAHEAD > len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def sections(self) -> Iterator[Tuple[str, Iterator[Any]]]:
+        """Пары (ключ, записи массива); записи раздела нужно прочитать до следующего ключа."""
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            if not isinstance(key, str):
+                raise self._error("Ожидался ключ раздела")
+            self._expect(":")
+            if self._peek() == "[":
+                self._pos += 1
+                records = self._items()
+                yield key, records
+                for _ in records:  # раздел, который не дочитали
+                    pass
+            else:
+                value = self._value()
+                if value is not None:
+                    raise self._error(f"Раздел {key} должен быть массивом")
+                yield key, iter(())
+            if self._expect(",}") == "}":
+                break
+        if self._peek():
+            raise self._error("Лишние данные после JSON-объекта")
+
+    def _items(self) -> Iterator[Any]:
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._expect(",]") == "]":
+                return
+
+
+class _Loader:
+    def __init__(self, db: Session, batch_size: int):
+        self.db = db
+        self.batch_size = batch_size
+        self.inserted: Dict[str, int] = {}
+        self.errors: List[Dict[str, Any]] = []
+        self.failed = 0
+        self.ignored: List[str] = []
+        # id, уже найденные в БД, по таблицам — повторно не запрашиваются
+        self._known_ids: Dict[Any, Set[int]] = {}
+        # Значения уникальных колонок, занятые в БД или в этой загрузке
+        self._taken: Dict[Tuple[Any, str], Set[Any]] = {}
+
+    def error(self, section: str, index: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"section": section, "index": index, "error": message})
+
+    def load_section(self, section: str, records: Iterator[Any]):
+        if section not in SECTIONS:
+            self.ignored.append(section)
+            return
+        schema = SECTIONS[section][1]
+        self.inserted.setdefault(section, 0)
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+        for index, record in enumerate(records):
+            try:
+                if not isinstance(record, dict):
+                    raise ValueError("запись должна быть объектом")
+                batch.append((index, schema.model_validate(record).model_dump()))
+            except ValidationError as e:
+                self.error(section, index, "; ".join(
+                    f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+                ))
+            except ValueError as e:
+                self.error(section, index, str(e))
+            if len(batch) >= self.batch_size:
+                self._flush(section, batch)
+                batch = []
+        if batch:
+            self._flush(section, batch)
+
+    def _missing_ids(self, target, ids: Set[int]) -> Set[int]:
+        known = self._known_ids.setdefault(target, set())
+        unknown = ids - known
+        if unknown:
+            found = set(self.db.scalars(select(target.id).where(target.id.in_(unknown))))
+            known.update(found)
+            unknown -= found
+        return unknown
+
+    def _taken_values(self, model, field: str, values: Set[Any]) -> Set[Any]:
+        taken = self._taken.setdefault((model, field), set())
+        unknown = values - taken
+        if unknown:
+            column = getattr(model, field)
+            taken.update(self.db.scalars(select(column).where(column.in_(unknown))))
+        return taken
+
+    def _flush(self, section: str, batch: List[Tuple[int, Dict[str, Any]]]):
+        model, _, references = SECTIONS[section]
+        rejected: Set[int] = set()
+        for field, target in references.items():
+            ids = {row[field] for _, row in batch if row.get(field) is not None}
+            missing = self._missing_ids(target, ids) if ids else set()
+            for index, row in batch:
+                if row.get(field) in missing:
+                    rejected.add(index)
+                    self.error(section, index, f"{field}: {target.__tablename__} {row[field]} не найден")
+        for field in UNIQUE.get(section, ()):
+            values = {row[field] for index, row in batch if index not in rejected}
+            taken = self._taken_values(model, field, values)
+            for index, row in batch:
+                if index in rejected:
+                    continue
+                if row[field] in taken:
+                    rejected.add(index)
+                    self.error(section, index, f"{field}: {row[field]!r} уже существует")
+                else:
+                    # Повтор в самом файле тоже нарушит уникальность
+                    taken.add(row[field])
+        rows = [row for index, row in batch if index not in rejected]
+        if rows:
+            # Core-вставка на соединении сессии: без ORM-обработки каждой строки
+            self.db.connection().execute(insert(model.__table__), rows)
+            self.inserted[section] += len(rows)
+
+    def report(self, started: float) -> Dict[str, Any]:
+        # Ошибки проверки схемы пишутся раньше ошибок ссылок той же пачки — упорядочить по записям
+        order = {section: i for i, section in enumerate(self.inserted)}
+        self.errors.sort(key=lambda e: (order[e["section"]], e["index"]))
+        return {
+            "inserted": self.inserted,
+            "total_records": sum(self.inserted.values()),
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "ignored_sections": self.ignored,
+            "duration_sec": round(time.perf_counter() - started, 3),
+        }
+
+
+def load(db: Session, source: BinaryIO, skip_invalid: bool = False,
+         batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Загрузить файл source (бинарный поток JSON) в одной транзакции.
+    Если есть ошибочные записи: skip_invalid=False — откат и BulkRejected,
+    skip_invalid=True — остальные записи сохраняются, ошибки — в отчёте.
+    Испорченный JSON — BulkFormatError, откат всегда.
+    """
+    started = time.perf_counter()
+    loader = _Loader(db, batch_size or BATCH_SIZE)
+    try:
+        for section, records in JsonStream(source).sections():
+            loader.load_section(section, records)
+        report = loader.report(started)
+        if loader.failed and not skip_invalid:
+            raise BulkRejected(report)
+        if report["total_records"]:
+            bump_catalog_version(db)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    if report["total_records"]:
+        invalidate_catalog()
+    return report
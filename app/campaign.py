@@ -0,0 +1,213 @@
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.catalog import CatalogSnapshot
+from app.gprmax_generator import generate_script_with_sizing
+from app.result_cache import SOLVER_VERSION, content_hash
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Движок генерации кампаний: рендер скриптов в пуле процессов
+# и запись в БД пачками (COPY на PostgreSQL, многострочный INSERT в остальных БД).
+# Повторный запуск той же кампании пропускает уже записанные скрипты.
+
+DEFAULT_CHUNK_SIZE = 500
+
+# Колонки, которые заполняет генератор (порядок важен для COPY)
+SCRIPT_COLUMNS = ["name", "description", "config_json", "script_content",
+                  "created_at", "status", "campaign", "content_hash", "solver_version",
+                  "cell_count", "iteration_count"]
+
+# Комбинация кампании: (имя скрипта, аргументы для build_config)
+Combination = Tuple[str, Dict[str, Any]]
+
+_worker_catalog: Optional[CatalogSnapshot] = None
+_worker_build_config: Optional[Callable] = None
+
+
+def _init_worker(catalog: CatalogSnapshot, build_config: Callable):
+    global _worker_catalog, _worker_build_config
+    _worker_catalog = catalog
+    _worker_build_config = build_config
+
+
+def _render_chunk(campaign: str, chunk: List[Combination]) -> Tuple[List[dict], List[Tuple[str, str]]]:
+    """Собрать конфигурации и отрендерить скрипты одной пачки (выполняется в воркере)."""
+    rows, errors = [], []
+    for name, kwargs in chunk:
+        try:
+            config = _worker_build_config(**kwargs)
+            script_content, sizing = generate_script_with_sizing(config, _worker_catalog)
+            config_json = config.model_dump()
+            rows.append({
+                "name": config.name,
+                "description": config.description,
+                "config_json": config_json,
+                "script_content": script_content,
+                "created_at": datetime.utcnow(),
+                "status": "generated",
+                "campaign": campaign,
+                "content_hash": content_hash(script_content, config_json, SOLVER_VERSION),
+                "solver_version": SOLVER_VERSION,
+                "cell_count": sizing["cell_count"],
+                "iteration_count": sizing["iteration_count"],
+            })
+        except Exception as e:
+            errors.append((name, str(e)))
+    return rows, errors
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def memory_usage_mb() -> Optional[float]:
+    """Пиковый RSS текущего процесса в МБ (None, если недоступно)."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def existing_script_names(db: Session, campaign: str) -> set:
+    rows = db.query(models.Script.name).filter(models.Script.campaign == campaign).all()
+    return {row[0] for row in rows}
+
+
+def _copy_rows(db: Session, rows: List[dict]):
+    """Запись пачки через COPY ... FROM STDIN (PostgreSQL)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([
+            row["name"],
+            row["description"],
+            json.dumps(row["config_json"], ensure_ascii=False),
+            row["script_content"],
+            row["created_at"].isoformat(),
+            row["status"],
+            row["campaign"],
+            row["content_hash"],
+            row["solver_version"],
+            row["cell_count"],
+            row["iteration_count"],
+        ])
+    buf.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {models.Script.__tablename__} ({', '.join(SCRIPT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buf,
+        )
+    finally:
+        cursor.close()
+
+
+def insert_scripts(db: Session, rows: List[dict]):
+    """Записать пачку скриптов одной операцией и закоммитить её."""
+    if not rows:
+        return
+    if db.get_bind().dialect.name == "postgresql":
+        _copy_rows(db, rows)
+    else:
+        db.execute(insert(models.Script.__table__), rows)
+    db.commit()
+
+
+def print_progress(done: int, total: int, skipped: int, failed: int, elapsed: float):
+    rate = done / elapsed if elapsed > 0 else 0.0
+    mem = memory_usage_mb()
+    mem_str = f", память {mem:.0f} МБ" if mem is not None else ""
+    print(f" {done + skipped}/{total} (новых {done}, пропущено {skipped}, ошибок {failed}) "
+          f"— {rate:.0f} скр/с{mem_str}")
+
+
+def generate_campaign(
+    db: Session,
+    campaign: str,
+    combinations: Iterable[Combination],
+    build_config: Callable,
+    catalog: CatalogSnapshot,
+    total: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: Optional[int] = None,
+    progress: Callable = print_progress,
+) -> Dict[str, Any]:
+    """
+    Сгенерировать скрипты кампании.
+
+    build_config(**kwargs) должен возвращать SimulationConfig и быть функцией
+    верхнего уровня модуля (передаётся в пул процессов). Комбинации, имя которых
+    уже есть в кампании, пропускаются — прерванный запуск можно просто повторить.
+    """
+    workers = workers or os.cpu_count() or 1
+    done = set(existing_script_names(db, campaign))
+    skipped = 0
+
+    def pending():
+        nonlocal skipped
+        for name, kwargs in combinations:
+            if name in done:
+                skipped += 1
+                continue
+            done.add(name)
+            yield name, kwargs
+
+    saved = 0
+    errors: List[Tuple[str, str]] = []
+    started = time.time()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(catalog, build_config)) as executor:
+        in_flight = []
+        chunks = _chunks(pending(), chunk_size)
+        exhausted = False
+        # Ограниченное окно задач, чтобы не держать в памяти всю кампанию
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                in_flight.append(executor.submit(_render_chunk, campaign, chunk))
+            if not in_flight:
+                break
+            rows, chunk_errors = in_flight.pop(0).result()
+            insert_scripts(db, rows)
+            saved += len(rows)
+            errors.extend(chunk_errors)
+            if progress:
+                progress(saved, total or saved + skipped, skipped, len(errors), time.time() - started)
+
+    elapsed = time.time() - started
+    return {
+        "campaign": campaign,
+        "saved": saved,
+        "skipped": skipped,
+        "failed": len(errors),
+        "errors": errors,
+        "elapsed_sec": round(elapsed, 2),
+        "scripts_per_sec": round(saved / elapsed, 1) if elapsed > 0 else None,
+        "peak_memory_mb": memory_usage_mb(),
+    }
@@ -0,0 +1,210 @@
+import copy
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Optional, Union
+
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Снимок справочников (грунты, материалы, цели, антенны, импульсы) в памяти.
+# Загружается одним запросом на таблицу и используется генератором скриптов,
+# чтобы генерация целой кампании не делала SQL-запросов на каждый скрипт.
+#
+# Снимок кэшируется в процессе. Актуальность проверяется по таблице
+# catalog_version: запись в справочники через ORM (или bulk_upload) в той же
+# транзакции увеличивает номер, и перед выдачей снимка get_catalog сверяет его
+# с номером снимка одним запросом по первичному ключу. Так правка через один
+# воркер API видна остальным воркерам и Celery. Изменения в обход приложения
+# (SQL вручную) номер не меняют — после них нужен bump_catalog_version.
+
+SoilTypeRecord = namedtuple("SoilTypeRecord", ["id", "name", "description", "parameters"])
+MaterialRecord = namedtuple("MaterialRecord", ["id", "name", "material_id", "parameters"])
+TargetTypeRecord = namedtuple("TargetTypeRecord", ["id", "name", "shape", "material_id", "dimensions"])
+AntennaRecord = namedtuple("AntennaRecord", ["id", "name", "frequency", "manufacturer", "parameters"])
+PulseTypeRecord = namedtuple("PulseTypeRecord", ["id", "name", "waveform", "parameters"])
+
+CATALOG_TABLES = {
+    "soil_types": (models.SoilType, SoilTypeRecord),
+    "materials": (models.Material, MaterialRecord),
+    "target_types": (models.TargetType, TargetTypeRecord),
+    "antennas": (models.Antenna, AntennaRecord),
+    "pulse_types": (models.PulseType, PulseTypeRecord),
+}
+
+CATALOG_MODELS = tuple(model for model, _ in CATALOG_TABLES.values())
+
+
+class CatalogSnapshot:
+    """Неизменяемый снимок справочников с номером версии."""
+
+    __slots__ = ("version", "loaded_at", "_tables")
+
+    def __init__(self, tables: Dict[str, Dict[int, tuple]], version: int, loaded_at: float):
+        object.__setattr__(self, "_tables", tables)
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "loaded_at", loaded_at)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("CatalogSnapshot is immutable")
+
+    def __reduce__(self):
+        # Снимок передаётся в пул процессов генератора кампаний
+        return (CatalogSnapshot, (self._tables, self.version, self.loaded_at))
+
+    def _get(self, table: str, item_id: Optional[int]):
+        if item_id is None:
+            return None
+        return self._tables[table].get(item_id)
+
+    def soil_type(self, soil_type_id):
+        return self._get("soil_types", soil_type_id)
+
+    def material(self, material_id):
+        return self._get("materials", material_id)
+
+    def target_type(self, target_type_id):
+        return self._get("target_types", target_type_id)
+
+    def antenna(self, antenna_id):
+        return self._get("antennas", antenna_id)
+
+    def pulse(self, pulse_id):
+        return self._get("pulse_types", pulse_id)
+
+    def find_by_name(self, table: str, name: str):
+        """Поиск записи по имени (первое совпадение по возрастанию id)."""
+        for item_id in sorted(self._tables[table]):
+            record = self._tables[table][item_id]
+            if record.name == name:
+                return record
+        return None
+
+    def counts(self) -> Dict[str, int]:
+        return {table: len(rows) for table, rows in self._tables.items()}
+
+
+class SessionCatalog:
+    """Тот же интерфейс, что и у CatalogSnapshot, но с чтением напрямую из сессии."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _get(self, model, record_cls, item_id):
+        if item_id is None:
+            return None
+        obj = self.db.get(model, item_id)
+        if obj is None:
+            return None
+        return record_cls(*(getattr(obj, field) for field in record_cls._fields))
+
+    def soil_type(self, soil_type_id):
+        return self._get(models.SoilType, SoilTypeRecord, soil_type_id)
+
+    def material(self, material_id):
+        return self._get(models.Material, MaterialRecord, material_id)
+
+    def target_type(self, target_type_id):
+        return self._get(models.TargetType, TargetTypeRecord, target_type_id)
+
+    def antenna(self, antenna_id):
+        return self._get(models.Antenna, AntennaRecord, antenna_id)
+
+    def pulse(self, pulse_id):
+        return self._get(models.PulseType, PulseTypeRecord, pulse_id)
+
+
+CatalogSource = Union[Session, CatalogSnapshot, SessionCatalog]
+
+CATALOG_VERSION_ID = 1
+
+_lock = threading.Lock()
+_cached: Optional[CatalogSnapshot] = None
+
+
+def catalog_version(db: Session) -> int:
+    """Номер версии справочников из БД (общий для всех процессов)."""
+    version = db.execute(
+        select(models.CatalogVersion.version).where(models.CatalogVersion.id == CATALOG_VERSION_ID)
+    ).scalar()
+    return version or 0
+
+
+def bump_catalog_version(db: Session):
+    """Увеличить номер версии в текущей транзакции (вызывается до коммита записи)."""
+    # Core на соединении сессии: вызывается и из события after_flush
+    table = models.CatalogVersion.__table__
+    connection = db.connection()
+    result = connection.execute(
+        update(table).where(table.c.id == CATALOG_VERSION_ID).values(version=table.c.version + 1)
+    )
+    if not result.rowcount:
+        connection.execute(insert(table).values(id=CATALOG_VERSION_ID, version=1))
+
+
+def load_catalog(db: Session, version: Optional[int] = None) -> CatalogSnapshot:
+    """Загрузить новый снимок: по одному запросу на каждую таблицу."""
+    # Номер читается до данных: запись между ними даст лишнюю перезагрузку, а не устаревший снимок
+    if version is None:
+        version = catalog_version(db)
+    tables = {}
+    for table, (model, record_cls) in CATALOG_TABLES.items():
+        columns = [getattr(model, field) for field in record_cls._fields]
+        rows = db.query(*columns).all()
+        tables[table] = {
+            row[0]: record_cls(*(copy.deepcopy(value) for value in row))
+            for row in rows
+        }
+    return CatalogSnapshot(tables, version, time.time())
+
+
+def get_catalog(db: Session) -> CatalogSnapshot:
+    """Снимок из кэша процесса; перечитывается, если справочники менялись в любом процессе."""
+    global _cached
+    version = catalog_version(db)
+    snapshot = _cached
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _lock:
+        if _cached is None or _cached.version != version:
+            _cached = load_catalog(db, version)
+        return _cached
+
+
+def invalidate_catalog():
+    """Сбросить снимок этого процесса (остальные увидят новый номер версии)."""
+    global _cached
+    with _lock:
+        _cached = None
+
+
+def as_catalog(source: CatalogSource):
+    if isinstance(source, (CatalogSnapshot, SessionCatalog)):
+        return source
+    return SessionCatalog(source)
+
+
+# Инвалидация: номер версии растёт в транзакции, где менялись справочные
+# таблицы (один раз на транзакцию), снимок процесса сбрасывается после коммита
+@event.listens_for(Session, "after_flush")
+def _track_catalog_writes(session, flush_context):
+    if session.info.get("catalog_dirty"):
+        return
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, CATALOG_MODELS):
+            session.info["catalog_dirty"] = True
+            bump_catalog_version(session)
+            return
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    if session.info.pop("catalog_dirty", False):
+        invalidate_catalog()
+
+
+@event.listens_for(Session, "after_rollback")
+def _reset_after_rollback(session):
+    session.info.pop("catalog_dirty", None)
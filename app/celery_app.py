@@ -1,9 +1,19 @@
 # app/celery_app.py
 from celery import Celery
+from kombu import Queue
 import os
 
+from app.execution import worker_concurrency, max_tasks_per_child
+
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+# Очереди моделирования (см. app.scheduler): тяжёлые и лёгкие задачи
+# обслуживаются разными воркерами, например:
+#   celery -A app.celery_app worker -Q gprmax_heavy
+#   celery -A app.celery_app worker -Q gprmax_light,gprmax_heavy
+HEAVY_QUEUE = os.getenv("GPRMAX_HEAVY_QUEUE", "gprmax_heavy")
+LIGHT_QUEUE = os.getenv("GPRMAX_LIGHT_QUEUE", "gprmax_light")
+
 celery_app = Celery(
     "gpr_tasks",
     broker=REDIS_URL,
@@ -17,9 +27,18 @@ celery_app.conf.update(
     result_serializer="json",
     enable_utc=True,
     task_track_started=True,
-    task_time_limit=3600,
+    # Верхняя граница; для задач моделирования лимит задаёт планировщик
+    task_time_limit=int(os.getenv("GPRMAX_MAX_TIME_LIMIT_SEC", str(24 * 3600))),
+    task_queues=(
+        Queue("celery"),
+        Queue(HEAVY_QUEUE),
+        Queue(LIGHT_QUEUE),
+    ),
     task_acks_late=True,
     task_reject_on_worker_lost=True,
     broker_connection_retry_on_startup=True,
     worker_prefetch_multiplier=1,
+    # Ядра ÷ потоки на задачу (или число GPU), см. app.execution; -c в командной строке важнее
+    worker_concurrency=worker_concurrency(),
+    worker_max_tasks_per_child=max_tasks_per_child(),
 )
\ No newline at end of file
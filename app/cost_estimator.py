@@ -0,0 +1,189 @@
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app import models
+from app.grid_sizing import cell_count, iteration_count
+
+# Оценка стоимости моделирования до запуска: число ячеек, итераций, трасс,
+# объём выходных данных и ожидаемое время решателя.
+# Пропускная способность решателя калибруется по уже выполненным скриптам.
+#
+# Переменные окружения:
+#   GPRMAX_OUTPUT_BYTES_PER_SAMPLE — байт на отсчёт поля в выводе решателя
+#                                    (по умолчанию 8: float64; 4 — сборка gprMax
+#                                    с одинарной точностью)
+
+# Пропускная способность по умолчанию (ячейко-итераций в секунду, GPU)
+DEFAULT_THROUGHPUT = 1.0e9
+# Накладные расходы на одну трассу (запуск, построение геометрии), с
+DEFAULT_TRACE_OVERHEAD_SEC = 5.0
+
+FIELD_COMPONENTS = 6       # Ex, Ey, Ez, Hx, Hy, Hz
+# gprMax пишет поля в float64 (в float32 их приводит уже упаковка, app.result_pack);
+# по этой оценке проверяется свободное место, поэтому занижать её нельзя
+BYTES_PER_SAMPLE = int(os.getenv("GPRMAX_OUTPUT_BYTES_PER_SAMPLE", "8"))
+OUTPUT_OVERHEAD_BYTES = 64 * 1024  # атрибуты и метаданные HDF5 на файл
+
+CALIBRATION_TTL_SEC = 300
+MIN_CALIBRATION_SAMPLES = 3
+
+
+def parse_script(script_content: str) -> Dict[str, Any]:
+    """Достать из входного файла gprMax параметры, влияющие на стоимость."""
+    parsed = {"rx_count": 0}
+    for line in script_content.splitlines():
+        line = line.strip()
+        if not line.startswith("#") or ":" not in line:
+            continue
+        command, _, args = line.partition(":")
+        values = args.split()
+        if command == "#domain":
+            parsed["domain"] = dict(zip("xyz", map(float, values[:3])))
+        elif command == "#dx_dy_dz":
+            parsed["dx_dy_dz"] = dict(zip("xyz", map(float, values[:3])))
+        elif command == "#time_window":
+            parsed["time_window"] = float(values[0])
+        elif command == "#rx":
+            parsed["rx_count"] += 1
+    return parsed
+
+
+def trace_count(config_json: Dict[str, Any]) -> int:
+    """Число трасс B-скана (то же значение передаётся gprMax как -n)."""
+    movement = config_json["movement"]
+    start = movement["start_point"]
+    end = movement.get("end_point") or start
+    step = movement.get("step_size", 0.02)
+    distance = abs(end["x"] - start["x"])
+    return int(distance / step) + 1 if step > 0 else 1
+
+
+class Calibration:
+    def __init__(self, throughput: float, trace_overhead_sec: float, samples: int, calibrated_at: float):
+        self.throughput = throughput
+        self.trace_overhead_sec = trace_overhead_sec
+        self.samples = samples
+        self.calibrated_at = calibrated_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "throughput_cell_iterations_per_sec": self.throughput,
+            "trace_overhead_sec": self.trace_overhead_sec,
+            "samples": self.samples,
+            "calibrated_at": self.calibrated_at,
+        }
+
+
+DEFAULT_CALIBRATION = Calibration(DEFAULT_THROUGHPUT, DEFAULT_TRACE_OVERHEAD_SEC, 0, 0.0)
+
+_lock = threading.Lock()
+_calibration: Optional[Calibration] = None
+
+
+def estimate(config_json: Dict[str, Any], script_content: Optional[str] = None,
+             cells: Optional[int] = None, iterations: Optional[int] = None,
+             calibration: Calibration = DEFAULT_CALIBRATION) -> Dict[str, Any]:
+    """
+    Оценка для одного скрипта. Если cell_count/iteration_count уже сохранены
+    генератором, текст скрипта не разбирается.
+    """
+    rx_count = 1
+    if cells is None or iterations is None:
+        parsed = parse_script(script_content or "")
+        cells = cell_count(parsed["domain"], parsed["dx_dy_dz"])
+        iterations = iteration_count(parsed["time_window"], parsed["dx_dy_dz"])
+        rx_count = max(parsed["rx_count"], 1)
+
+    traces = trace_count(config_json)
+    work = cells * iterations * traces
+    runtime_sec = traces * calibration.trace_overhead_sec + work / calibration.throughput
+    output_bytes = traces * (iterations * FIELD_COMPONENTS * rx_count * BYTES_PER_SAMPLE + OUTPUT_OVERHEAD_BYTES)
+
+    return {
+        "cell_count": cells,
+        "iteration_count": iterations,
+        "trace_count": traces,
+        "cell_iterations": work,
+        "estimated_runtime_sec": round(runtime_sec, 1),
+        "estimated_output_bytes": output_bytes,
+    }
+
+
+def estimate_script(script: models.Script, calibration: Optional[Calibration] = None) -> Dict[str, Any]:
+    result = estimate(
+        script.config_json,
+        script.script_content if script.cell_count is None or script.iteration_count is None else None,
+        cells=script.cell_count,
+        iterations=script.iteration_count,
+        calibration=calibration or DEFAULT_CALIBRATION,
+    )
+    result["script_id"] = script.id
+    return result
+
+
+def aggregate(estimates: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    totals = {"scripts": 0, "trace_count": 0, "cell_iterations": 0,
+              "estimated_runtime_sec": 0.0, "estimated_output_bytes": 0}
+    longest = None
+    for item in estimates:
+        totals["scripts"] += 1
+        for key in ("trace_count", "cell_iterations", "estimated_runtime_sec", "estimated_output_bytes"):
+            totals[key] += item[key]
+        if longest is None or item["estimated_runtime_sec"] > longest["estimated_runtime_sec"]:
+            longest = item
+    totals["estimated_runtime_hours"] = round(totals["estimated_runtime_sec"] / 3600.0, 2)
+    totals["estimated_output_gb"] = round(totals["estimated_output_bytes"] / 1024 ** 3, 3)
+    totals["longest"] = longest
+    return totals
+
+
+def calibrate(db: Session) -> Calibration:
+    """
+    Подбор runtime = traces * overhead + work / throughput методом наименьших
+    квадратов по выполненным (не кэшированным) скриптам.
+    """
+    rows = db.query(models.Script).filter(
+        models.Script.status == "completed",
+        models.Script.runtime_sec != None,
+        models.Script.result_source_id == None,
+    ).order_by(models.Script.id.desc()).limit(5000).all()
+
+    traces, work, runtime = [], [], []
+    for script in rows:
+        try:
+            item = estimate_script(script)
+        except (KeyError, ValueError):
+            continue
+        traces.append(item["trace_count"])
+        work.append(item["cell_iterations"])
+        runtime.append(script.runtime_sec)
+
+    if len(runtime) < MIN_CALIBRATION_SAMPLES:
+        return Calibration(DEFAULT_THROUGHPUT, DEFAULT_TRACE_OVERHEAD_SEC, len(runtime), time.time())
+
+    # Работа в млрд ячейко-итераций, чтобы столбцы были одного порядка
+    a = np.column_stack([np.asarray(traces, dtype=float), np.asarray(work, dtype=float) / 1e9])
+    coef, *_ = np.linalg.lstsq(a, np.asarray(runtime, dtype=float), rcond=None)
+    overhead, inv_throughput = float(coef[0]), float(coef[1]) / 1e9
+    if inv_throughput <= 0 or not math.isfinite(inv_throughput):
+        # Вырожденная выборка: считаем всё время вычислительным
+        overhead = 0.0
+        inv_throughput = float(np.sum(runtime) / max(np.sum(work), 1.0))
+    return Calibration(1.0 / inv_throughput, max(overhead, 0.0), len(runtime), time.time())
+
+
+def get_calibration(db: Session, refresh: bool = False) -> Calibration:
+    """Калибровка из кэша процесса (пересчитывается раз в CALIBRATION_TTL_SEC)."""
+    global _calibration
+    current = _calibration
+    if not refresh and current is not None and time.time() - current.calibrated_at < CALIBRATION_TTL_SEC:
+        return current
+    with _lock:
+        _calibration = calibrate(db)
+        return _calibration
@@ -1,18 +1,131 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from dotenv import load_dotenv
 import os
+import threading
+import time
 
 # Здесь настраивается подключение к базе данных.
+# Кроме синхронного движка есть асинхронный — для эндпоинтов чтения,
+# которые выполняются в цикле событий, а не в пуле потоков Starlette.
+# Его URL берётся из ASYNC_DATABASE_URL или выводится из DATABASE_URL
+# заменой драйвера: postgresql -> postgresql+asyncpg, sqlite -> sqlite+aiosqlite.
+#
+# Пул соединений настраивается переменными окружения (на каждый процесс:
+# API, каждый процесс пула Celery):
+#   DB_POOL_SIZE       — постоянных соединений (по умолчанию 5)
+#   DB_MAX_OVERFLOW    — дополнительных соединений сверх пула (по умолчанию 10)
+#   DB_POOL_TIMEOUT    — сколько ждать свободного соединения, с (по умолчанию 30)
+#   DB_POOL_RECYCLE    — пересоздавать соединения старше N секунд (по умолчанию 1800, -1 — никогда)
+#   DB_POOL_PRE_PING   — проверять соединение перед выдачей (по умолчанию 1)
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    explicit = os.getenv("ASYNC_DATABASE_URL")
+    if explicit:
+        return explicit
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"Нет асинхронного драйвера для {backend}, задайте ASYNC_DATABASE_URL")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+class PoolMetrics:
+    """Счётчики пула: выдачи соединений, ожидание свободного, таймауты."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total_sec = 0.0
+        self.wait_max_sec = 0.0
+
+    def record(self, wait_sec: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total_sec += wait_sec
+            self.wait_max_sec = max(self.wait_max_sec, wait_sec)
+
+    def as_dict(self, pool) -> dict:
+        with self._lock:
+            info = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_total_sec": round(self.wait_total_sec, 6),
+                "wait_avg_ms": round(1000 * self.wait_total_sec / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(1000 * self.wait_max_sec, 3),
+            }
+        if isinstance(pool, QueuePool):
+            info.update({
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+            })
+        return info
+
+
+class _MeteredPool:
+    # Класс пула создаётся на каждый движок, счётчики — атрибут класса,
+    # поэтому переживают пересоздание пула при dispose()
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - started)
+        return connection
+
+
+def _pool_options(url: str, base_class, metrics: PoolMetrics) -> dict:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # Память SQLite живёт в одном соединении — пул по умолчанию
+        return {}
+    return {
+        "poolclass": type(f"Metered{base_class.__name__}", (_MeteredPool, base_class), {"metrics": metrics}),
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") != "0",
+    }
+
+
+pool_metrics = PoolMetrics()
+async_pool_metrics = PoolMetrics()
+
+engine = create_engine(DATABASE_URL, **_pool_options(DATABASE_URL, QueuePool, pool_metrics))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+_async_url = async_database_url(DATABASE_URL)
+async_engine = create_async_engine(_async_url, **_pool_options(_async_url, AsyncAdaptedQueuePool, async_pool_metrics))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
 Base  = declarative_base()
 
 def get_db():
@@ -21,3 +134,22 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def dispose_after_fork():
+    """
+    Вызывать в дочернем процессе после fork (процесс пула Celery): соединения,
+    унаследованные от родителя, забываются без закрытия — ими продолжает
+    пользоваться родитель, — и ребёнок открывает свои.
+    """
+    engine.dispose(close=False)
+    pool_metrics.reset()
+
+def pool_status() -> dict:
+    return {
+        "sync": pool_metrics.as_dict(engine.pool),
+        "async": async_pool_metrics.as_dict(async_engine.sync_engine.pool),
+    }
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+
+from app.database import engine
+
+# Применение миграций схемы (migrations/, Alembic) из кода: при старте API
+# и в recreate_db.py. Базы, созданные до миграций через create_all, не имеют
+# таблицы alembic_version — они помечаются исходной ревизией 0001, после чего
+# применяются остальные. Такие базы могли создаваться разными версиями моделей,
+# поэтому 0002 добавляет только отсутствующие колонки, ограничения и таблицы.
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+BASELINE_REVISION = "0001"
+
+
+def alembic_config() -> Config:
+    config = Config(str(ROOT_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT_DIR / "migrations"))
+    # Логирование настраивает приложение, а не alembic.ini
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def upgrade_database(revision: str = "head"):
+    config = alembic_config()
+    tables = set(inspect(engine).get_table_names())
+    if tables and "alembic_version" not in tables:
+        print(f"БД создана без миграций, помечаем ревизией {BASELINE_REVISION}")
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, revision)
@@ -0,0 +1,143 @@
+import os
+from typing import Dict, List, Optional
+
+# Профиль выполнения gprMax на узле: CPU или GPU, число потоков OpenMP на задачу,
+# привязка каждой задачи к своему непересекающемуся набору ядер и размер пула
+# Celery (ядра ÷ потоки на задачу). Слот задачи — номер дочернего процесса
+# пула prefork, поэтому одновременно работающие задачи не делят ядра.
+#
+# Переменные окружения:
+#   GPRMAX_DEVICE        — gpu | cpu (по умолчанию gpu)
+#   GPRMAX_GPU_DEVICES   — номера GPU через запятую; задачи распределяются по ним по слотам
+#   GPRMAX_OMP_THREADS   — потоков OpenMP на задачу (0 — все ядра на одну задачу для CPU,
+#                          ядра ÷ число GPU для GPU)
+#   GPRMAX_CPU_PINNING   — 0, чтобы не привязывать задачи к ядрам (по умолчанию 1)
+#   GPRMAX_CONCURRENCY   — явный размер пула Celery (по умолчанию — из профиля)
+#   GPRMAX_RUNNER        — subprocess (новый интерпретатор на задачу, по умолчанию) |
+#                          warm (gprMax импортируется один раз в процессе пула, задача — fork)
+#   GPRMAX_MAX_TASKS_PER_CHILD — перезапуск процесса пула после N задач
+#                          (по умолчанию 50 в режиме warm)
+
+DEVICES = ("cpu", "gpu")
+RUNNERS = ("subprocess", "warm")
+DEFAULT_WARM_TASKS_PER_CHILD = 50
+
+
+def available_cpus() -> List[int]:
+    """Ядра, доступные процессу (с учётом cgroup/taskset)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def current_slot() -> int:
+    """Номер дочернего процесса пула Celery (0 вне пула)."""
+    try:
+        from billiard.process import current_process
+        return int(getattr(current_process(), "index", 0) or 0)
+    except ImportError:
+        return 0
+
+
+class ExecutionProfile:
+    def __init__(self, device: str = "gpu", threads: int = 0, pinning: bool = True,
+                 gpu_devices: Optional[List[int]] = None, cpus: Optional[List[int]] = None,
+                 runner: str = "subprocess"):
+        if device not in DEVICES:
+            raise ValueError(f"GPRMAX_DEVICE должно быть одним из {DEVICES}, получено {device!r}")
+        if runner not in RUNNERS:
+            raise ValueError(f"GPRMAX_RUNNER должно быть одним из {RUNNERS}, получено {runner!r}")
+        self.device = device
+        self.runner = runner
+        self.gpu_devices = gpu_devices or []
+        self.cpus = cpus or available_cpus()
+        self.pinning = pinning
+        if threads <= 0:
+            # CPU: одна задача на все ядра; GPU: ядра делятся между задачами на разных GPU
+            threads = len(self.cpus) // self._gpu_slots() if device == "gpu" else len(self.cpus)
+        self.threads = max(1, min(threads, len(self.cpus)))
+
+    @classmethod
+    def from_env(cls) -> "ExecutionProfile":
+        gpu_devices = [int(x) for x in os.getenv("GPRMAX_GPU_DEVICES", "").split(",") if x.strip()]
+        return cls(
+            device=os.getenv("GPRMAX_DEVICE", "gpu"),
+            threads=int(os.getenv("GPRMAX_OMP_THREADS", "0")),
+            pinning=os.getenv("GPRMAX_CPU_PINNING", "1") != "0",
+            gpu_devices=gpu_devices,
+            runner=os.getenv("GPRMAX_RUNNER", "subprocess"),
+        )
+
+    def _gpu_slots(self) -> int:
+        return max(1, len(self.gpu_devices))
+
+    def concurrency(self) -> int:
+        """Сколько задач моделирования одновременно выполнять на узле."""
+        if self.device == "gpu":
+            return self._gpu_slots()
+        return max(1, len(self.cpus) // self.threads)
+
+    def slot_cpus(self, slot: int) -> List[int]:
+        start = (slot % self.concurrency()) * self.threads
+        return self.cpus[start:start + self.threads]
+
+    def solver_args(self, slot: int) -> List[str]:
+        if self.device == "cpu":
+            return []
+        if self.gpu_devices:
+            return ["-gpu", str(self.gpu_devices[slot % len(self.gpu_devices)])]
+        return ["-gpu"]
+
+    def api_gpu(self, slot: int) -> Optional[List[int]]:
+        """Аргумент gpu для gprMax.api (то же, что solver_args для командной строки)."""
+        if self.device == "cpu":
+            return None
+        if self.gpu_devices:
+            return [self.gpu_devices[slot % len(self.gpu_devices)]]
+        return []
+
+    def solver_env(self) -> Dict[str, str]:
+        env = dict(os.environ)
+        env["OMP_NUM_THREADS"] = str(self.threads)
+        if self.pinning:
+            # Потоки OpenMP не мигрируют между ядрами своего набора
+            env.setdefault("OMP_PROC_BIND", "close")
+            env.setdefault("OMP_PLACES", "cores")
+        return env
+
+    def affinity(self, slot: int) -> Optional[List[int]]:
+        if not self.pinning or not hasattr(os, "sched_setaffinity"):
+            return None
+        return self.slot_cpus(slot)
+
+    def describe(self, slot: Optional[int] = None) -> Dict[str, object]:
+        info = {
+            "device": self.device,
+            "threads_per_task": self.threads,
+            "concurrency": self.concurrency(),
+            "cpus": len(self.cpus),
+            "pinning": self.pinning,
+            "gpu_devices": self.gpu_devices,
+            "runner": self.runner,
+        }
+        if slot is not None:
+            info["slot"] = slot
+            info["slot_cpus"] = self.affinity(slot)
+        return info
+
+
+def worker_concurrency(profile: Optional[ExecutionProfile] = None) -> int:
+    explicit = os.getenv("GPRMAX_CONCURRENCY")
+    if explicit:
+        return int(explicit)
+    return (profile or ExecutionProfile.from_env()).concurrency()
+
+
+def max_tasks_per_child(profile: Optional[ExecutionProfile] = None) -> Optional[int]:
+    explicit = os.getenv("GPRMAX_MAX_TASKS_PER_CHILD")
+    if explicit:
+        return int(explicit) or None
+    if (profile or ExecutionProfile.from_env()).runner == "warm":
+        # Прогретый процесс пула периодически заменяется свежим
+        return DEFAULT_WARM_TASKS_PER_CHILD
+    return None
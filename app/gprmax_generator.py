@@ -1,24 +1,34 @@
 # app/gprmax_generator.py
 from jinja2 import Environment, FileSystemLoader
 from app.config_schema import SimulationConfig
-from sqlalchemy.orm import Session
-from app import models
+from app.catalog import CatalogSource, as_catalog
+from app import grid_sizing
+from typing import Tuple
 import os
 import math
 
 TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates", "gprmax")
 env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
 
-def generate_script(config: SimulationConfig, db: Session) -> str:
-    soil_type = db.query(models.SoilType).get(config.soil_layers[0].soil_type_id)
+def generate_script(config: SimulationConfig, db: CatalogSource) -> str:
+    # db — сессия SQLAlchemy или снимок справочников (app.catalog.CatalogSnapshot)
+    return generate_script_with_sizing(config, db)[0]
+
+def generate_script_with_sizing(config: SimulationConfig, db: CatalogSource) -> Tuple[str, dict]:
+    """
+    Возвращает текст скрипта и параметры сетки (cell_count, iteration_count и т.д.).
+    Режим auto_sizing включается через config.custom_parameters["auto_sizing"].
+    """
+    catalog = as_catalog(db)
+    soil_type = catalog.soil_type(config.soil_layers[0].soil_type_id)
     if not soil_type:
         raise ValueError(f"Soil type id {config.soil_layers[0].soil_type_id} not found")
 
-    antenna = db.query(models.Antenna).get(config.gpr_config.antenna_id)
+    antenna = catalog.antenna(config.gpr_config.antenna_id)
     if not antenna:
         raise ValueError(f"Antenna id {config.gpr_config.antenna_id} not found")
 
-    pulse = db.query(models.PulseType).get(config.gpr_config.pulse_id)
+    pulse = catalog.pulse(config.gpr_config.pulse_id)
     if not pulse:
         raise ValueError(f"Pulse id {config.gpr_config.pulse_id} not found")
 
@@ -32,13 +42,14 @@ def generate_script(config: SimulationConfig, db: Session) -> str:
     }
 
     objects = []
+    feature_sizes = []
     materials_dict = {soil_material["name"]: soil_material}
 
     for target_obj in config.targets:
-        target_type = db.query(models.TargetType).get(target_obj.target_type_id)
+        target_type = catalog.target_type(target_obj.target_type_id)
         if not target_type:
             raise ValueError(f"Target type id {target_obj.target_type_id} not found")
-        material = db.query(models.Material).get(target_type.material_id)
+        material = catalog.material(target_type.material_id)
         if not material:
             raise ValueError(f"Material id {target_type.material_id} not found")
 
@@ -55,6 +66,7 @@ def generate_script(config: SimulationConfig, db: Session) -> str:
 
         shape = target_type.shape.lower()
         dims = target_type.dimensions or {}
+        feature_sizes.extend(v for v in dims.values() if isinstance(v, (int, float)) and v > 0)
         pos = target_obj.position
         rot = target_obj.rotation
 
@@ -157,34 +169,62 @@ def generate_script(config: SimulationConfig, db: Session) -> str:
     soil_layer_bottom = soil_layer.position.z - soil_layer.thickness / 2
     soil_layer_top = soil_layer.position.z + soil_layer.thickness / 2
 
-    # Настройки сетки и домена
-    opt_dx = 0.005
-    discretization = {"x": opt_dx, "y": opt_dx, "z": opt_dx}
-
-    domain_z = max(2.0, soil_layer_top + 0.5)
-    domain = {"x": 1.4, "y": 0.5, "z": round(domain_z, 2)}
-
     antenna_height = 0.2
     antenna_y = 0.25
     antenna_z = antenna_height
     tx_x = start.x
     rx_x = start.x + 0.05
 
-    # Временное окно
-    max_depth = max([abs(obj.get("z1", 0)) for obj in objects] +
-                    [abs(obj.get("z2", 0)) for obj in objects] +
-                    [abs(soil_layer_bottom)])
-    t_air = 2 * antenna_height / 0.3e9
-    t_soil = 2 * max_depth / 0.1e9
-    t_window = max(120e-9, t_air + t_soil + 30e-9)
-
     pml_layers = 8
 
+    custom = config.custom_parameters or {}
+    if custom.get("auto_sizing"):
+        # Сетка по кратчайшей длине волны, домен по положению объектов,
+        # временное окно по реальной скорости в грунте
+        f_max = _max_frequency(config, antenna, pulse)
+        epsilons = [m["epsilon"] for m in materials]
+        last_rx_x = rx_x + (num_steps - 1) * step
+        max_coords = {
+            "x": max([last_rx_x, tx_x + (num_steps - 1) * step] + [max(o["x1"], o["x2"]) for o in objects]),
+            "y": max([antenna_y] + [max(o["y1"], o["y2"]) for o in objects]),
+            "z": max([soil_layer_top, antenna_z] + [max(o["z1"], o["z2"]) for o in objects]),
+        }
+        if objects:
+            path_length = max(abs(antenna_z - o[key]) for o in objects for key in ("z1", "z2"))
+        else:
+            path_length = abs(antenna_z - soil_layer_bottom)
+        sizing = grid_sizing.auto_grid(
+            f_max=f_max,
+            epsilons=epsilons,
+            soil_epsilon=soil_material["epsilon"],
+            center_freq=pulse.parameters.get("center_freq", 1.1e9),
+            pml_layers=pml_layers,
+            max_coords=max_coords,
+            path_length=path_length,
+            min_feature=min(feature_sizes) if feature_sizes else None,
+        )
+    else:
+        # Настройки сетки и домена
+        opt_dx = 0.005
+        discretization = {"x": opt_dx, "y": opt_dx, "z": opt_dx}
+
+        domain_z = max(2.0, soil_layer_top + 0.5)
+        domain = {"x": 1.4, "y": 0.5, "z": round(domain_z, 2)}
+
+        # Временное окно
+        max_depth = max([abs(obj.get("z1", 0)) for obj in objects] +
+                        [abs(obj.get("z2", 0)) for obj in objects] +
+                        [abs(soil_layer_bottom)])
+        t_air = 2 * antenna_height / 0.3e9
+        t_soil = 2 * max_depth / 0.1e9
+        t_window = max(120e-9, t_air + t_soil + 30e-9)
+        sizing = grid_sizing.grid_summary("fixed", domain, discretization, t_window)
+
     template_vars = {
         "title": config.name,
-        "domain": domain,
-        "dx_dy_dz": discretization,
-        "time_window": t_window,
+        "domain": sizing["domain"],
+        "dx_dy_dz": sizing["dx_dy_dz"],
+        "time_window": sizing["time_window"],
         "pml_layers": pml_layers,
         "materials": materials,
         "waveform": {
@@ -207,4 +247,17 @@ def generate_script(config: SimulationConfig, db: Session) -> str:
     }
 
     template = env.get_template("bscan_bowtie_template.in")
-    return template.render(template_vars)
\ No newline at end of file
+    return template.render(template_vars), sizing
+
+def _max_frequency(config: SimulationConfig, antenna, pulse) -> float:
+    """Верхняя частота спектра: из конфигурации, антенны или импульса."""
+    candidates = []
+    if config.gpr_config.frequency_range:
+        candidates.append(config.gpr_config.frequency_range[1])
+    antenna_range = (antenna.parameters or {}).get("frequency_range")
+    if antenna_range:
+        candidates.append(antenna_range[1])
+    if not candidates:
+        # Спектр импульса Рикера практически затухает к ~3 fc
+        candidates.append(3.0 * pulse.parameters.get("center_freq", 1.1e9))
+    return max(candidates)
\ No newline at end of file
@@ -0,0 +1,83 @@
+import math
+from typing import Dict, Iterable, Optional
+
+# Расчёт сетки, размеров домена и временного окна для gprMax.
+# Используется генератором скриптов (режим auto_sizing) и оценкой стоимости.
+
+C0 = 299792458.0  # скорость света в вакууме, м/с
+
+CELLS_PER_WAVELENGTH = 10    # минимум ячеек на кратчайшую длину волны (рекомендация gprMax)
+CELLS_PER_FEATURE = 4        # минимум ячеек на наименьший размер объекта
+DX_QUANTUM = 0.0005          # шаг сетки округляется вниз до 0.5 мм
+CLEARANCE_CELLS = 15         # зазор между объектами/антенной и PML
+TIME_WINDOW_MARGIN = 1.2     # запас на хвост отражений
+
+
+def courant_dt(dx: float, dy: float, dz: float) -> float:
+    """Максимальный шаг по времени по условию Куранта (3D FDTD)."""
+    return 1.0 / (C0 * math.sqrt(1.0 / dx ** 2 + 1.0 / dy ** 2 + 1.0 / dz ** 2))
+
+
+def cell_count(domain: Dict[str, float], dx_dy_dz: Dict[str, float]) -> int:
+    return (math.ceil(round(domain["x"] / dx_dy_dz["x"], 6))
+            * math.ceil(round(domain["y"] / dx_dy_dz["y"], 6))
+            * math.ceil(round(domain["z"] / dx_dy_dz["z"], 6)))
+
+
+def iteration_count(time_window: float, dx_dy_dz: Dict[str, float]) -> int:
+    dt = courant_dt(dx_dy_dz["x"], dx_dy_dz["y"], dx_dy_dz["z"])
+    return math.ceil(time_window / dt) + 1
+
+
+def grid_summary(mode: str, domain: Dict[str, float], dx_dy_dz: Dict[str, float],
+                 time_window: float) -> dict:
+    return {
+        "mode": mode,
+        "domain": domain,
+        "dx_dy_dz": dx_dy_dz,
+        "time_window": time_window,
+        "cell_count": cell_count(domain, dx_dy_dz),
+        "iteration_count": iteration_count(time_window, dx_dy_dz),
+    }
+
+
+def cell_size(f_max: float, eps_max: float, min_feature: Optional[float] = None) -> float:
+    """Шаг сетки по кратчайшей длине волны в самой «медленной» среде."""
+    wavelength = C0 / (f_max * math.sqrt(max(eps_max, 1.0)))
+    dx = wavelength / CELLS_PER_WAVELENGTH
+    if min_feature:
+        dx = min(dx, min_feature / CELLS_PER_FEATURE)
+    dx = math.floor(dx / DX_QUANTUM) * DX_QUANTUM
+    return round(max(dx, DX_QUANTUM), 4)
+
+
+def domain_extent(max_coord: float, dx: float, pml_layers: int) -> float:
+    """Размер домена по оси: дальняя точка модели + зазор + слой PML."""
+    extent = max_coord + (pml_layers + CLEARANCE_CELLS) * dx
+    return round(math.ceil(round(extent / dx, 6)) * dx, 4)
+
+
+def two_way_time_window(path_length: float, soil_epsilon: float, center_freq: float) -> float:
+    """Двойное время пробега до самого дальнего отражателя в грунте плюс длительность импульса."""
+    velocity = C0 / math.sqrt(max(soil_epsilon, 1.0))
+    travel = 2.0 * path_length / velocity
+    # Импульс Рикера занимает примерно 2/fc, плюс задержка его начала
+    pulse = 3.0 / center_freq if center_freq else 0.0
+    return TIME_WINDOW_MARGIN * travel + pulse
+
+
+def auto_grid(
+    f_max: float,
+    epsilons: Iterable[float],
+    soil_epsilon: float,
+    center_freq: float,
+    pml_layers: int,
+    max_coords: Dict[str, float],
+    path_length: float,
+    min_feature: Optional[float] = None,
+) -> dict:
+    dx = cell_size(f_max, max(epsilons), min_feature)
+    dx_dy_dz = {"x": dx, "y": dx, "z": dx}
+    domain = {axis: domain_extent(max_coords[axis], dx, pml_layers) for axis in ("x", "y", "z")}
+    time_window = two_way_time_window(path_length, soil_epsilon, center_freq)
+    return grid_summary("auto", domain, dx_dy_dz, time_window)
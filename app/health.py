@@ -0,0 +1,149 @@
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Optional
+
+import redis
+from sqlalchemy import text
+
+from app import statistics, storage
+from app.celery_app import REDIS_URL
+from app.database import engine, pool_status
+
+# Проверки для оркестратора и диагностика для администратора.
+# /livez — процесс жив, без ввода-вывода. /readyz — SELECT 1 через пул,
+# PING брокера Redis и доступность тома результатов; проверки идут параллельно,
+# каждая ограничена READY_TIMEOUT_SEC, так что зависшая зависимость даёт
+# «не готов», а не зависший probe. Подсчёт строк по таблицам — только в
+# диагностике: результат кэшируется, пересчёт не чаще DIAGNOSTICS_MIN_INTERVAL_SEC.
+#
+# Переменные окружения:
+#   GPRMAX_READY_TIMEOUT_SEC          — таймаут каждой проверки готовности (по умолчанию 2)
+#   GPRMAX_READY_MIN_FREE_BYTES       — минимум свободного места на томе результатов (по умолчанию 1 ГБ)
+#   GPRMAX_DIAGNOSTICS_TTL_SEC        — время жизни кэша диагностики (по умолчанию 60)
+#   GPRMAX_DIAGNOSTICS_MIN_INTERVAL_SEC — минимальный интервал принудительного пересчёта (по умолчанию 10)
+
+READY_TIMEOUT_SEC = float(os.getenv("GPRMAX_READY_TIMEOUT_SEC", "2"))
+READY_MIN_FREE_BYTES = int(os.getenv("GPRMAX_READY_MIN_FREE_BYTES", str(1024 ** 3)))
+DIAGNOSTICS_TTL_SEC = float(os.getenv("GPRMAX_DIAGNOSTICS_TTL_SEC", "60"))
+DIAGNOSTICS_MIN_INTERVAL_SEC = float(os.getenv("GPRMAX_DIAGNOSTICS_MIN_INTERVAL_SEC", "10"))
+
+_executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix="readyz")
+_redis: Optional[redis.Redis] = None
+
+_diagnostics_lock = threading.Lock()
+_diagnostics: Optional[Dict[str, Any]] = None
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Повторите через {retry_after:.0f} с")
+        self.retry_after = retry_after
+
+
+def check_database() -> Dict[str, Any]:
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    return {}
+
+
+def check_broker() -> Dict[str, Any]:
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(
+            REDIS_URL, socket_connect_timeout=READY_TIMEOUT_SEC, socket_timeout=READY_TIMEOUT_SEC
+        )
+    _redis.ping()
+    return {}
+
+
+def check_results_volume() -> Dict[str, Any]:
+    path = storage.RESULTS_BASE_DIR
+    if not path.is_dir():
+        raise OSError(f"{path} не существует")
+    if not os.access(path, os.W_OK):
+        raise OSError(f"{path} недоступен для записи")
+    free = shutil.disk_usage(path).free
+    if free < READY_MIN_FREE_BYTES:
+        raise OSError(f"На {path} свободно {free // 2**20} МБ, нужно не меньше {READY_MIN_FREE_BYTES // 2**20} МБ")
+    return {"free_bytes": free}
+
+
+READY_CHECKS: Dict[str, Callable[[], Dict[str, Any]]] = {
+    "database": check_database,
+    "broker": check_broker,
+    "results_volume": check_results_volume,
+}
+
+
+def readiness() -> Dict[str, Any]:
+    """Все проверки параллельно; ready — только если прошли все."""
+    started = time.perf_counter()
+    futures = {name: _executor.submit(check) for name, check in READY_CHECKS.items()}
+    deadline = started + READY_TIMEOUT_SEC
+    checks = {}
+    for name, future in futures.items():
+        try:
+            details = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+            checks[name] = {"status": "ok", **details}
+        except FutureTimeout:
+            checks[name] = {"status": "timeout"}
+        except Exception as e:
+            checks[name] = {"status": "error", "error": str(e)}
+    return {
+        "ready": all(check["status"] == "ok" for check in checks.values()),
+        "checks": checks,
+        "duration_ms": round(1000 * (time.perf_counter() - started), 1),
+    }
+
+
+def _database_name() -> Optional[str]:
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT current_database()")).scalar()
+    return engine.url.database
+
+
+def _schema_revision() -> Optional[str]:
+    with engine.connect() as conn:
+        try:
+            return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+        except Exception:
+            return None
+
+
+def collect_diagnostics(db) -> Dict[str, Any]:
+    stats = statistics.collect(db)
+    usage = shutil.disk_usage(storage.RESULTS_BASE_DIR) if storage.RESULTS_BASE_DIR.is_dir() else None
+    return {
+        "database": _database_name(),
+        "dialect": engine.dialect.name,
+        "schema_revision": _schema_revision(),
+        "table_counts": dict(stats["statistics"], scripts=stats["scripts"]["total"]),
+        "scripts_by_status": stats["scripts"]["by_status"],
+        "db_pools": pool_status(),
+        "results_volume": {
+            "path": str(storage.RESULTS_BASE_DIR),
+            "total_bytes": usage.total if usage else None,
+            "free_bytes": usage.free if usage else None,
+        },
+        "collected_at": time.time(),
+    }
+
+
+def diagnostics(db, refresh: bool = False) -> Dict[str, Any]:
+    """
+    Диагностика из кэша (DIAGNOSTICS_TTL_SEC). refresh пересчитывает её,
+    но не чаще DIAGNOSTICS_MIN_INTERVAL_SEC, иначе RateLimited.
+    """
+    global _diagnostics
+    with _diagnostics_lock:
+        current = _diagnostics
+        age = time.time() - current["collected_at"] if current else None
+        if current is not None and refresh and age < DIAGNOSTICS_MIN_INTERVAL_SEC:
+            raise RateLimited(DIAGNOSTICS_MIN_INTERVAL_SEC - age)
+        if current is None or refresh or age >= DIAGNOSTICS_TTL_SEC:
+            _diagnostics = collect_diagnostics(db)
+        return _diagnostics
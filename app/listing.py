@@ -0,0 +1,66 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import Select
+from sqlalchemy.orm import load_only
+
+from app import models
+
+# Списки записей для API: пагинация по ключу (id) и выбор полей.
+# Вместо OFFSET, который заставляет БД пройти все пропущенные строки,
+# клиент передаёт cursor — id последней записи предыдущей страницы — и
+# следующая страница начинается сразу за ним по индексу первичного ключа.
+# По умолчанию отдаётся краткая проекция без тяжёлых текстовых и JSON-колонок:
+# они не загружаются из БД (load_only), а запрашиваются явно через fields=.
+
+# Колонки, которые не входят в краткую проекцию
+HEAVY_FIELDS = {
+    models.Script: ("script_content", "config_json", "error"),
+    models.ObjectPortrait: ("simulation_params",),
+    models.Material: ("drawing",),
+    models.TargetType: ("drawing",),
+}
+
+ALL_FIELDS = "all"
+
+
+def select_fields(model, response_fields: Iterable[str], fields: Optional[str] = None) -> List[str]:
+    """
+    Поля ответа по параметру fields: не задан — краткая проекция,
+    "all" — все поля, иначе список через запятую (id добавляется всегда).
+    """
+    available = list(response_fields)
+    if not fields:
+        heavy = HEAVY_FIELDS.get(model, ())
+        return [f for f in available if f not in heavy]
+    if fields.strip() == ALL_FIELDS:
+        return available
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in available]
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(unknown)}. Доступны: {', '.join(available)}")
+    return ["id"] + [f for f in available if f in requested and f != "id"]
+
+
+def project(query: Select, model, selected: Sequence[str]) -> Select:
+    """Загружать из БД только выбранные колонки, остальные отложить."""
+    columns = [getattr(model, f) for f in selected if f in model.__table__.columns]
+    return query.options(load_only(*columns))
+
+
+def keyset(query: Select, model, cursor: Optional[int], limit: int, descending: bool = False) -> Select:
+    """Страница после записи с id = cursor в порядке id."""
+    if cursor is not None:
+        query = query.where(model.id < cursor if descending else model.id > cursor)
+    order = model.id.desc() if descending else model.id
+    return query.order_by(order).limit(limit)
+
+
+def rows(objects: Sequence[Any], selected: Sequence[str]) -> List[Dict[str, Any]]:
+    return [{f: getattr(obj, f, None) for f in selected} for obj in objects]
+
+
+def next_cursor(objects: Sequence[Any], limit: int) -> Optional[int]:
+    """id для запроса следующей страницы или None, если страница последняя."""
+    if len(objects) < limit:
+        return None
+    return objects[-1].id
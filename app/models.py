@@ -1,9 +1,15 @@
-from sqlalchemy import Column, Integer, String, Float, JSON, ForeignKey, Text, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Float, JSON, ForeignKey, Text, DateTime, UniqueConstraint, LargeBinary, Index, text
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime
 
 # Здесь описаны таблицы базы данных.
+# Схема меняется миграциями (migrations/, Alembic): после правки моделей —
+# alembic revision --autogenerate -m "...", проверить и дописать файл ревизии.
+
+# Скрипты, которые ещё ждут или выполняют моделирование (частичный индекс)
+ACTIVE_STATUSES = ("generated", "pending", "running", "waiting")
+_ACTIVE_FILTER = text("status IN (%s)" % ", ".join(f"'{s}'" for s in ACTIVE_STATUSES))
 
 class SoilType(Base):
     __tablename__ = "soil_types"
@@ -19,7 +25,7 @@ class Material(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     drawing = Column(Text)
-    material_id = Column(Integer, ForeignKey("materials.id"))
+    material_id = Column(Integer, ForeignKey("materials.id"), index=True)
     parameters = Column(JSON, nullable=True)
 
     material = relationship("Material")
@@ -31,7 +37,7 @@ class TargetType(Base):
     name = Column(String, nullable=False)
     shape = Column(String)
     drawing = Column(Text)
-    material_id = Column(Integer, ForeignKey("materials.id"))
+    material_id = Column(Integer, ForeignKey("materials.id"), index=True)
     dimensions = Column(JSON, nullable=True)
     
     material = relationship("Material")
@@ -60,12 +66,21 @@ class SoilBoundary(Base):
     angle = Column(Float)
     roughness = Column(Float)
     humidity = Column(Float)
-    soil_type_id = Column(Integer, ForeignKey("soil_types.id"))
+    soil_type_id = Column(Integer, ForeignKey("soil_types.id"), index=True)
 
     soil_type = relationship("SoilType")
 
 class ObjectPortrait(Base):
     __tablename__ = "object_portraits"
+    __table_args__ = (
+        # Фильтры /object-portraits/ и поиска по сигналу: полный набор параметров
+        # и каждый внешний ключ отдельно с порядком по id (пагинация по ключу)
+        Index("ix_object_portraits_params", "target_type_id", "soil_type_id", "antenna_id", "pulse_id"),
+        Index("ix_object_portraits_target_type_id_id", "target_type_id", "id"),
+        Index("ix_object_portraits_soil_type_id_id", "soil_type_id", "id"),
+        Index("ix_object_portraits_antenna_id_id", "antenna_id", "id"),
+        Index("ix_object_portraits_pulse_id_id", "pulse_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     target_type_id = Column(Integer, ForeignKey("target_types.id"))
@@ -81,8 +96,41 @@ class ObjectPortrait(Base):
     antenna = relationship("Antenna")
     pulse = relationship("PulseType")
 
+class CatalogVersion(Base):
+    """Одна строка: номер версии справочников, растёт при каждой записи в них (app.catalog)."""
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+class PortraitSignature(Base):
+    """Вектор признаков B-скана портрета для поиска по сигналу (app.similarity)."""
+    __tablename__ = "portrait_signatures"
+
+    id = Column(Integer, primary_key=True, index=True)
+    portrait_id = Column(Integer, ForeignKey("object_portraits.id", ondelete="CASCADE"), unique=True, nullable=False)
+    signature_version = Column(Integer, nullable=False)
+    vector = Column(LargeBinary, nullable=False)  # float32, длина — app.similarity.SIGNATURE_SIZE
+    source_file = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Script(Base):
     __tablename__ = "scripts"
+    __table_args__ = (
+        # Повторный запуск генерации кампании не должен создавать дубликаты
+        UniqueConstraint("campaign", "name", name="uq_scripts_campaign_name"),
+        # /scripts/?status= с пагинацией по id, подсчёты по статусам
+        Index("ix_scripts_status_id", "status", "id"),
+        # Очередь и поиск дубликатов среди незавершённых (app.result_cache) —
+        # небольшой индекс, не растущий с числом выполненных скриптов
+        Index("ix_scripts_active", "status", "content_hash",
+              postgresql_where=_ACTIVE_FILTER, sqlite_where=_ACTIVE_FILTER),
+        # Поиск по префиксу имени (LIKE 'sim_%')
+        Index("ix_scripts_name", "name", postgresql_ops={"name": "text_pattern_ops"}),
+        Index("ix_scripts_created_at", "created_at"),
+        # Сводка по кампаниям и статусам (app.statistics) — проход только по индексу
+        Index("ix_scripts_campaign_status", "campaign", "status"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -93,4 +141,20 @@ class Script(Base):
     status = Column(String, default="created")
     error = Column(Text, nullable=True)
     celery_task_id = Column(String, nullable=True)
-    result_portrait_id = Column(Integer, ForeignKey("object_portraits.id"), nullable=True)
\ No newline at end of file
+    result_portrait_id = Column(Integer, ForeignKey("object_portraits.id"), nullable=True, index=True)
+    campaign = Column(String, nullable=True)
+
+    # Кэш результатов: хэш входного файла без #title и версия решателя
+    content_hash = Column(String(64), nullable=True, index=True)
+    solver_version = Column(String, nullable=True)
+    result_source_id = Column(Integer, ForeignKey("scripts.id"), nullable=True, index=True)
+    runtime_sec = Column(Float, nullable=True)
+    # Прогресс решателя (0..1) и оценка оставшегося времени, обновляются во время счёта
+    progress = Column(Float, nullable=True)
+    progress_eta_sec = Column(Float, nullable=True)
+    # Во сколько раз упаковка уменьшила выходные файлы (app.result_pack)
+    compression_ratio = Column(Float, nullable=True)
+
+    # Размер задачи по сетке (см. app.grid_sizing)
+    cell_count = Column(BigInteger, nullable=True)
+    iteration_count = Column(Integer, nullable=True)
\ No newline at end of file
@@ -0,0 +1,291 @@
+import hashlib
+import json
+import math
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import h5py
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib import image as mpimage
+import numpy as np
+
+from app import storage
+from app.result_pack import ALL_COMPONENTS
+
+# Превью портретов: PNG-миниатюра и пирамида тайлов (уровень L прорежен в 2^L раз
+# по трассам и по времени). Картинки лежат в дисковом кэше с вытеснением LRU;
+# ключ записи (он же ETag) — путь, размер и время изменения файла результата,
+# поэтому портреты с общим файлом (кэш результатов) делят одно превью,
+# а перезапуск моделирования автоматически делает старое превью неактуальным.
+#
+# Переменные окружения:
+#   GPRMAX_PREVIEW_DIR        — кэш превью (по умолчанию {results}/.previews)
+#   GPRMAX_PREVIEW_MAX_BYTES  — размер кэша (по умолчанию 512 МБ)
+#   GPRMAX_PREVIEW_SWEEP_SEC  — как часто процесс пересчитывает размер кэша
+#                               обходом диска (по умолчанию 60 с)
+
+PREVIEW_DIR = Path(os.getenv("GPRMAX_PREVIEW_DIR", str(storage.RESULTS_BASE_DIR / ".previews"))).absolute()
+PREVIEW_MAX_BYTES = int(os.getenv("GPRMAX_PREVIEW_MAX_BYTES", str(512 * 1024 * 1024)))
+PREVIEW_SWEEP_SEC = float(os.getenv("GPRMAX_PREVIEW_SWEEP_SEC", "60"))
+
+TILE_SIZE = 256
+THUMB_SIZE = 256
+COLORMAP = "gray"
+# Амплитуда обрезается по перцентилю, иначе прямая волна забивает всю картинку
+CLIP_PERCENTILE = 99.0
+# Объём данных, по которому считается порог обрезки
+CLIP_SAMPLE_VALUES = 1024 * 1024
+# Уровни, которые рендерятся сразу после моделирования (остальные — по запросу)
+EAGER_MAX_TILES = 64
+
+_evict_lock = threading.Lock()
+
+# Размер кэша, известный процессу: итог последнего обхода плюс то, что процесс
+# записал после него. Записи других процессов (воркеры API, Celery) учитываются
+# при следующем обходе — не реже PREVIEW_SWEEP_SEC; задача рендера обходит кэш всегда.
+_size_lock = threading.Lock()
+_cache_bytes: Optional[int] = None
+_last_sweep = 0.0
+
+
+def source_etag(result_file: Path) -> str:
+    stat = result_file.stat()
+    key = f"{result_file.absolute()}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+def _dataset(f: h5py.File, component: Optional[str] = None) -> h5py.Dataset:
+    group = f["rxs"]["rx1"]
+    if component is None:
+        component = next((c for c in ALL_COMPONENTS if c in group), None)
+    if component is None or component not in group:
+        raise KeyError(f"Нет компоненты поля {component or ''} в {Path(f.filename).name}")
+    return group[component]
+
+
+def _as_2d(data: np.ndarray) -> np.ndarray:
+    return data if data.ndim == 2 else data[np.newaxis, :]
+
+
+def _read_decimated(result_file: Path, factor_traces: int, factor_samples: int) -> np.ndarray:
+    with h5py.File(result_file, "r") as f:
+        dataset = _dataset(f)
+        if dataset.ndim == 2:
+            return dataset[::factor_traces, ::factor_samples]
+        return dataset[::factor_samples][np.newaxis, :]
+
+
+def _shape(result_file: Path):
+    with h5py.File(result_file, "r") as f:
+        dataset = _dataset(f)
+        return (dataset.shape[0], dataset.shape[1]) if dataset.ndim == 2 else (1, dataset.shape[0])
+
+
+def _level_count(traces: int, samples: int) -> int:
+    # Последний уровень целиком помещается в один тайл
+    return max(1, math.ceil(math.log2(max(traces, samples, TILE_SIZE) / TILE_SIZE)) + 1)
+
+
+def _save_png(data: np.ndarray, path: Path, clip: float):
+    # Трассы по горизонтали, время сверху вниз
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}")
+    mpimage.imsave(tmp, _as_2d(data).T, cmap=COLORMAP, vmin=-clip, vmax=clip, format="png")
+    os.replace(tmp, path)
+
+
+class PreviewEntry:
+    """Запись дискового кэша превью для одного файла результата."""
+
+    def __init__(self, result_file: Path):
+        self.result_file = Path(result_file)
+        self.etag = source_etag(self.result_file)
+        self.dir = PREVIEW_DIR / self.etag
+        self._meta: Optional[Dict[str, Any]] = None
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        if self._meta is None:
+            meta_path = self.dir / "meta.json"
+            if meta_path.exists():
+                self._meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            else:
+                self._meta = self._build_meta()
+        return self._meta
+
+    def _build_meta(self) -> Dict[str, Any]:
+        traces, samples = _shape(self.result_file)
+        step = max(1, math.ceil(math.sqrt(traces * samples / CLIP_SAMPLE_VALUES)))
+        sample = _read_decimated(self.result_file, step, step)
+        clip = float(np.percentile(np.abs(sample), CLIP_PERCENTILE)) or float(np.abs(sample).max()) or 1.0
+        levels = []
+        for level in range(_level_count(traces, samples)):
+            factor = 2 ** level
+            width, height = math.ceil(traces / factor), math.ceil(samples / factor)
+            levels.append({
+                "level": level,
+                "factor": factor,
+                "width": width,
+                "height": height,
+                "tiles_x": math.ceil(width / TILE_SIZE),
+                "tiles_y": math.ceil(height / TILE_SIZE),
+            })
+        meta = {
+            "etag": self.etag,
+            "traces": traces,
+            "samples": samples,
+            "tile_size": TILE_SIZE,
+            "clip": clip,
+            "colormap": COLORMAP,
+            "levels": levels,
+        }
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.dir / f".meta.{uuid.uuid4().hex[:8]}"
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, self.dir / "meta.json")
+        return meta
+
+    def _touch(self):
+        # Время изменения директории — метка последнего обращения для LRU
+        try:
+            os.utime(self.dir)
+        except OSError:
+            pass
+
+    def thumbnail(self) -> Path:
+        path = self.dir / "thumb.png"
+        if not path.exists():
+            meta = self.meta
+            factor_traces = max(1, math.ceil(meta["traces"] / THUMB_SIZE))
+            factor_samples = max(1, math.ceil(meta["samples"] / THUMB_SIZE))
+            data = _read_decimated(self.result_file, factor_traces, factor_samples)
+            _save_png(data, path, meta["clip"])
+            _account(path)
+        self._touch()
+        return path
+
+    def tile(self, level: int, tx: int, ty: int) -> Path:
+        meta = self.meta
+        if not 0 <= level < len(meta["levels"]):
+            raise ValueError(f"Нет уровня {level}")
+        info = meta["levels"][level]
+        if not (0 <= tx < info["tiles_x"] and 0 <= ty < info["tiles_y"]):
+            raise ValueError(f"Нет тайла {tx},{ty} на уровне {level}")
+        path = self.dir / "tiles" / str(level) / f"{tx}_{ty}.png"
+        if not path.exists():
+            self._render_level(level, only=(tx, ty))
+            _account(path)
+        self._touch()
+        return path
+
+    def _render_level(self, level: int, only=None):
+        meta = self.meta
+        info = meta["levels"][level]
+        factor = info["factor"]
+        span = TILE_SIZE * factor
+        level_dir = self.dir / "tiles" / str(level)
+        level_dir.mkdir(parents=True, exist_ok=True)
+        with h5py.File(self.result_file, "r") as f:
+            dataset = _dataset(f)
+            for tx in range(info["tiles_x"]):
+                for ty in range(info["tiles_y"]):
+                    if only is not None and (tx, ty) != only:
+                        continue
+                    path = level_dir / f"{tx}_{ty}.png"
+                    if path.exists():
+                        continue
+                    # Из файла читается только гиперслэб тайла с шагом уровня
+                    samples = np.s_[ty * span:(ty + 1) * span:factor]
+                    if dataset.ndim == 2:
+                        data = dataset[tx * span:(tx + 1) * span:factor, samples]
+                    else:
+                        data = dataset[samples]
+                    _save_png(data, path, meta["clip"])
+
+    def render(self, max_tiles: int = EAGER_MAX_TILES) -> Dict[str, Any]:
+        """Миниатюра и все уровни пирамиды, где не больше max_tiles тайлов."""
+        self.thumbnail()
+        rendered = []
+        for info in self.meta["levels"]:
+            if info["tiles_x"] * info["tiles_y"] <= max_tiles:
+                self._render_level(info["level"])
+                rendered.append(info["level"])
+        evict()
+        return {"etag": self.etag, "levels_rendered": rendered}
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _account(path: Path):
+    """
+    Учесть новый файл кэша (промах миниатюры или тайла). Обход диска — только
+    если кэш, по оценке процесса, переполнен или с прошлого обхода прошло
+    PREVIEW_SWEEP_SEC; пока другой поток обходит кэш, промахи его не ждут.
+    """
+    global _cache_bytes
+    try:
+        size = path.stat().st_size
+    except OSError:
+        size = 0
+    with _size_lock:
+        if _cache_bytes is not None:
+            _cache_bytes += size
+        due = (_cache_bytes is None or _cache_bytes > PREVIEW_MAX_BYTES
+               or time.monotonic() - _last_sweep >= PREVIEW_SWEEP_SEC)
+    if due:
+        evict(blocking=False)
+
+
+def evict(max_bytes: int = PREVIEW_MAX_BYTES, blocking: bool = True) -> List[str]:
+    """
+    Удалить самые давно использованные записи, пока кэш больше max_bytes.
+    blocking=False — не ждать, если кэш уже обходит другой поток.
+    """
+    global _cache_bytes, _last_sweep
+    if not PREVIEW_DIR.exists():
+        return []
+    if not _evict_lock.acquire(blocking=blocking):
+        return []
+    try:
+        entries = []
+        for entry in PREVIEW_DIR.iterdir():
+            if entry.is_dir():
+                entries.append((entry.stat().st_mtime, entry, _dir_size(entry)))
+        total = sum(size for _, _, size in entries)
+        removed = []
+        for _, entry, size in sorted(entries, key=lambda item: item[0]):
+            if total <= max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed.append(entry.name)
+        with _size_lock:
+            _cache_bytes = total
+            _last_sweep = time.monotonic()
+        return removed
+    finally:
+        _evict_lock.release()
+
+
+def render_portrait(result_file_path: str) -> Optional[Dict[str, Any]]:
+    path = Path(result_file_path)
+    if not path.is_file():
+        return None
+    started = time.time()
+    result = PreviewEntry(path).render()
+    result["render_sec"] = round(time.time() - started, 3)
+    return result
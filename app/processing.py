@@ -0,0 +1,344 @@
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import h5py
+import numpy as np
+from scipy import ndimage, signal
+
+from app.bscan_merge import chunk_shape
+from app.result_pack import ALL_COMPONENTS, PackSettings
+
+# Обработка радарограмм: цепочка шагов над массивом (трассы × отсчёты).
+# Каждый шаг векторизован по всему блоку трасс; файл читается блоками, так что
+# память ограничена размером блока, а не B-скана. Шагам, которым нужна
+# статистика по всему B-скану (нулевое время, средняя трасса), предшествует
+# проход "fit" по блокам; небольшие B-сканы читаются с диска один раз.
+# Результат пишется рядом с исходным: ./results/{id}/processed.h5
+# (та же структура rxs/rx1/{компонента}, в атрибутах — цепочка и её параметры).
+#
+# Переменные окружения:
+#   GPRMAX_PROCESSING          — 0, чтобы не запускать обработку после моделирования
+#   GPRMAX_PROCESSING_CHUNK_MB — размер блока трасс в памяти (по умолчанию 64 МБ)
+
+PROCESSING_ENABLED = os.getenv("GPRMAX_PROCESSING", "1") != "0"
+CHUNK_BYTES = int(os.getenv("GPRMAX_PROCESSING_CHUNK_MB", "64")) * 1024 * 1024
+
+PROCESSED_FILENAME = "processed.h5"
+
+# Цепочка по умолчанию; переопределяется custom_parameters.processing
+DEFAULT_CHAIN = [
+    {"step": "dewow"},
+    {"step": "time_zero"},
+    {"step": "background_removal"},
+    {"step": "bandpass"},
+    {"step": "gain", "mode": "sec"},
+]
+
+
+class ProcessingStep:
+    """Шаг цепочки. needs_fit — шагу нужна статистика по всем трассам."""
+    needs_fit = False
+
+    def __init__(self, dt: float, **params):
+        self.dt = dt
+        self.params = params
+
+    def fit(self, chunk: np.ndarray):
+        pass
+
+    def finish_fit(self):
+        pass
+
+    def apply(self, chunk: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(self.params)
+
+
+class Dewow(ProcessingStep):
+    """Удаление низкочастотного "вау": вычитание скользящего среднего по времени."""
+
+    def __init__(self, dt, window_sec: Optional[float] = None, center_freq: Optional[float] = None, **params):
+        super().__init__(dt, **params)
+        # Окно — около периода центральной частоты антенны
+        if window_sec is None:
+            window_sec = 1.0 / center_freq if center_freq else 1e-9
+        self.window = max(3, int(round(window_sec / dt)))
+        self.params["window_sec"] = window_sec
+
+    def apply(self, chunk):
+        return chunk - ndimage.uniform_filter1d(chunk, self.window, axis=1, mode="nearest")
+
+
+class TimeZero(ProcessingStep):
+    """Сдвиг всех трасс на общее нулевое время — медиану первых вступлений."""
+    needs_fit = True
+
+    def __init__(self, dt, threshold: float = 0.1, **params):
+        super().__init__(dt, threshold=threshold, **params)
+        self.threshold = threshold
+        self._first_breaks: List[np.ndarray] = []
+        self.shift = 0
+
+    def fit(self, chunk):
+        amplitude = np.abs(chunk)
+        peak = amplitude.max(axis=1, keepdims=True)
+        above = amplitude >= self.threshold * np.where(peak > 0, peak, np.inf)
+        has_break = above.any(axis=1)
+        self._first_breaks.append(np.argmax(above, axis=1)[has_break])
+
+    def finish_fit(self):
+        breaks = np.concatenate(self._first_breaks) if self._first_breaks else np.array([])
+        self.shift = int(np.median(breaks)) if breaks.size else 0
+        self._first_breaks = []
+
+    def apply(self, chunk):
+        if self.shift == 0:
+            return chunk
+        shifted = np.zeros_like(chunk)
+        shifted[:, :chunk.shape[1] - self.shift] = chunk[:, self.shift:]
+        return shifted
+
+    def describe(self):
+        return dict(self.params, shift_samples=self.shift, shift_sec=self.shift * self.dt)
+
+
+class BackgroundRemoval(ProcessingStep):
+    """Вычитание средней трассы (горизонтальные отражения, прямая волна)."""
+    needs_fit = True
+
+    def __init__(self, dt, **params):
+        super().__init__(dt, **params)
+        self._sum: Optional[np.ndarray] = None
+        self._count = 0
+        self.mean_trace: Optional[np.ndarray] = None
+
+    def fit(self, chunk):
+        total = chunk.sum(axis=0, dtype=np.float64)
+        self._sum = total if self._sum is None else self._sum + total
+        self._count += chunk.shape[0]
+
+    def finish_fit(self):
+        if self._count:
+            self.mean_trace = (self._sum / self._count).astype(np.float32)
+
+    def apply(self, chunk):
+        if self.mean_trace is None or self._count < 2:
+            # Для одиночной трассы (A-скан) фон не определён
+            return chunk
+        return chunk - self.mean_trace
+
+
+class Bandpass(ProcessingStep):
+    """Полосовой фильтр Баттерворта (нулевая фаза) в полосе антенны."""
+
+    def __init__(self, dt, low_hz: Optional[float] = None, high_hz: Optional[float] = None,
+                 order: int = 4, frequency_range: Optional[Sequence[float]] = None, **params):
+        super().__init__(dt, **params)
+        if low_hz is None or high_hz is None:
+            if not frequency_range:
+                raise ValueError("Для полосового фильтра нужна полоса частот антенны")
+            low_hz, high_hz = frequency_range
+        nyquist = 0.5 / dt
+        low_hz = max(low_hz, 1e-6 * nyquist)
+        high_hz = min(high_hz, 0.99 * nyquist)
+        if low_hz >= high_hz:
+            raise ValueError(f"Неверная полоса фильтра: {low_hz}..{high_hz} Гц")
+        self.params.update(low_hz=low_hz, high_hz=high_hz, order=order)
+        self.sos = signal.butter(order, [low_hz, high_hz], btype="bandpass", fs=1.0 / dt, output="sos")
+
+    def apply(self, chunk):
+        if chunk.shape[1] <= 3 * (2 * len(self.sos) + 1):
+            return chunk
+        return signal.sosfiltfilt(self.sos, chunk, axis=1).astype(np.float32, copy=False)
+
+
+class Gain(ProcessingStep):
+    """
+    Усиление: sec — компенсация сферического расхождения и затухания
+    g(t) = t^power * exp(alpha * t); agc — нормировка на RMS в скользящем окне.
+    """
+
+    def __init__(self, dt, mode: str = "sec", power: float = 1.0, alpha: float = 0.0,
+                 window_sec: float = 5e-9, max_gain: float = 1e6, **params):
+        super().__init__(dt, mode=mode, **params)
+        if mode not in ("sec", "agc"):
+            raise ValueError(f"Неизвестный вид усиления: {mode}")
+        self.mode = mode
+        self.max_gain = max_gain
+        if mode == "sec":
+            self.params.update(power=power, alpha=alpha)
+            self.power, self.alpha = power, alpha
+        else:
+            self.window = max(3, int(round(window_sec / dt)))
+            self.params.update(window_sec=window_sec)
+        self._curve: Optional[np.ndarray] = None
+
+    def _sec_curve(self, samples: int) -> np.ndarray:
+        if self._curve is None or self._curve.shape[0] != samples:
+            t = np.arange(samples, dtype=np.float64) * self.dt
+            # Степенная часть нормирована на длину окна, чтобы не зависеть от единиц времени
+            t_norm = t / max(t[-1], self.dt)
+            curve = np.power(t_norm, self.power) * np.exp(self.alpha * t)
+            self._curve = np.minimum(curve, self.max_gain).astype(np.float32)
+        return self._curve
+
+    def apply(self, chunk):
+        if self.mode == "sec":
+            return chunk * self._sec_curve(chunk.shape[1])
+        rms = np.sqrt(ndimage.uniform_filter1d(chunk * chunk, self.window, axis=1, mode="nearest"))
+        floor = rms.max(axis=1, keepdims=True) / self.max_gain
+        return chunk / np.maximum(rms, np.maximum(floor, 1e-30))
+
+
+STEPS = {
+    "dewow": Dewow,
+    "time_zero": TimeZero,
+    "background_removal": BackgroundRemoval,
+    "bandpass": Bandpass,
+    "gain": Gain,
+}
+
+
+def build_chain(chain: Sequence[Dict[str, Any]], dt: float,
+                frequency_range: Optional[Sequence[float]] = None) -> List[ProcessingStep]:
+    steps = []
+    center_freq = float(np.sqrt(frequency_range[0] * frequency_range[1])) if frequency_range else None
+    for spec in chain:
+        spec = dict(spec)
+        name = spec.pop("step")
+        if name not in STEPS:
+            raise ValueError(f"Неизвестный шаг обработки: {name}")
+        if name == "dewow":
+            spec.setdefault("center_freq", center_freq)
+        elif name == "bandpass":
+            spec.setdefault("frequency_range", frequency_range)
+        steps.append(STEPS[name](dt, **spec))
+    return steps
+
+
+def _chunk_traces(samples: int) -> int:
+    # float32 плюс временные массивы фильтров — около 4 копий блока
+    return max(1, CHUNK_BYTES // (samples * 4 * 4))
+
+
+def _iter_chunks(dataset: h5py.Dataset, cached: Optional[np.ndarray]) -> Iterator[Tuple[int, np.ndarray]]:
+    if cached is not None:
+        yield 0, cached
+        return
+    traces, samples = dataset.shape
+    step = _chunk_traces(samples)
+    for start in range(0, traces, step):
+        yield start, dataset[start:start + step].astype(np.float32, copy=False)
+
+
+def _run_steps(steps: Sequence[ProcessingStep], chunk: np.ndarray) -> np.ndarray:
+    for step in steps:
+        chunk = step.apply(chunk)
+    return chunk
+
+
+def process_file(source: Path, dest: Path, chain: Sequence[Dict[str, Any]],
+                 frequency_range: Optional[Sequence[float]] = None, component: Optional[str] = None,
+                 settings: Optional[PackSettings] = None) -> Dict[str, Any]:
+    """Обработать одну компоненту поля из source и записать её в dest."""
+    settings = settings or PackSettings()
+    with h5py.File(source, "r") as src:
+        dt = float(src.attrs["dt"])
+        group = src["rxs"]["rx1"]
+        if component is None:
+            component = next((c for c in ALL_COMPONENTS if c in group), None)
+        if component is None or component not in group:
+            raise KeyError(f"Нет компоненты поля {component or ''} в {source.name}")
+        dataset = group[component]
+        if dataset.ndim != 2:
+            # Одиночная трасса — как B-скан из одной трассы
+            dataset_2d = dataset[()][np.newaxis, :].astype(np.float32)
+        else:
+            dataset_2d = None
+        traces, samples = dataset.shape if dataset.ndim == 2 else (1, dataset.shape[0])
+
+        steps = build_chain(chain, dt, frequency_range)
+        cached = dataset_2d
+        if cached is None and traces <= _chunk_traces(samples):
+            # Небольшой B-скан читается один раз на все проходы
+            cached = dataset[()].astype(np.float32, copy=False)
+
+        # Проход fit для каждого шага, которому нужна статистика по всем трассам
+        for index, step in enumerate(steps):
+            if not step.needs_fit:
+                continue
+            for _, chunk in _iter_chunks(dataset, cached):
+                step.fit(_run_steps(steps[:index], chunk))
+            step.finish_fit()
+
+        description = [describe_step(spec["step"], step) for spec, step in zip(chain, steps)]
+        tmp = dest.with_name(f".{dest.name}.{uuid.uuid4().hex[:8]}")
+        try:
+            with h5py.File(tmp, "w") as out:
+                out.attrs["dt"] = dt
+                out.attrs["traces"] = traces
+                out.attrs["samples"] = samples
+                out.attrs["source_file"] = source.name
+                out.attrs["component"] = component
+                out.attrs["processing_chain"] = json.dumps(description)
+                result = out.create_group("rxs/rx1").create_dataset(
+                    component, shape=(traces, samples), dtype=np.float32,
+                    chunks=chunk_shape(traces, samples, 4), **settings.dataset_options()
+                )
+                for start, chunk in _iter_chunks(dataset, cached):
+                    result[start:start + chunk.shape[0]] = _run_steps(steps, chunk)
+            os.replace(tmp, dest)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    return {
+        "component": component,
+        "traces": traces,
+        "samples": samples,
+        "chain": description,
+    }
+
+
+def describe_step(name: str, step: ProcessingStep) -> Dict[str, Any]:
+    description = {"step": name}
+    for key, value in step.describe().items():
+        if isinstance(value, (np.floating, np.integer)):
+            value = value.item()
+        if isinstance(value, (tuple, np.ndarray)):
+            value = list(value)
+        description[key] = value
+    return description
+
+
+def frequency_range_for(config_json: Dict[str, Any], antenna=None) -> Optional[List[float]]:
+    """Полоса фильтра: из конфигурации, параметров антенны или её центральной частоты."""
+    configured = (config_json.get("gpr_config") or {}).get("frequency_range")
+    if configured:
+        return list(configured)
+    if antenna is not None:
+        antenna_range = (antenna.parameters or {}).get("frequency_range")
+        if antenna_range:
+            return list(antenna_range)
+        if antenna.frequency:
+            return [0.5 * antenna.frequency, 2.0 * antenna.frequency]
+    return None
+
+
+def chain_for(config_json: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return (config_json.get("custom_parameters") or {}).get("processing") or DEFAULT_CHAIN
+
+
+def process_result_dir(result_dir: Path, source: Path, config_json: Dict[str, Any],
+                       antenna=None) -> Dict[str, Any]:
+    frequency_range = frequency_range_for(config_json, antenna)
+    chain = [dict(s) for s in chain_for(config_json)]
+    if frequency_range is None:
+        # Без полосы антенны фильтр не строится — шаг пропускается
+        chain = [s for s in chain if s["step"] != "bandpass" or ("low_hz" in s and "high_hz" in s)]
+    return process_file(source, result_dir / PROCESSED_FILENAME, chain, frequency_range)
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, aliased
+
+from app import models
+from app.cost_estimator import trace_count
+from app.result_pack import required_components
+
+# Кэш результатов по содержимому входного файла gprMax.
+# Скрипты, отличающиеся только строкой #title, дают одинаковый хэш и
+# не моделируются повторно: новый скрипт ссылается на готовый результат.
+# Параметры запуска, которых нет во входном файле (число трасс -n), и
+# компоненты поля, которые остаются в упакованном результате, тоже входят
+# в хэш — см. run_parameters.
+
+
+def _detect_solver_version() -> str:
+    version = os.getenv("GPRMAX_VERSION")
+    if version:
+        return version
+    try:
+        from importlib.metadata import version as package_version
+        return package_version("gprMax")
+    except Exception:
+        return "unknown"
+
+
+SOLVER_VERSION = _detect_solver_version()
+
+IGNORED_COMMANDS = ("#title:",)
+
+
+def canonical_script(script_content: str) -> str:
+    """Входной файл без #title, пустых строк и лишних пробелов."""
+    lines = []
+    for line in script_content.splitlines():
+        line = " ".join(line.split())
+        if not line or line.startswith(IGNORED_COMMANDS):
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def run_parameters(config_json: Dict[str, Any], script_content: str = "") -> Dict[str, Any]:
+    """
+    Параметры запуска, которые задаются не входным файлом: число трасс (-n)
+    и компоненты поля, с которыми результат упаковывается (app.result_pack).
+    Компоненты входят в хэш и при выключенной упаковке — ключ не зависит от
+    настроек процесса, который его считает.
+    """
+    try:
+        traces = trace_count(config_json)
+    except (KeyError, TypeError, ValueError):
+        traces = None
+    return {"traces": traces, "components": required_components(config_json, script_content)}
+
+
+def content_hash(script_content: str, config_json: Dict[str, Any],
+                 solver_version: str = SOLVER_VERSION) -> str:
+    digest = hashlib.sha256()
+    digest.update(solver_version.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(json.dumps(run_parameters(config_json, script_content), sort_keys=True).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(canonical_script(script_content).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def ensure_hash(script: models.Script):
+    """
+    Пересчитать хэш перед поиском в кэше: для скриптов, созданных до появления
+    кэша или до изменения состава хэша. Результаты со старым хэшем просто
+    не находятся и считаются заново.
+    """
+    expected = content_hash(script.script_content, script.config_json or {}, SOLVER_VERSION)
+    if script.content_hash != expected or script.solver_version != SOLVER_VERSION:
+        script.solver_version = SOLVER_VERSION
+        script.content_hash = expected
+
+
+def find_cached_result(db: Session, script: models.Script) -> Optional[models.Script]:
+    """Завершённый скрипт с тем же хэшем, который сам был посчитан (не ссылка)."""
+    return db.query(models.Script).filter(
+        models.Script.content_hash == script.content_hash,
+        models.Script.solver_version == script.solver_version,
+        models.Script.status == "completed",
+        models.Script.result_source_id == None,
+        models.Script.id != script.id,
+    ).order_by(models.Script.id).first()
+
+
+def find_running_duplicate(db: Session, script: models.Script) -> Optional[models.Script]:
+    """Такой же скрипт, который уже стоит в очереди или считается."""
+    return db.query(models.Script).filter(
+        models.Script.content_hash == script.content_hash,
+        models.Script.solver_version == script.solver_version,
+        models.Script.status.in_(["pending", "running"]),
+        models.Script.id != script.id,
+    ).order_by(models.Script.id).first()
+
+
+def link_to_result(db: Session, script: models.Script, source: models.Script):
+    """Пометить скрипт выполненным со ссылкой на результат source."""
+    script.status = "completed"
+    script.error = None
+    script.result_source_id = source.id
+    if script.result_portrait_id and source.result_portrait_id:
+        portrait = db.get(models.ObjectPortrait, script.result_portrait_id)
+        source_portrait = db.get(models.ObjectPortrait, source.result_portrait_id)
+        if portrait and source_portrait:
+            portrait.result_file_path = source_portrait.result_file_path
+            # Превью и сигнатура — после коммита, как для посчитанных портретов
+            db.info.setdefault("linked_portraits", set()).add(portrait.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _queue_linked_portraits(session):
+    portrait_ids = session.info.pop("linked_portraits", None)
+    if portrait_ids:
+        from app.tasks import queue_portrait_tasks
+        for portrait_id in sorted(portrait_ids):
+            queue_portrait_tasks(portrait_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_linked_portraits(session):
+    session.info.pop("linked_portraits", None)
+
+
+def wait_for(script: models.Script, source: models.Script):
+    """Не запускать дубликат: дождаться результата уже запущенного скрипта."""
+    script.status = "waiting"
+    script.error = None
+    script.result_source_id = source.id
+
+
+def resolve_waiters(db: Session, source: models.Script, success: bool):
+    """Вызывается по завершении source: связать или освободить ожидающие скрипты."""
+    waiters = db.query(models.Script).filter(
+        models.Script.result_source_id == source.id,
+        models.Script.status == "waiting",
+    ).all()
+    for waiter in waiters:
+        if success:
+            link_to_result(db, waiter, source)
+        else:
+            waiter.status = "failed"
+            waiter.result_source_id = None
+            waiter.error = f"Исходный скрипт {source.id} завершился с ошибкой"
+    return len(waiters)
+
+
+def cache_report(db: Session, campaign: Optional[str] = None) -> Dict[str, Any]:
+    """Сколько запусков и часов решателя сэкономил кэш, по кампаниям."""
+    source = aliased(models.Script)
+    query = db.query(
+        models.Script.campaign,
+        func.count(models.Script.id),
+        func.coalesce(func.sum(source.runtime_sec), 0.0),
+    ).join(source, models.Script.result_source_id == source.id).filter(
+        models.Script.status == "completed"
+    )
+    if campaign is not None:
+        query = query.filter(models.Script.campaign == campaign)
+    rows = query.group_by(models.Script.campaign).all()
+
+    campaigns = {}
+    for name, cached_runs, saved_sec in rows:
+        campaigns[name or "-"] = {
+            "cached_runs": cached_runs,
+            "solver_hours_saved": round(float(saved_sec) / 3600.0, 3),
+        }
+    return {
+        "solver_version": SOLVER_VERSION,
+        "campaigns": campaigns,
+        "total_cached_runs": sum(c["cached_runs"] for c in campaigns.values()),
+        "total_solver_hours_saved": round(sum(c["solver_hours_saved"] for c in campaigns.values()), 3),
+    }
@@ -0,0 +1,245 @@
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import h5py
+import numpy as np
+
+# Упаковка результатов gprMax для хранения: поля приёмников сжимаются
+# (shuffle + gzip/LZF), float64 решателя приводится к float32, а компоненты
+# поля, не нужные для запрошенных видов сканирования, отбрасываются.
+# Упакованный файл остаётся обычным HDF5 с той же структурой (rxs/rxN/Ez, …),
+# поэтому h5py и сторонние инструменты читают его без изменений; read_field
+# дополнительно возвращает данные в исходном типе.
+#
+# Переменные окружения:
+#   GPRMAX_PACK_RESULTS     — 0, чтобы отключить упаковку (по умолчанию 1)
+#   GPRMAX_PACK_FLOAT32     — приводить float64 к float32 (по умолчанию 1)
+#   GPRMAX_PACK_COMPRESSION — gzip | lzf | none (по умолчанию gzip)
+#   GPRMAX_PACK_GZIP_LEVEL  — уровень gzip 1..9 (по умолчанию 4)
+
+PACK_ENABLED = os.getenv("GPRMAX_PACK_RESULTS", "1") != "0"
+PACK_FLOAT32 = os.getenv("GPRMAX_PACK_FLOAT32", "1") != "0"
+PACK_COMPRESSION = os.getenv("GPRMAX_PACK_COMPRESSION", "gzip")
+PACK_GZIP_LEVEL = int(os.getenv("GPRMAX_PACK_GZIP_LEVEL", "4"))
+
+PACK_FORMAT = "results"
+PACK_FORMAT_VERSION = 1
+
+ELECTRIC_COMPONENTS = ["Ex", "Ey", "Ez"]
+MAGNETIC_COMPONENTS = ["Hx", "Hy", "Hz"]
+ALL_COMPONENTS = ELECTRIC_COMPONENTS + MAGNETIC_COMPONENTS
+
+SOURCE_COMMANDS = ("#hertzian_dipole:", "#magnetic_dipole:", "#voltage_source:")
+
+# Целевой размер чанка для файлов трасс (одномерные массивы)
+CHUNK_SAMPLES = 64 * 1024
+
+
+class PackSettings:
+    def __init__(self, float32: bool = PACK_FLOAT32, compression: str = PACK_COMPRESSION,
+                 gzip_level: int = PACK_GZIP_LEVEL):
+        if compression not in ("gzip", "lzf", "none"):
+            raise ValueError(f"Неизвестный вид сжатия: {compression}")
+        self.float32 = float32
+        self.compression = compression
+        self.gzip_level = gzip_level
+
+    def dataset_options(self) -> Dict[str, Any]:
+        if self.compression == "none":
+            return {}
+        options = {"compression": self.compression, "shuffle": True}
+        if self.compression == "gzip":
+            options["compression_opts"] = self.gzip_level
+        return options
+
+
+def source_polarisation(script_content: str) -> Optional[str]:
+    """Поляризация источника (x, y или z) из входного файла gprMax."""
+    for line in script_content.splitlines():
+        line = line.strip()
+        if line.startswith(SOURCE_COMMANDS):
+            values = line.partition(":")[2].split()
+            if values and values[0] in ("x", "y", "z"):
+                return values[0]
+    return None
+
+
+def required_components(config_json: Dict[str, Any], script_content: str = "") -> List[str]:
+    """
+    Компоненты поля, которые нужно хранить.
+    A- и B-скан — это трассы вдоль поляризации антенны (E той же оси);
+    для C-скана сохраняются все электрические компоненты.
+    custom_parameters.output_components задаёт список явно.
+    """
+    custom = (config_json.get("custom_parameters") or {}).get("output_components")
+    if custom:
+        return [c for c in ALL_COMPONENTS if c in custom]
+
+    scan_types = (config_json.get("output") or {}).get("scan_types") or ["A-scan"]
+    if "C-scan" in scan_types:
+        return list(ELECTRIC_COMPONENTS)
+    polarisation = source_polarisation(script_content)
+    if polarisation is None:
+        return list(ELECTRIC_COMPONENTS)
+    return [f"E{polarisation}"]
+
+
+def is_packed(path: Path) -> bool:
+    with h5py.File(path, "r") as f:
+        return f.attrs.get("pack_format") == PACK_FORMAT
+
+
+def _chunks(shape: Tuple[int, ...], source_chunks) -> Optional[Tuple[int, ...]]:
+    if not shape or 0 in shape:
+        return None
+    if source_chunks:
+        return source_chunks
+    if len(shape) == 1:
+        return (min(shape[0], CHUNK_SAMPLES),)
+    return True
+
+
+def _copy_attrs(src, dest):
+    for key, value in src.attrs.items():
+        dest.attrs[key] = value
+
+
+def _is_field(name: str, dataset: h5py.Dataset) -> bool:
+    return name in ALL_COMPONENTS and dataset.dtype.kind == "f"
+
+
+def pack_file(src_path: Path, dest_path: Path, components: Iterable[str],
+              settings: Optional[PackSettings] = None) -> Dict[str, Any]:
+    """Записать упакованную копию src_path в dest_path."""
+    settings = settings or PackSettings()
+    keep = set(components)
+    options = settings.dataset_options()
+    dropped = set()
+    dtypes = {}
+
+    with h5py.File(src_path, "r") as src, h5py.File(dest_path, "w") as dest:
+        _copy_attrs(src, dest)
+        present = {c for rx in src.get("rxs", {}).values() for c in rx if c in ALL_COMPONENTS}
+        if present and not keep & present:
+            # Нужных компонент в файле нет — ничего не отбрасываем
+            keep = present
+
+        def copy(name, obj):
+            if isinstance(obj, h5py.Group):
+                _copy_attrs(obj, dest.require_group(name))
+                return
+            parent, _, leaf = name.rpartition("/")
+            group = dest.require_group(parent) if parent else dest
+            if name.startswith("rxs/") and _is_field(leaf, obj):
+                if leaf not in keep:
+                    dropped.add(leaf)
+                    return
+                dtype = obj.dtype
+                if settings.float32 and dtype == np.float64:
+                    dtype = np.dtype(np.float32)
+                dtypes[leaf] = str(obj.dtype)
+                out = group.create_dataset(leaf, shape=obj.shape, dtype=dtype,
+                                           chunks=_chunks(obj.shape, obj.chunks), **options)
+                # Построчно по чанкам первой оси, чтобы не держать в памяти весь B-скан
+                step = obj.chunks[0] if obj.chunks and obj.ndim > 1 else (obj.shape[0] if obj.shape else 1)
+                if obj.ndim == 0:
+                    out[()] = obj[()]
+                else:
+                    for start in range(0, obj.shape[0], step):
+                        out[start:start + step] = obj[start:start + step]
+            else:
+                out = group.create_dataset(leaf, data=obj[()])
+            _copy_attrs(obj, out)
+
+        src.visititems(copy)
+
+        dest.attrs["pack_format"] = PACK_FORMAT
+        dest.attrs["pack_version"] = PACK_FORMAT_VERSION
+        dest.attrs["pack_compression"] = settings.compression
+        dest.attrs["pack_components"] = sorted(dtypes)
+        dest.attrs["pack_dropped_components"] = sorted(dropped)
+        # Исходный тип полей — read_field возвращает данные в нём
+        dest.attrs["pack_original_dtype"] = next(iter(dtypes.values()), "float64")
+
+    return {
+        "original_bytes": src_path.stat().st_size,
+        "packed_bytes": dest_path.stat().st_size,
+        "dropped_components": sorted(dropped),
+    }
+
+
+def pack_in_place(path: Path, components: Iterable[str], settings: Optional[PackSettings] = None) -> Dict[str, Any]:
+    """Упаковать файл на месте: временный файл рядом и rename."""
+    tmp_path = path.with_suffix(path.suffix + ".packing")
+    try:
+        stats = pack_file(path, tmp_path, components, settings)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return stats
+
+
+def pack_result_dir(result_dir: Path, config_json: Dict[str, Any], script_content: str = "",
+                    settings: Optional[PackSettings] = None) -> Optional[Dict[str, Any]]:
+    """
+    Упаковать все выходные файлы (.out/.h5) в папке результатов.
+    Возвращает сводку со степенью сжатия или None, если упаковывать нечего.
+    """
+    components = required_components(config_json, script_content)
+    original = packed = 0
+    files = 0
+    dropped = set()
+    for path in sorted(result_dir.glob("*")):
+        if path.suffix not in (".out", ".h5") or is_packed(path):
+            continue
+        stats = pack_in_place(path, components, settings)
+        original += stats["original_bytes"]
+        packed += stats["packed_bytes"]
+        dropped.update(stats["dropped_components"])
+        files += 1
+    if not files:
+        return None
+    return {
+        "files": files,
+        "components": components,
+        "dropped_components": sorted(dropped),
+        "original_bytes": original,
+        "packed_bytes": packed,
+        "compression_ratio": round(original / packed, 3) if packed else None,
+    }
+
+
+@contextmanager
+def open_result(path: Path):
+    """Открыть файл результата (упакованный или исходный) только для чтения."""
+    f = h5py.File(path, "r")
+    try:
+        yield f
+    finally:
+        f.close()
+
+
+def read_field(path: Path, rx: str = "rx1", component: Optional[str] = None,
+               selection=()) -> np.ndarray:
+    """
+    Прочитать поле приёмника; для упакованных файлов данные возвращаются
+    в исходном типе. component=None — первая сохранённая компонента E.
+    selection — срез по массиву (например, np.s_[10:20]).
+    """
+    with open_result(path) as f:
+        group = f["rxs"][rx]
+        if component is None:
+            available = [c for c in ALL_COMPONENTS if c in group]
+            if not available:
+                raise KeyError(f"{rx}: нет компонент поля")
+            component = available[0]
+        if component not in group:
+            raise KeyError(f"{rx}/{component} отсутствует в {path.name}")
+        data = group[component][selection]
+        original = f.attrs.get("pack_original_dtype")
+        if original is not None:
+            data = np.asarray(data).astype(str(original), copy=False)
+        return data
@@ -0,0 +1,115 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import h5py
+import numpy as np
+
+from app.bscan_merge import MERGED_FILENAME, trace_files
+from app.result_pack import ALL_COMPONENTS
+from app.processing import PROCESSED_FILENAME
+
+# Чтение части результата без загрузки файла целиком: диапазон трасс,
+# временное окно, прореживание и одна компонента поля. Из HDF5 читаются
+# только нужные гиперслэбы; ответ — сырые float32 little-endian (трассы × отсчёты).
+
+SLICE_DTYPE = np.dtype("<f4")
+# Ограничение на размер одного ответа (значений float32)
+MAX_SLICE_VALUES = 16 * 1024 * 1024
+
+
+def find_result_file(result_dir: Path) -> Optional[Path]:
+    """Собранный B-скан, иначе первый .h5/.out в папке результатов."""
+    merged = result_dir / MERGED_FILENAME
+    if merged.is_file():
+        return merged
+    if not result_dir.is_dir():
+        return None
+    candidates = [p for p in sorted(result_dir.glob("*.h5")) if p.name != PROCESSED_FILENAME] \
+        or sorted(result_dir.glob("*.out"))
+    return candidates[0] if candidates else None
+
+
+def _component(group: h5py.Group, component: Optional[str]) -> str:
+    if component is None:
+        available = [c for c in ALL_COMPONENTS if c in group]
+        if not available:
+            raise KeyError("нет компонент поля")
+        return available[0]
+    if component not in group:
+        raise KeyError(f"компонента {component} отсутствует")
+    return component
+
+
+def _bounds(start: Optional[int], stop: Optional[int], size: int) -> Tuple[int, int]:
+    start = 0 if start is None else max(0, min(start, size))
+    stop = size if stop is None else max(start, min(stop, size))
+    return start, stop
+
+
+def read_slice(result_dir: Path, stem: str, rx: str = "rx1", component: Optional[str] = None,
+               first_trace: Optional[int] = None, last_trace: Optional[int] = None, trace_step: int = 1,
+               t_start: Optional[float] = None, t_end: Optional[float] = None,
+               decimate: int = 1, product: str = "raw") -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Часть результата как массив float32 (трассы × отсчёты).
+    Трассы first_trace..last_trace включительно (нумерация с 0), время в секундах.
+    Если B-скан не собран, трассы читаются из отдельных файлов.
+    product="processed" — результат обработки (app.processing).
+    """
+    trace_step = max(1, trace_step)
+    decimate = max(1, decimate)
+    separate: List[Path] = []
+    if product == "processed":
+        path = result_dir / PROCESSED_FILENAME
+        if not path.is_file():
+            raise FileNotFoundError("Обработанный результат отсутствует")
+    else:
+        path = find_result_file(result_dir)
+        if path is None:
+            raise FileNotFoundError("Файл результата отсутствует")
+        if path.name != MERGED_FILENAME:
+            separate = trace_files(result_dir, stem)
+
+    with h5py.File(path, "r") as f:
+        group = f["rxs"][rx]
+        component = _component(group, component)
+        dataset = group[component]
+        dt = float(f.attrs["dt"])
+        if dataset.ndim == 2:
+            traces, samples = dataset.shape
+        else:
+            traces, samples = max(len(separate), 1), dataset.shape[0]
+
+        t0, t1 = _bounds(first_trace, None if last_trace is None else last_trace + 1, traces)
+        s0 = None if t_start is None else int(np.floor(t_start / dt))
+        s1 = None if t_end is None else int(np.ceil(t_end / dt)) + 1
+        s0, s1 = _bounds(s0, s1, samples)
+
+        shape = (len(range(t0, t1, trace_step)), len(range(s0, s1, decimate)))
+        if shape[0] * shape[1] > MAX_SLICE_VALUES:
+            raise ValueError(f"Слишком большой срез {shape[0]}x{shape[1]}, увеличьте прореживание")
+
+        time_slice = np.s_[s0:s1:decimate]
+        if dataset.ndim == 2:
+            data = dataset[t0:t1:trace_step, time_slice]
+        elif not separate:
+            data = dataset[time_slice][np.newaxis, :]
+        else:
+            data = np.empty(shape, dtype=SLICE_DTYPE)
+            for row, index in enumerate(range(t0, t1, trace_step)):
+                with h5py.File(separate[index], "r") as trace:
+                    data[row] = trace["rxs"][rx][component][time_slice]
+
+    meta = {
+        "shape": shape,
+        "dtype": SLICE_DTYPE.str,
+        "component": component,
+        "rx": rx,
+        "first_trace": t0,
+        "trace_step": trace_step,
+        "dt": dt * decimate,
+        "t0": s0 * dt,
+        "traces_total": traces,
+        "samples_total": samples,
+    }
+    return np.ascontiguousarray(data, dtype=SLICE_DTYPE), meta
@@ -0,0 +1,154 @@
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from celery import chord
+from sqlalchemy.orm import Session
+
+from app import models, result_cache, cost_estimator
+from app.celery_app import celery_app, HEAVY_QUEUE, LIGHT_QUEUE
+from app.tasks import run_gprmax_simulation, run_trace_chunk, merge_trace_chunks, fail_trace_chunks
+from app.trace_split import split_traces
+
+# Планировщик запуска моделирования с учётом оценки стоимости.
+# Тяжёлые задачи уходят в отдельную очередь, пакет кампании отправляется
+# в порядке убывания ожидаемого времени (LPT), а лимит времени каждой задачи
+# берётся из оценки, а не из общего task_time_limit.
+
+# Граница между лёгкими и тяжёлыми задачами по оценке времени, с
+HEAVY_THRESHOLD_SEC = float(os.getenv("GPRMAX_HEAVY_THRESHOLD_SEC", "1800"))
+
+TIME_LIMIT_FACTOR = 3.0      # запас к оценке на неточность калибровки
+TIME_LIMIT_MARGIN_SEC = 300
+MIN_TIME_LIMIT_SEC = 600
+MAX_TIME_LIMIT_SEC = celery_app.conf.task_time_limit
+
+# Статусы, из которых скрипт можно отправить на моделирование
+RUNNABLE_STATUSES = ["generated", "failed"]
+
+
+def task_options(estimate: Dict[str, Any]) -> Dict[str, Any]:
+    """Очередь и лимиты времени Celery для задачи с данной оценкой."""
+    runtime = estimate["estimated_runtime_sec"]
+    time_limit = runtime * TIME_LIMIT_FACTOR + TIME_LIMIT_MARGIN_SEC
+    time_limit = int(min(max(time_limit, MIN_TIME_LIMIT_SEC), MAX_TIME_LIMIT_SEC))
+    return {
+        "queue": HEAVY_QUEUE if runtime >= HEAVY_THRESHOLD_SEC else LIGHT_QUEUE,
+        "time_limit": time_limit,
+        # soft-лимит чуть раньше жёсткого, чтобы задача успела записать ошибку
+        "soft_time_limit": max(time_limit - 60, 60),
+    }
+
+
+def _estimate(script: models.Script, calibration) -> Optional[Dict[str, Any]]:
+    try:
+        return cost_estimator.estimate_script(script, calibration)
+    except (KeyError, ValueError):
+        return None
+
+
+def submit_script(db: Session, script: models.Script, calibration=None,
+                  estimate: Optional[Dict[str, Any]] = None, trace_chunks: int = 1) -> Dict[str, Any]:
+    """
+    Отправить один скрипт: сначала проверяется кэш результатов,
+    затем задача ставится в очередь по оценке стоимости. Коммит — за вызывающим.
+    При trace_chunks > 1 трассы B-скана считаются параллельно на разных воркерах.
+    """
+    result_cache.ensure_hash(script)
+    source = result_cache.find_cached_result(db, script)
+    if source:
+        result_cache.link_to_result(db, script, source)
+        return {"task_id": None, "script_id": script.id, "cached": True, "source_script_id": source.id}
+    source = result_cache.find_running_duplicate(db, script)
+    if source:
+        result_cache.wait_for(script, source)
+        return {"task_id": source.celery_task_id, "script_id": script.id, "cached": True,
+                "source_script_id": source.id}
+
+    if estimate is None:
+        estimate = _estimate(script, calibration or cost_estimator.get_calibration(db))
+    if estimate is None:
+        # Скрипт не удалось разобрать — запускаем со старыми настройками
+        options = {"queue": HEAVY_QUEUE}
+        timeout = None
+    else:
+        options = task_options(estimate)
+        timeout = options["soft_time_limit"]
+
+    if trace_chunks > 1 and estimate and estimate["trace_count"] > 1:
+        return _submit_trace_chunks(script, estimate, trace_chunks)
+
+    task = run_gprmax_simulation.apply_async(args=[script.id], kwargs={"timeout_sec": timeout}, **options)
+    script.status = "pending"
+    script.celery_task_id = task.id
+    return {
+        "task_id": task.id,
+        "script_id": script.id,
+        "queue": options["queue"],
+        "time_limit": options.get("time_limit"),
+        "estimated_runtime_sec": estimate["estimated_runtime_sec"] if estimate else None,
+    }
+
+
+def _submit_trace_chunks(script: models.Script, estimate: Dict[str, Any], trace_chunks: int) -> Dict[str, Any]:
+    """
+    Разбить B-скан на диапазоны трасс и отправить их как chord:
+    части выполняются параллельно, merge_trace_chunks собирает результат.
+    """
+    traces = estimate["trace_count"]
+    ranges = split_traces(traces, trace_chunks)
+    header = []
+    for first, count in ranges:
+        # Оценка части пропорциональна числу её трасс
+        part = dict(estimate, estimated_runtime_sec=estimate["estimated_runtime_sec"] * count / traces)
+        options = task_options(part)
+        header.append(run_trace_chunk.signature(
+            args=(script.id, first, count),
+            kwargs={"timeout_sec": options["soft_time_limit"]},
+            options=options,
+        ))
+    # Сборка лёгкая — всегда в лёгкую очередь
+    body = merge_trace_chunks.signature(args=(script.id,), options={"queue": LIGHT_QUEUE})
+    # Если часть упала целиком (жёсткий time_limit, потерянный воркер), chord
+    # не вызовет сборку — скрипт помечает ошибкой fail_trace_chunks
+    body.link_error(fail_trace_chunks.signature(args=(script.id,)))
+    result = chord(header)(body)
+    script.status = "pending"
+    script.celery_task_id = result.id
+    return {
+        "task_id": result.id,
+        "script_id": script.id,
+        "trace_chunks": [{"first_trace": first, "count": count} for first, count in ranges],
+        "estimated_runtime_sec": estimate["estimated_runtime_sec"],
+    }
+
+
+def submit_batch(db: Session, scripts: Iterable[models.Script]) -> Dict[str, Any]:
+    """
+    Отправить пакет скриптов в порядке убывания оценки времени (LPT):
+    самые долгие задачи стартуют первыми и не удлиняют хвост кампании.
+    """
+    calibration = cost_estimator.get_calibration(db)
+    planned = [(script, _estimate(script, calibration)) for script in scripts]
+    planned.sort(key=lambda item: item[1]["estimated_runtime_sec"] if item[1] else float("inf"),
+                 reverse=True)
+
+    submitted: List[Dict[str, Any]] = []
+    queues: Dict[str, int] = {}
+    cached = 0
+    for script, estimate in planned:
+        item = submit_script(db, script, calibration, estimate)
+        db.commit()
+        if item.get("cached"):
+            cached += 1
+        else:
+            queues[item["queue"]] = queues.get(item["queue"], 0) + 1
+        submitted.append(item)
+
+    return {
+        "submitted": len(submitted) - cached,
+        "cached": cached,
+        "queues": queues,
+        "estimated_runtime_hours": round(sum(
+            e["estimated_runtime_sec"] for _, e in planned if e) / 3600.0, 2),
+        "tasks": submitted,
+    }
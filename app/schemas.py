@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, create_model
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
@@ -137,6 +137,36 @@ class ScriptResponse(ScriptBase):
     status: str
     error: Optional[str] = None
     result_portrait_id: Optional[int] = None
+    campaign: Optional[str] = None
+    content_hash: Optional[str] = None
+    result_source_id: Optional[int] = None
+    runtime_sec: Optional[float] = None
+    progress: Optional[float] = None
+    progress_eta_sec: Optional[float] = None
+    compression_ratio: Optional[float] = None
+    cell_count: Optional[int] = None
+    iteration_count: Optional[int] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class SimulationBatchRequest(BaseModel):
+    script_ids: Optional[List[int]] = None
+    campaign: Optional[str] = None
+
+
+def list_item(response_model):
+    """Элемент списка: те же поля, что в ответе, но все необязательные (выбор полей через fields=)."""
+    return create_model(
+        response_model.__name__.replace("Response", "ListItem"),
+        **{name: (Optional[info.annotation], None) for name, info in response_model.model_fields.items()}
+    )
+
+SoilTypeListItem = list_item(SoilTypeResponse)
+MaterialListItem = list_item(MaterialResponse)
+TargetTypeListItem = list_item(TargetTypeResponse)
+AntennaListItem = list_item(AntennaResponse)
+PulseTypeListItem = list_item(PulseTypeResponse)
+SoilBoundaryListItem = list_item(SoilBoundaryResponse)
+ObjectPortraitListItem = list_item(ObjectPortraitResponse)
+ScriptListItem = list_item(ScriptResponse)
@@ -0,0 +1,261 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import JSON, Float, and_, bindparam, cast, func, literal, literal_column, or_, select, text
+from sqlalchemy.orm import Session, aliased
+
+from app import models
+
+# Поиск по справочникам и портретам: текст + диапазоны физических параметров.
+# Текст ищется по индексам: на PostgreSQL — триграммы (pg_trgm, ILIKE '%q%')
+# и tsvector, ранг — max(similarity, ts_rank); на SQLite — таблица FTS5
+# search_fts с токенизатором trigram, ранг — bm25. Индексы и триггеры,
+# поддерживающие search_fts, создаёт миграция 0005.
+# Диапазоны epsilon/sigma сравниваются с выражениями над JSON-колонкой
+# parameters; те же выражения проиндексированы (индексы ix_search_*),
+# поэтому запрос должен строить их ровно так же — см. param_expr.
+#
+# Что с чем сравнивается:
+#   soil_types      — текст: name, description; параметры — свои
+#   materials       — текст: name; параметры — свои
+#   target_types    — текст: name, shape; параметры — материала цели
+#   object_portraits — текст: грунт или тип цели; параметры — грунта
+
+ENTITIES = ("soil_types", "materials", "target_types", "object_portraits")
+PARAMETERS = ("epsilon", "sigma")
+
+# Текст, по которому ищется запись (PostgreSQL: выражения индексов)
+SEARCH_TEXT = {
+    "soil_types": "soil_types.name || ' ' || coalesce(soil_types.description, '')",
+    "materials": "materials.name",
+    "target_types": "target_types.name || ' ' || coalesce(target_types.shape, '')",
+}
+
+# SQLite: rowid строки search_fts = id записи * FTS_ROWID_STRIDE + код таблицы
+FTS_TABLE = "search_fts"
+FTS_ROWID_STRIDE = 8
+FTS_ENTITY_CODES = {"soil_types": 1, "materials": 2, "target_types": 3}
+# Короче трёх символов триграммный индекс не работает — полный проход по search_fts
+FTS_MIN_QUERY = 3
+
+MAX_CANDIDATES = 10000
+
+_MODELS = {
+    "soil_types": models.SoilType,
+    "materials": models.Material,
+    "target_types": models.TargetType,
+    "object_portraits": models.ObjectPortrait,
+}
+
+
+def param_expr(dialect: str, table: str, key: str):
+    """Числовое значение parameters[key]; совпадает с выражением индекса ix_search_{table}_{key}."""
+    if dialect == "postgresql":
+        # parameters — свободный JSON: нечисловое значение ("4-6") даёт NULL, а не ошибку приведения
+        return literal_column(
+            f"CASE WHEN json_typeof({table}.parameters -> '{key}') = 'number' "
+            f"THEN CAST({table}.parameters ->> '{key}' AS DOUBLE PRECISION) END", Float
+        )
+    if dialect == "sqlite":
+        return literal_column(f"json_extract({table}.parameters, '$.{key}')", Float)
+    # По имени таблицы, а не по модели: в запросе это может быть псевдоним
+    parameters = literal_column(f"{table}.parameters", JSON)
+    return cast(parameters[key].as_string(), Float)
+
+
+def param_is_number(dialect: str, table: str, key: str):
+    """
+    Условие «parameters[key] — число» для диапазонов, если param_expr его не проверяет.
+    SQLite сравнивает текст с числом (текст всегда больше), поэтому "4-6" прошёл бы epsilon_min.
+    """
+    if dialect == "sqlite":
+        return text(f"json_type({table}.parameters, '$.{key}') IN ('real', 'integer')")
+    return None
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def text_matches(dialect: str, table: str, query: str):
+    """Подзапрос (id, rank) записей таблицы table, подходящих под текст query."""
+    model = _MODELS[table]
+    if dialect == "sqlite":
+        code = FTS_ENTITY_CODES[table]
+        entity_id = literal_column(f"({FTS_TABLE}.rowid - {code}) / {FTS_ROWID_STRIDE}")
+        words = query.split()
+        if min(len(word) for word in words) >= FTS_MIN_QUERY:
+            # Каждое слово — отдельная фраза FTS5 (кавычки внутри удваиваются),
+            # запись должна содержать их все
+            condition = text(f"{FTS_TABLE} MATCH :match_{table}").bindparams(
+                bindparam(f"match_{table}", " ".join('"' + word.replace('"', '""') + '"' for word in words))
+            )
+            rank = literal_column(f"-bm25({FTS_TABLE})", Float)
+        else:
+            condition = text(f"{FTS_TABLE}.body LIKE :like_{table} ESCAPE '\\'").bindparams(
+                bindparam(f"like_{table}", f"%{_escape_like(query)}%")
+            )
+            rank = literal(0.0, Float)
+        return select(entity_id.label("id"), rank.label("rank")).select_from(text(FTS_TABLE)).where(
+            condition, text(f"{FTS_TABLE}.rowid % {FTS_ROWID_STRIDE} = {code}")
+        ).subquery(f"{table}_text")
+
+    pattern = f"%{_escape_like(query)}%"
+    if dialect == "postgresql":
+        document = literal_column(SEARCH_TEXT[table])
+        vector = func.to_tsvector(literal_column("'simple'"), document)
+        ts_query = func.plainto_tsquery(literal_column("'simple'"), query)
+        condition = or_(document.ilike(pattern, escape="\\"), vector.op("@@")(ts_query))
+        rank = func.greatest(func.similarity(document, query), func.ts_rank(vector, ts_query))
+    else:
+        condition = model.name.ilike(pattern, escape="\\")
+        rank = literal(0.0, Float)
+    return select(model.id.label("id"), rank.label("rank")).where(condition).subquery(f"{table}_text")
+
+
+def _entity_query(dialect: str, entity: str, query: Optional[str], ranges: Dict[str, Tuple[Optional[float], Optional[float]]]):
+    model = _MODELS[entity]
+    columns = [model.id.label("id")]
+    joins, conditions = [], []
+
+    if entity == "object_portraits":
+        columns.append(literal(None).label("name"))
+        params_model = aliased(models.SoilType, name="soil_types")
+        joins.append((params_model, params_model.id == model.soil_type_id, True))
+        params_table = "soil_types"
+    elif entity == "target_types":
+        columns.append(model.name.label("name"))
+        params_model = aliased(models.Material, name="materials")
+        joins.append((params_model, params_model.id == model.material_id, True))
+        params_table = "materials"
+    else:
+        columns.append(model.name.label("name"))
+        params_table = entity
+
+    for key in PARAMETERS:
+        columns.append(param_expr(dialect, params_table, key).label(key))
+
+    if query:
+        if entity == "object_portraits":
+            # Портрет подходит, если подходит его тип цели или грунт
+            target = text_matches(dialect, "target_types", query)
+            soil = text_matches(dialect, "soil_types", query)
+            joins.append((target, target.c.id == model.target_type_id, False))
+            joins.append((soil, soil.c.id == model.soil_type_id, False))
+            # IN по подзапросам, а не проверка внешних соединений, — чтобы портреты
+            # выбирались по индексам внешних ключей, а не полным проходом
+            conditions.append(or_(model.target_type_id.in_(select(target.c.id)),
+                                  model.soil_type_id.in_(select(soil.c.id))))
+            rank = func.coalesce(target.c.rank, 0.0) + func.coalesce(soil.c.rank, 0.0)
+        else:
+            matches = text_matches(dialect, entity, query)
+            joins.append((matches, matches.c.id == model.id, True))
+            rank = matches.c.rank
+    else:
+        rank = literal(0.0, Float)
+    columns.append(rank.label("rank"))
+
+    for key, (low, high) in ranges.items():
+        expr = param_expr(dialect, params_table, key)
+        is_number = param_is_number(dialect, params_table, key)
+        if is_number is not None:
+            conditions.append(is_number)
+        if low is not None:
+            conditions.append(expr >= low)
+        if high is not None:
+            conditions.append(expr <= high)
+
+    statement = select(*columns).select_from(model)
+    for target, on, inner in joins:
+        statement = statement.join(target, on) if inner else statement.outerjoin(target, on)
+    if conditions:
+        statement = statement.where(and_(*conditions))
+    return statement
+
+
+def _extra_fields(db: Session, entity: str, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    if not ids:
+        return {}
+    model = _MODELS[entity]
+    if entity == "soil_types":
+        rows = db.query(model.id, model.description).filter(model.id.in_(ids))
+        return {row.id: {"description": (row.description or "")[:100]} for row in rows}
+    if entity == "materials":
+        rows = db.query(model.id, model.material_id).filter(model.id.in_(ids))
+        return {row.id: {"material_id": row.material_id} for row in rows}
+    if entity == "target_types":
+        rows = db.query(model.id, model.shape, model.material_id).filter(model.id.in_(ids))
+        return {row.id: {"shape": row.shape, "material_id": row.material_id} for row in rows}
+    rows = db.query(model.id, model.target_type_id, model.soil_type_id, model.antenna_id, model.pulse_id,
+                    model.result_file_path).filter(model.id.in_(ids))
+    return {
+        row.id: {
+            "target_type_id": row.target_type_id,
+            "soil_type_id": row.soil_type_id,
+            "antenna_id": row.antenna_id,
+            "pulse_id": row.pulse_id,
+            "has_result": bool(row.result_file_path),
+        }
+        for row in rows
+    }
+
+
+def search(db: Session, query: Optional[str] = None, entities: Iterable[str] = ENTITIES,
+           ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+           limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+    """
+    Поиск по нескольким сущностям сразу. Результаты ранжируются по совпадению
+    текста (без текста — по сущности и id) и отдаются страницей offset/limit.
+    """
+    dialect = db.get_bind().dialect.name
+    query = (query or "").strip() or None
+    ranges = {key: value for key, value in (ranges or {}).items() if value != (None, None)}
+    unknown = [key for key in ranges if key not in PARAMETERS]
+    if unknown:
+        raise ValueError(f"Неизвестные параметры: {', '.join(unknown)}")
+    entities = list(entities)
+    unknown = [entity for entity in entities if entity not in ENTITIES]
+    if unknown:
+        raise ValueError(f"Неизвестные сущности: {', '.join(unknown)}. Доступны: {', '.join(ENTITIES)}")
+    if offset + limit > MAX_CANDIDATES:
+        raise ValueError(f"offset + limit не больше {MAX_CANDIDATES}")
+
+    candidates, totals = [], {}
+    for order, entity in enumerate(entities):
+        statement = _entity_query(dialect, entity, query, ranges)
+        totals[entity] = db.execute(select(func.count()).select_from(statement.subquery())).scalar()
+        if not totals[entity]:
+            continue
+        # Каждая сущность отдаёт не больше offset + limit лучших — их достаточно для страницы
+        top = statement.order_by(literal_column("rank").desc(), literal_column("id")).limit(offset + limit)
+        for row in db.execute(top):
+            candidates.append((-(row.rank or 0.0), order, row.id, entity, row))
+
+    candidates.sort(key=lambda item: item[:3])
+    page = candidates[offset:offset + limit]
+
+    extras = {}
+    for entity in entities:
+        extras[entity] = _extra_fields(db, entity, [item[2] for item in page if item[3] == entity])
+
+    results = []
+    for _, _, item_id, entity, row in page:
+        result = {
+            "entity": entity,
+            "id": item_id,
+            "name": row.name,
+            "rank": round(float(row.rank or 0.0), 6),
+            "epsilon": row.epsilon,
+            "sigma": row.sigma,
+        }
+        result.update(extras[entity].get(item_id, {}))
+        results.append(result)
+
+    return {
+        "query": query,
+        "filters": {key: {"min": low, "max": high} for key, (low, high) in ranges.items()},
+        "total_results": sum(totals.values()),
+        "totals": totals,
+        "limit": limit,
+        "offset": offset,
+        "results": results,
+    }
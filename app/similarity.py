@@ -0,0 +1,282 @@
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import h5py
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.result_pack import ALL_COMPONENTS
+
+# Поиск портретов по сигналу. Сигнатура B-скана — вектор фиксированной длины:
+# вычитается средняя трасса (прямая волна и горизонтальные границы),
+# берётся модуль амплитуды, массив приводится к сетке SIG_TRACES × SIG_SAMPLES
+# усреднением по площади, центрируется и нормируется. Похожесть — косинус,
+# то есть скалярное произведение нормированных векторов.
+# Сигнатуры хранятся в portrait_signatures и добавляются по мере завершения
+# моделирования; в процессе API они лежат одной матрицей float32, которая
+# дочитывается инкрементально (только новые строки).
+
+SIGNATURE_VERSION = 1
+SIG_TRACES = 16
+SIG_SAMPLES = 64
+SIGNATURE_SIZE = SIG_TRACES * SIG_SAMPLES
+
+# Строк матрицы на одно матричное умножение при поиске
+MATCH_BLOCK_ROWS = 16384
+# Сколько исходных отсчётов на ячейку сетки читать из файла (остальное прореживается)
+READ_OVERSAMPLING = 8
+
+
+def _resample_axis(data: np.ndarray, target: int, axis: int) -> np.ndarray:
+    """Привести ось к target точкам: усреднение по площади при сжатии, линейная интерполяция при растяжении."""
+    data = np.moveaxis(data, axis, 0)
+    size = data.shape[0]
+    if size == target:
+        result = data
+    elif size > target:
+        cumulative = np.concatenate([np.zeros((1,) + data.shape[1:], dtype=np.float64),
+                                     np.cumsum(data, axis=0, dtype=np.float64)])
+        edges = np.linspace(0.0, size, target + 1)
+        low = np.floor(edges).astype(int)
+        frac = (edges - low)[(slice(None),) + (np.newaxis,) * (data.ndim - 1)]
+        high = np.minimum(low + 1, size)
+        at_edges = cumulative[low] + (cumulative[high] - cumulative[low]) * frac
+        result = np.diff(at_edges, axis=0) / (size / target)
+    elif size == 1:
+        result = np.repeat(data, target, axis=0)
+    else:
+        positions = np.linspace(0.0, size - 1, target)
+        low = np.floor(positions).astype(int)
+        high = np.minimum(low + 1, size - 1)
+        frac = (positions - low)[(slice(None),) + (np.newaxis,) * (data.ndim - 1)]
+        result = data[low] * (1 - frac) + data[high] * frac
+    return np.moveaxis(result, 0, axis)
+
+
+def signatures(bscans: np.ndarray) -> np.ndarray:
+    """Сигнатуры пачки B-сканов одинаковой формы (N × трассы × отсчёты) -> N × SIGNATURE_SIZE."""
+    data = np.asarray(bscans, dtype=np.float32)
+    if data.shape[1] > 1:
+        data = data - data.mean(axis=1, keepdims=True)
+    envelope = np.abs(data)
+    grid = _resample_axis(_resample_axis(envelope, SIG_TRACES, 1), SIG_SAMPLES, 2)
+    vectors = grid.reshape(grid.shape[0], -1).astype(np.float32)
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def signature(bscan: np.ndarray) -> np.ndarray:
+    bscan = np.asarray(bscan)
+    if bscan.ndim == 1:
+        bscan = bscan[np.newaxis, :]
+    if bscan.ndim != 2:
+        raise ValueError("Ожидается B-скан (трассы × отсчёты) или одна трасса")
+    return signatures(bscan[np.newaxis])[0]
+
+
+def read_bscan(source, component: Optional[str] = None) -> np.ndarray:
+    """B-скан из HDF5 gprMax (путь или файловый объект), прореженный до нужной детальности."""
+    with h5py.File(source, "r") as f:
+        group = f["rxs"]["rx1"]
+        if component is None:
+            component = next((c for c in ALL_COMPONENTS if c in group), None)
+        if component is None or component not in group:
+            raise KeyError(f"Нет компоненты поля {component or ''}")
+        dataset = group[component]
+        if dataset.ndim == 1:
+            step = max(1, dataset.shape[0] // (SIG_SAMPLES * READ_OVERSAMPLING))
+            return dataset[::step][np.newaxis, :]
+        trace_step = max(1, dataset.shape[0] // (SIG_TRACES * READ_OVERSAMPLING))
+        sample_step = max(1, dataset.shape[1] // (SIG_SAMPLES * READ_OVERSAMPLING))
+        return dataset[::trace_step, ::sample_step]
+
+
+def read_upload(source: BinaryIO, filename: str = "", component: Optional[str] = None) -> np.ndarray:
+    """
+    Измеренный B-скан из загруженного файла: .npy или HDF5 в формате gprMax.
+    source — файловый объект с seek (UploadFile.file), читается без копии в память.
+    """
+    if filename.endswith(".npy"):
+        return np.load(source, allow_pickle=False)
+    return read_bscan(source, component)
+
+
+class SignatureIndex:
+    """Матрица сигнатур в памяти процесса с инкрементальной дочиткой из БД."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((0, SIGNATURE_SIZE), dtype=np.float32)
+        self._portrait_ids = np.zeros(0, dtype=np.int64)
+        self._rows: Dict[int, int] = {}
+        self._size = 0
+        self._last_id = 0
+
+    def __len__(self):
+        return self._size
+
+    def _reset(self):
+        self._matrix = np.zeros((0, SIGNATURE_SIZE), dtype=np.float32)
+        self._portrait_ids = np.zeros(0, dtype=np.int64)
+        self._rows = {}
+        self._size = 0
+        self._last_id = 0
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        if needed <= self._matrix.shape[0]:
+            return
+        capacity = max(needed, 2 * self._matrix.shape[0], 1024)
+        matrix = np.zeros((capacity, SIGNATURE_SIZE), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.full(capacity, -1, dtype=np.int64)
+        ids[:self._size] = self._portrait_ids[:self._size]
+        self._matrix, self._portrait_ids = matrix, ids
+
+    def refresh(self, db: Session):
+        """Дочитать новые сигнатуры; при удалениях — перечитать целиком."""
+        with self._lock:
+            stored = db.query(func.count(models.PortraitSignature.id)).filter(
+                models.PortraitSignature.signature_version == SIGNATURE_VERSION
+            ).scalar() or 0
+            if stored < self._size:
+                self._reset()
+            rows = db.query(
+                models.PortraitSignature.id,
+                models.PortraitSignature.portrait_id,
+                models.PortraitSignature.vector,
+            ).filter(
+                models.PortraitSignature.signature_version == SIGNATURE_VERSION,
+                models.PortraitSignature.id > self._last_id,
+            ).order_by(models.PortraitSignature.id).all()
+            if not rows:
+                return
+            self._reserve(len(rows))
+            for row_id, portrait_id, vector in rows:
+                # Пересчитанная сигнатура портрета — новая строка в БД, заменяет старую
+                row = self._rows.get(portrait_id)
+                if row is None:
+                    row = self._size
+                    self._rows[portrait_id] = row
+                    self._portrait_ids[row] = portrait_id
+                    self._size += 1
+                self._matrix[row] = np.frombuffer(vector, dtype=np.float32)
+                self._last_id = row_id
+
+    def match(self, queries: np.ndarray, top_k: int = 10,
+              candidate_ids: Optional[Iterable[int]] = None) -> List[List[Tuple[int, float]]]:
+        """Top-k портретов для каждой сигнатуры-запроса (строки queries)."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            matrix = self._matrix[:self._size]
+            ids = self._portrait_ids[:self._size]
+        if not len(ids):
+            return [[] for _ in range(len(queries))]
+        mask = None
+        if candidate_ids is not None:
+            mask = np.isin(ids, np.fromiter(candidate_ids, dtype=np.int64))
+
+        k = min(top_k, len(ids))
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(ids), MATCH_BLOCK_ROWS):
+            block = matrix[start:start + MATCH_BLOCK_ROWS]
+            scores = queries @ block.T
+            if mask is not None:
+                scores[:, ~mask[start:start + MATCH_BLOCK_ROWS]] = -np.inf
+            rows = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, rows], axis=1)
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+                rows = np.take_along_axis(rows, top, axis=1)
+            best_scores, best_rows = scores, rows
+
+        order = np.argsort(-best_scores, axis=1)
+        results = []
+        for q in range(len(queries)):
+            matches = []
+            for i in order[q]:
+                if np.isfinite(best_scores[q, i]):
+                    matches.append((int(ids[best_rows[q, i]]), float(best_scores[q, i])))
+            results.append(matches)
+        return results
+
+
+_index = SignatureIndex()
+
+
+def get_index(db: Session) -> SignatureIndex:
+    _index.refresh(db)
+    return _index
+
+
+def store_signature(db: Session, portrait_id: int, vector: np.ndarray, source_file: str = None):
+    """Записать сигнатуру портрета (старая удаляется). Коммит — за вызывающим."""
+    db.query(models.PortraitSignature).filter(
+        models.PortraitSignature.portrait_id == portrait_id
+    ).delete(synchronize_session=False)
+    db.add(models.PortraitSignature(
+        portrait_id=portrait_id,
+        signature_version=SIGNATURE_VERSION,
+        vector=np.ascontiguousarray(vector, dtype=np.float32).tobytes(),
+        source_file=source_file,
+    ))
+
+
+def index_portrait(db: Session, portrait: models.ObjectPortrait) -> bool:
+    path = portrait.result_file_path
+    if not path or not Path(path).is_file():
+        return False
+    store_signature(db, portrait.id, signature(read_bscan(path)), path)
+    return True
+
+
+def index_missing(db: Session, limit: Optional[int] = None) -> Dict[str, Any]:
+    """Посчитать сигнатуры портретов, у которых их ещё нет (или они старой версии)."""
+    indexed = db.query(models.PortraitSignature.portrait_id).filter(
+        models.PortraitSignature.signature_version == SIGNATURE_VERSION
+    )
+    query = db.query(models.ObjectPortrait).filter(
+        models.ObjectPortrait.result_file_path.isnot(None),
+        ~models.ObjectPortrait.id.in_(indexed),
+    ).order_by(models.ObjectPortrait.id)
+    if limit:
+        query = query.limit(limit)
+    added, failed = 0, []
+    for portrait in query.all():
+        try:
+            if index_portrait(db, portrait):
+                added += 1
+                db.commit()
+        except (OSError, KeyError, ValueError) as e:
+            db.rollback()
+            failed.append({"portrait_id": portrait.id, "error": str(e)})
+    return {"indexed": added, "failed": failed}
+
+
+def portrait_details(db: Session, matches: Sequence[Tuple[int, float]]) -> List[Dict[str, Any]]:
+    portraits = {
+        p.id: p for p in db.query(models.ObjectPortrait).filter(
+            models.ObjectPortrait.id.in_([portrait_id for portrait_id, _ in matches])
+        )
+    }
+    results = []
+    for portrait_id, score in matches:
+        portrait = portraits.get(portrait_id)
+        if portrait is None:
+            continue
+        results.append({
+            "portrait_id": portrait_id,
+            "score": round(score, 6),
+            "target_type_id": portrait.target_type_id,
+            "soil_type_id": portrait.soil_type_id,
+            "antenna_id": portrait.antenna_id,
+            "pulse_id": portrait.pulse_id,
+        })
+    return results
@@ -0,0 +1,242 @@
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import traceback
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# Запуск решателя gprMax с потоковой записью вывода в лог.
+# stdout и stderr читаются построчно и сразу пишутся в файл, в памяти остаётся
+# только хвост для сообщения об ошибке, поэтому память воркера не растёт
+# с объёмом вывода. По строкам вывода отслеживается прогресс: номер модели
+# (трассы) и счётчик итераций tqdm, из них — доля выполненного и оценка ETA.
+
+# Сколько последних строк вывода хранить для сообщения об ошибке
+TAIL_LINES = 200
+
+# "Model 3/31" / "model 3/31" — номер трассы B-скана
+MODEL_RE = re.compile(r"[Mm]odel\s+(\d+)\s*/\s*(\d+)")
+# Счётчик tqdm: " 450/1000 [00:02<00:03"
+ITERATION_RE = re.compile(r"(\d+)/(\d+)\s*\[")
+
+
+class SolverProgress:
+    """Прогресс по выводу gprMax: трассы и итерации текущей трассы."""
+
+    def __init__(self, models_total: int = 1):
+        self.models_total = max(1, models_total)
+        self.model = 1
+        self.iteration = 0
+        self.iterations_total = 0
+        self.started = time.time()
+
+    def feed(self, line: str) -> bool:
+        changed = False
+        match = MODEL_RE.search(line)
+        if match:
+            model, total = int(match.group(1)), int(match.group(2))
+            if (model, total) != (self.model, self.models_total):
+                self.model, self.models_total = model, max(1, total)
+                self.iteration = 0
+                changed = True
+        match = ITERATION_RE.search(line)
+        if match:
+            iteration, total = int(match.group(1)), int(match.group(2))
+            if total > 0 and iteration != self.iteration:
+                self.iteration, self.iterations_total = iteration, total
+                changed = True
+        return changed
+
+    @property
+    def fraction(self) -> float:
+        within = self.iteration / self.iterations_total if self.iterations_total else 0.0
+        return min(1.0, (self.model - 1 + within) / self.models_total)
+
+    def eta_sec(self) -> Optional[float]:
+        fraction = self.fraction
+        if fraction <= 0:
+            return None
+        elapsed = time.time() - self.started
+        return elapsed * (1 - fraction) / fraction
+
+    def as_dict(self) -> Dict[str, object]:
+        eta = self.eta_sec()
+        return {
+            "percent": round(100 * self.fraction, 1),
+            "model": self.model,
+            "models_total": self.models_total,
+            "iteration": self.iteration,
+            "iterations_total": self.iterations_total,
+            "elapsed_sec": round(time.time() - self.started, 1),
+            "eta_sec": round(eta, 1) if eta is not None else None,
+        }
+
+
+class SolverResult:
+    def __init__(self, args: List[str], returncode: int, tail: str, log_path: Path):
+        self.args = args
+        self.returncode = returncode
+        self.tail = tail
+        self.log_path = log_path
+
+
+class _ForkedProcess:
+    """Дочерний процесс, созданный os.fork(), с интерфейсом как у Popen."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.returncode: Optional[int] = None
+
+    def poll(self) -> Optional[int]:
+        if self.returncode is None:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid:
+                self.returncode = os.waitstatus_to_exitcode(status)
+        return self.returncode
+
+    def wait(self) -> int:
+        if self.returncode is None:
+            _, status = os.waitpid(self.pid, 0)
+            self.returncode = os.waitstatus_to_exitcode(status)
+        return self.returncode
+
+    def kill(self):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+
+def _stream(process, output, cmd, log, timeout_sec, progress, on_progress) -> SolverResult:
+    """Общий цикл: вывод построчно в лог, хвост в памяти, прогресс, таймаут."""
+    tail = deque(maxlen=TAIL_LINES)
+    timed_out = threading.Event()
+
+    def kill_on_timeout():
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(timeout_sec, kill_on_timeout) if timeout_sec else None
+    if timer:
+        timer.daemon = True
+        timer.start()
+    try:
+        for line in output:
+            log.write(line)
+            line = line.rstrip()
+            if line:
+                tail.append(line)
+            if progress is not None and progress.feed(line) and on_progress is not None:
+                on_progress(progress)
+        returncode = process.wait()
+    finally:
+        if timer:
+            timer.cancel()
+        if process.poll() is None:
+            # Прерывание задачи (soft time limit, отзыв) — решатель не должен остаться сиротой
+            process.kill()
+            process.wait()
+        output.close()
+
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout_sec)
+    return SolverResult(cmd, returncode, "\n".join(tail), Path(log.name))
+
+
+def run_solver(cmd: List[str], cwd: Path, log_path: Path, timeout_sec: Optional[float] = None,
+               progress: Optional[SolverProgress] = None,
+               on_progress: Optional[Callable[[SolverProgress], None]] = None,
+               env: Optional[Dict[str, str]] = None, cpus: Optional[List[int]] = None) -> SolverResult:
+    """
+    Запустить решатель, записывая вывод в log_path по мере поступления.
+    При превышении timeout_sec процесс завершается и поднимается TimeoutExpired.
+    cpus — набор ядер, к которому привязывается процесс решателя (и его потоки).
+    """
+    with open(log_path, "w", encoding="utf-8") as log:
+        log.write(f"$ {' '.join(cmd)}\n")
+        log.flush()
+        process = subprocess.Popen(
+            cmd,
+            cwd=str(cwd),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,          # универсальные переводы строк: "\r" от tqdm тоже разделяет строки
+            bufsize=1,
+            errors="replace",
+            env=env,
+            preexec_fn=(lambda: os.sched_setaffinity(0, cpus)) if cpus else None,
+        )
+        return _stream(process, process.stdout, cmd, log, timeout_sec, progress, on_progress)
+
+
+# Тёплый режим: gprMax импортируется один раз в процессе воркера, а каждая
+# задача выполняется в дочернем процессе, созданном fork(). Ребёнок получает
+# уже загруженные модули (numpy, h5py, Cython-расширения gprMax) без повторного
+# запуска интерпретатора, а падение решателя не затрагивает воркер.
+
+_gprmax_api = None
+
+
+def load_gprmax_api():
+    """Импортировать gprMax и вернуть его функцию api (один раз на процесс)."""
+    global _gprmax_api
+    if _gprmax_api is None:
+        import gprMax
+        api = getattr(gprMax, "api", None)
+        if api is None:
+            from gprMax.gprMax import api
+        _gprmax_api = api
+    return _gprmax_api
+
+
+def run_solver_warm(input_file: Path, num_steps: int, cwd: Path, log_path: Path,
+                    gpu: Optional[List[int]] = None, timeout_sec: Optional[float] = None,
+                    progress: Optional[SolverProgress] = None,
+                    on_progress: Optional[Callable[[SolverProgress], None]] = None,
+                    env: Optional[Dict[str, str]] = None, cpus: Optional[List[int]] = None) -> SolverResult:
+    """Как run_solver, но через gprMax.api в дочернем процессе уже прогретого воркера."""
+    api = load_gprmax_api()
+    cmd = ["gprMax.api", str(input_file), "-n", str(num_steps)]
+    if gpu is not None:
+        cmd += ["-gpu"] + [str(g) for g in gpu]
+    with open(log_path, "w", encoding="utf-8") as log:
+        log.write(f"$ {' '.join(cmd)}\n")
+        log.flush()
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Дочерний процесс: вывод в трубу, рабочая директория и окружение задачи
+            code = 1
+            try:
+                os.close(read_fd)
+                os.dup2(write_fd, 1)
+                os.dup2(write_fd, 2)
+                os.close(write_fd)
+                sys.stdout = os.fdopen(1, "w", buffering=1, errors="replace")
+                sys.stderr = os.fdopen(2, "w", buffering=1, errors="replace")
+                os.chdir(cwd)
+                if env:
+                    os.environ.update(env)
+                if cpus:
+                    os.sched_setaffinity(0, cpus)
+                api(str(input_file), n=num_steps, gpu=gpu)
+                code = 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 1
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                try:
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                finally:
+                    os._exit(code)
+        os.close(write_fd)
+        output = os.fdopen(read_fd, "r", errors="replace", newline=None)
+        return _stream(_ForkedProcess(pid), output, cmd, log, timeout_sec, progress, on_progress)
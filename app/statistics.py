@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func, literal, null, select, union_all
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Сводная статистика для /statistics/ и check_configurations.py: число записей
+# в справочниках, скрипты по статусам и прогресс по кампаниям. Всё считается
+# одним запросом (UNION ALL из COUNT по справочникам и GROUP BY campaign, status
+# по scripts) и кэшируется в процессе на STATISTICS_TTL_SEC: панели, которые
+# опрашивают API каждую секунду, не вызывают полного прохода по scripts
+# на каждый запрос. Пересчёт выполняет один поток, остальные ждут его результат.
+#
+# Переменные окружения:
+#   GPRMAX_STATISTICS_TTL_SEC — время жизни кэша, с (по умолчанию 5)
+
+STATISTICS_TTL_SEC = float(os.getenv("GPRMAX_STATISTICS_TTL_SEC", "5"))
+
+ENTITY_MODELS = {
+    "soil_types": models.SoilType,
+    "materials": models.Material,
+    "target_types": models.TargetType,
+    "antennas": models.Antenna,
+    "pulse_types": models.PulseType,
+    "soil_boundaries": models.SoilBoundary,
+    "object_portraits": models.ObjectPortrait,
+}
+
+# Статусы, после которых скрипт больше не будет считаться
+FINISHED_STATUSES = ("completed", "failed")
+
+_lock = threading.Lock()
+_cached: Optional[Dict[str, Any]] = None
+
+
+def _statement():
+    parts = [
+        select(literal(table).label("kind"), null().label("campaign"), null().label("status"),
+               func.count().label("count")).select_from(model)
+        for table, model in ENTITY_MODELS.items()
+    ]
+    parts.append(
+        select(literal("scripts").label("kind"), models.Script.campaign, models.Script.status,
+               func.count().label("count"))
+        .group_by(models.Script.campaign, models.Script.status)
+    )
+    return union_all(*parts)
+
+
+def collect(db: Session) -> Dict[str, Any]:
+    """Посчитать статистику одним запросом к БД."""
+    entities = {table: 0 for table in ENTITY_MODELS}
+    by_status: Dict[str, int] = {}
+    campaigns: Dict[Optional[str], Dict[str, int]] = {}
+    for kind, campaign, status, count in db.execute(_statement()):
+        if kind != "scripts":
+            entities[kind] = count
+            continue
+        status = status or "unknown"
+        by_status[status] = by_status.get(status, 0) + count
+        statuses = campaigns.setdefault(campaign, {})
+        statuses[status] = statuses.get(status, 0) + count
+
+    campaign_progress = []
+    for campaign, statuses in sorted(campaigns.items(), key=lambda item: (item[0] is None, item[0] or "")):
+        total = sum(statuses.values())
+        finished = sum(statuses.get(s, 0) for s in FINISHED_STATUSES)
+        campaign_progress.append({
+            "campaign": campaign,
+            "total": total,
+            "by_status": statuses,
+            "completed": statuses.get("completed", 0),
+            "finished_fraction": round(finished / total, 4) if total else 0.0,
+        })
+
+    return {
+        "statistics": entities,
+        "total": sum(entities.values()),
+        "scripts": {"total": sum(by_status.values()), "by_status": by_status},
+        "campaigns": campaign_progress,
+        "collected_at": time.time(),
+    }
+
+
+def get_statistics(db: Session, refresh: bool = False) -> Dict[str, Any]:
+    """Статистика из кэша процесса (пересчитывается раз в STATISTICS_TTL_SEC)."""
+    global _cached
+    current = _cached
+    if not refresh and current is not None and time.time() - current["collected_at"] < STATISTICS_TTL_SEC:
+        return current
+    with _lock:
+        # Пока ждали блокировку, статистику мог пересчитать другой поток
+        current = _cached
+        if not refresh and current is not None and time.time() - current["collected_at"] < STATISTICS_TTL_SEC:
+            return current
+        _cached = collect(db)
+        return _cached
@@ -0,0 +1,116 @@
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Optional
+
+# Хранилище результатов и рабочие (scratch) директории для gprMax.
+# gprMax пишет прямо в рабочую директорию на той же файловой системе, что и
+# хранилище результатов; готовая директория переносится в ./results/{id}
+# атомарным rename, без второго копирования данных.
+#
+# Переменные окружения:
+#   GPRMAX_RESULTS_DIR      — хранилище результатов (по умолчанию ./results)
+#   GPRMAX_SCRATCH_DIR      — рабочие директории (по умолчанию {results}/.scratch)
+#   GPRMAX_TMPFS_DIR        — tmpfs для небольших запусков (по умолчанию /dev/shm, если есть)
+#   GPRMAX_TMPFS_MAX_BYTES  — максимальный ожидаемый объём вывода для tmpfs (0 — не использовать)
+
+RESULTS_BASE_DIR = Path(os.getenv("GPRMAX_RESULTS_DIR", "./results")).absolute()
+SCRATCH_DIR = Path(os.getenv("GPRMAX_SCRATCH_DIR", str(RESULTS_BASE_DIR / ".scratch"))).absolute()
+
+_default_tmpfs = "/dev/shm" if os.path.isdir("/dev/shm") else ""
+TMPFS_DIR = os.getenv("GPRMAX_TMPFS_DIR", _default_tmpfs)
+TMPFS_MAX_BYTES = int(os.getenv("GPRMAX_TMPFS_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Запас по месту: исходные трассы и собранный B-скан какое-то время лежат вместе
+FREE_SPACE_FACTOR = 2.5
+# tmpfs занимает память; оставляем большую её часть свободной
+TMPFS_MAX_SHARE = 0.25
+
+
+class InsufficientSpaceError(OSError):
+    pass
+
+
+def result_dir(script_id) -> Path:
+    return RESULTS_BASE_DIR / str(script_id)
+
+
+def staging_dir(script_id) -> Path:
+    """Общая директория, в которую складываются части B-скана перед сборкой."""
+    return SCRATCH_DIR / f"{script_id}.staging"
+
+
+def free_bytes(path: Path) -> int:
+    path.mkdir(parents=True, exist_ok=True)
+    return shutil.disk_usage(path).free
+
+
+def check_free_space(path: Path, expected_bytes: int):
+    """Проверка места до запуска решателя, а не после часа счёта."""
+    required = int(expected_bytes * FREE_SPACE_FACTOR)
+    available = free_bytes(path)
+    if required > available:
+        raise InsufficientSpaceError(
+            f"Недостаточно места в {path}: нужно ~{required // 2**20} МБ, свободно {available // 2**20} МБ"
+        )
+
+
+def choose_scratch_root(expected_bytes: int) -> Path:
+    """tmpfs для небольших запусков, иначе scratch на файловой системе результатов."""
+    if TMPFS_DIR and 0 < expected_bytes <= TMPFS_MAX_BYTES:
+        tmpfs = Path(TMPFS_DIR) / "gprmax"
+        try:
+            if expected_bytes * FREE_SPACE_FACTOR <= free_bytes(tmpfs) * TMPFS_MAX_SHARE:
+                return tmpfs
+        except OSError:
+            pass
+    return SCRATCH_DIR
+
+
+def make_run_dir(name, expected_bytes: int = 0) -> Path:
+    root = choose_scratch_root(expected_bytes)
+    check_free_space(root, expected_bytes)
+    if root != SCRATCH_DIR:
+        # Итог всё равно попадёт в хранилище результатов
+        check_free_space(RESULTS_BASE_DIR, expected_bytes)
+    run_dir = root / f"{name}-{uuid.uuid4().hex[:8]}"
+    run_dir.mkdir(parents=True)
+    return run_dir
+
+
+def move(src: Path, dest: Path):
+    """rename в пределах одной ФС; между ФС (tmpfs) — копирование с удалением."""
+    try:
+        os.replace(src, dest)
+    except OSError:
+        shutil.move(str(src), str(dest))
+
+
+def commit_run_dir(run_dir: Path, script_id) -> Path:
+    """
+    Атомарно опубликовать готовую директорию как ./results/{script_id}.
+    Предыдущий результат (перезапуск) сначала убирается в сторону и удаляется после.
+    """
+    final = result_dir(script_id)
+    final.parent.mkdir(parents=True, exist_ok=True)
+    if run_dir.parent != SCRATCH_DIR and run_dir.parent != final.parent:
+        # Директория с другой ФС: сначала переносим рядом с хранилищем
+        local = SCRATCH_DIR / run_dir.name
+        SCRATCH_DIR.mkdir(parents=True, exist_ok=True)
+        move(run_dir, local)
+        run_dir = local
+
+    old: Optional[Path] = None
+    if final.exists():
+        old = final.parent / f".{final.name}.old-{uuid.uuid4().hex[:8]}"
+        os.replace(final, old)
+    os.replace(run_dir, final)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+    return final
+
+
+def discard(path: Path):
+    if path.exists():
+        shutil.rmtree(path, ignore_errors=True)
@@ -1,26 +1,226 @@
 import os
 import sys
 import subprocess
-import shutil
-import tempfile
+import time
 from pathlib import Path
 
-from app.celery_app import celery_app
-from app.database import SessionLocal
-from app import models
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_process_init
 
-CONDA_PYTHON = sys.executable 
+from app.celery_app import celery_app, LIGHT_QUEUE
+from app.database import SessionLocal, dispose_after_fork
+from app import models, result_cache
+from app.trace_split import offset_script
+from app.bscan_merge import merge_result_dir
+from app import storage, result_pack, preview, processing, similarity, solver, execution
+from app.catalog import get_catalog
+from app.result_slice import find_result_file
+from app.cost_estimator import trace_count, estimate_script
+
+CONDA_PYTHON = sys.executable
+
+# Базовая директория для хранения всех результатов (см. app.storage)
+RESULTS_BASE_DIR = storage.RESULTS_BASE_DIR
+
+# CPU/GPU, потоки OpenMP и привязка к ядрам (app.execution)
+EXECUTION_PROFILE = execution.ExecutionProfile.from_env()
+
+# Таймаут процесса gprMax, если планировщик не передал свой
+DEFAULT_TIMEOUT_SEC = 3600
+
+# Как часто публиковать прогресс в Celery и в БД, с
+PROGRESS_STATE_INTERVAL_SEC = 2
+PROGRESS_DB_INTERVAL_SEC = 10
+
+
+@worker_process_init.connect
+def _reset_db_pool(**kwargs):
+    # Движок импортирован до fork пула — соединения родителя дочернему процессу не нужны
+    dispose_after_fork()
+
+
+@worker_process_init.connect
+def _preload_solver(**kwargs):
+    # Тёплый режим: импорт gprMax один раз на процесс пула, а не на задачу
+    if EXECUTION_PROFILE.runner == "warm":
+        try:
+            solver.load_gprmax_api()
+        except ImportError as e:
+            print(f"Не удалось импортировать gprMax: {e}")
+
+
+def script_input_name(script_id) -> str:
+    """Имя входного файла; gprMax называет выходные файлы по нему (…1.out, …2.out)."""
+    return f"gprmax_script_{script_id}"
+
+
+def solver_command(script_filename: Path, num_steps: int, profile: execution.ExecutionProfile, slot: int):
+    return [
+        CONDA_PYTHON, "-m", "gprMax",
+        str(script_filename),
+        "-n", str(num_steps),
+    ] + profile.solver_args(slot)
+
+
+def _run_solver(script_filename: Path, num_steps: int, cwd: Path, timeout_sec, log_path: Path,
+                on_progress=None, profile: execution.ExecutionProfile = None, slot: int = None):
+    profile = profile or EXECUTION_PROFILE
+    slot = execution.current_slot() if slot is None else slot
+    if profile.runner == "warm":
+        # gprMax уже импортирован в этом процессе пула, задача — в дочернем процессе
+        print(f" Выполняется: gprMax.api {script_filename} -n {num_steps} "
+              f"(потоков: {profile.threads}, слот {slot}, режим warm)")
+        return solver.run_solver_warm(
+            script_filename, num_steps,
+            cwd=cwd,
+            log_path=log_path,
+            gpu=profile.api_gpu(slot),
+            timeout_sec=timeout_sec,
+            progress=solver.SolverProgress(num_steps),
+            on_progress=on_progress,
+            env=profile.solver_env(),
+            cpus=profile.affinity(slot),
+        )
+    cmd = solver_command(script_filename, num_steps, profile, slot)
+    print(f" Выполняется: {' '.join(cmd)} (потоков: {profile.threads}, слот {slot})")
+    # Вывод решателя идёт в лог на диске по мере поступления (app.solver)
+    return solver.run_solver(
+        cmd,
+        cwd=cwd,      # важно, чтобы выходные файлы были в рабочей директории
+        log_path=log_path,
+        timeout_sec=timeout_sec,
+        progress=solver.SolverProgress(num_steps),
+        on_progress=on_progress,
+        env=profile.solver_env(),
+        cpus=profile.affinity(slot),
+    )
+
+
+def _progress_reporter(task, db=None, script=None, **extra):
+    """
+    Публикация прогресса: состояние PROGRESS задачи Celery (для /tasks/{task_id})
+    и, если передан script, поля progress / progress_eta_sec в БД. С ограничением частоты.
+    """
+    last = {"state": 0.0, "db": 0.0}
+
+    def report(progress):
+        now = time.time()
+        info = dict(progress.as_dict(), **extra)
+        if task.request.id and now - last["state"] >= PROGRESS_STATE_INTERVAL_SEC:
+            last["state"] = now
+            try:
+                task.update_state(state="PROGRESS", meta=info)
+            except Exception as e:
+                print(f"Не удалось опубликовать прогресс: {e}")
+        if script is not None and now - last["db"] >= PROGRESS_DB_INTERVAL_SEC:
+            last["db"] = now
+            script.progress = progress.fraction
+            script.progress_eta_sec = info["eta_sec"]
+            db.commit()
+
+    return report
+
+
+def _collect_outputs(work_dir: Path, script_id, stem: str):
+    # Ищем выходной файл (может быть .out или .h5)
+    output_files = list(work_dir.glob(f"*{script_id}*.out")) + \
+                   list(work_dir.glob(f"*{script_id}*.h5"))
+    if not output_files:
+        output_files = list(work_dir.glob(f"{stem}*.out")) + \
+                       list(work_dir.glob(f"{stem}*.h5"))
+    return output_files
+
+
+def _main_output(output_files):
+    for f in output_files:
+        if f.suffix == ".h5":
+            return f
+    return sorted(output_files)[0]
+
+
+def _merge_outputs(result_dir: Path, script_id, fallback: Path) -> Path:
+    """Собрать трассы в один HDF5 (app.bscan_merge); при ошибке остаются исходные файлы."""
+    try:
+        merged = merge_result_dir(result_dir, script_input_name(script_id))
+    except Exception as e:
+        print(f"Не удалось собрать B-скан, остаются файлы трасс: {e}")
+        return fallback
+    return merged or fallback
+
+
+def _pack_outputs(result_dir: Path, script):
+    """Упаковать выходные файлы (app.result_pack); при ошибке остаются исходные."""
+    if not result_pack.PACK_ENABLED:
+        return
+    try:
+        stats = result_pack.pack_result_dir(result_dir, script.config_json, script.script_content)
+    except Exception as e:
+        print(f"Не удалось упаковать результаты, остаются исходные файлы: {e}")
+        return
+    if stats:
+        script.compression_ratio = stats["compression_ratio"]
+        print(f"Результаты упакованы: {stats['original_bytes']} -> {stats['packed_bytes']} байт "
+              f"(x{stats['compression_ratio']})")
+
+
+def _expected_output_bytes(script) -> int:
+    try:
+        return estimate_script(script)["estimated_output_bytes"]
+    except (KeyError, ValueError):
+        return 0
+
+
+def _mark_completed(db, script, main_output: Path):
+    # Обновляем запись в БД
+    script.status = "completed"
+    script.error = None
+    script.progress = 1.0
+    script.progress_eta_sec = 0.0
+    # Если есть связанный ObjectPortrait, записываем путь в него
+    portrait = None
+    if script.result_portrait_id:
+        portrait = db.query(models.ObjectPortrait).get(script.result_portrait_id)
+        if portrait:
+            portrait.result_file_path = str(main_output.absolute())
+    result_cache.resolve_waiters(db, script, success=True)
+    db.commit()
+    # Обработка и превью — отдельные лёгкие задачи, воркер решателя их не ждёт
+    if processing.PROCESSING_ENABLED:
+        _queue_light(process_simulation_result, script.id)
+    if portrait:
+        queue_portrait_tasks(portrait.id)
+
+
+def _queue_light(task, *args):
+    try:
+        task.apply_async(args=list(args), queue=LIGHT_QUEUE)
+    except Exception as e:
+        print(f"Не удалось поставить задачу {task.name} в очередь: {e}")
+
+
+def queue_portrait_tasks(portrait_id):
+    """Превью и сигнатура портрета, у которого появился файл результата (в том числе из кэша)."""
+    _queue_light(render_portrait_preview, portrait_id)
+    _queue_light(index_portrait_signature, portrait_id)
+
+
+def _mark_failed(db, script, error_msg):
+    db.rollback()
+    script.status = "failed"
+    script.error = error_msg
+    result_cache.resolve_waiters(db, script, success=False)
+    db.commit()
 
-# Базовая директория для хранения всех результатов
-RESULTS_BASE_DIR = Path("./results").absolute()
 
 @celery_app.task(bind=True, name='app.tasks.run_gprmax_simulation')
-def run_gprmax_simulation(self, script_id):
+def run_gprmax_simulation(self, script_id, timeout_sec=None):
     """
     Запуск моделирования gprMax.
     После выполнения файлы сохраняются в ./results/{script_id}/
     и путь записывается в БД.
+    timeout_sec задаётся планировщиком по оценке стоимости (app.scheduler).
     """
+    timeout_sec = timeout_sec or DEFAULT_TIMEOUT_SEC
     print(f" Запуск моделирования для script_id={script_id}")
     db = SessionLocal()
     script = None
@@ -30,123 +230,310 @@ def run_gprmax_simulation(self, script_id):
         if not script:
             return {"error": "Script not found"}
 
+        # Такой же входной файл уже посчитан — берём готовый результат
+        result_cache.ensure_hash(script)
+        source = result_cache.find_cached_result(db, script)
+        if source:
+            result_cache.link_to_result(db, script, source)
+            script.celery_task_id = self.request.id
+            result_cache.resolve_waiters(db, script, success=True)
+            db.commit()
+            print(f"Результат взят из кэша: script_id={source.id}")
+            return {
+                "status": "cached",
+                "source_script_id": source.id,
+                "result_directory": str(RESULTS_BASE_DIR / str(source.id))
+            }
+
         # Обновляем статус
         script.status = "running"
         script.celery_task_id = self.request.id
+        script.progress = 0.0
+        script.progress_eta_sec = None
         db.commit()
 
-        # Создаём временную директорию для работы gprMax
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmp_path = Path(tmpdir)
-            script_filename = tmp_path / f"gprmax_script_{script_id}.in"
+        # Рабочая директория на той же ФС, что и хранилище (или tmpfs для малых
+        # запусков); заодно проверяем, хватит ли места под ожидаемый вывод
+        run_dir = storage.make_run_dir(script_id, _expected_output_bytes(script))
+        try:
+            script_filename = run_dir / f"{script_input_name(script_id)}.in"
 
             with open(script_filename, "w", encoding="utf-8") as f:
                 f.write(script.script_content)
 
-            config = script.config_json
-            movement = config["movement"]
-            start = movement["start_point"]
-            end = movement.get("end_point", start)
-            step = movement.get("step_size", 0.02)
-            distance = abs(end["x"] - start["x"])
-            num_steps = int(distance / step) + 1 if step > 0 else 1
-
-            # Формируем команду
-            cmd = [
-                CONDA_PYTHON, "-m", "gprMax",
-                str(script_filename),
-                "-n", str(num_steps),
-                "-gpu"
-            ]
-            print(f" Выполняется: {' '.join(cmd)}")
-
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=3600,   
-                cwd=str(tmp_path)      # важно, чтобы выходные файлы были в tmpdir
-            )
+            num_steps = trace_count(script.config_json)
+            # Соединение возвращается в пул на время работы решателя; прогресс
+            # пишется короткими транзакциями, остальное — после завершения
+            db.commit()
+
+            started = time.time()
+            result = _run_solver(script_filename, num_steps, run_dir, timeout_sec, run_dir / "gprmax.log",
+                                 on_progress=_progress_reporter(self, db, script, script_id=script_id))
+            script.runtime_sec = time.time() - started
 
             if result.returncode != 0:
-                error_msg = f"gprMax error (code {result.returncode}): {result.stderr}"
+                error_msg = f"gprMax error (code {result.returncode}): {result.tail}"
                 print(f"{error_msg}")
-                script.status = "failed"
-                script.error = error_msg
-                db.commit()
+                _mark_failed(db, script, error_msg)
                 return {"error": error_msg}
 
             print("gprMax завершился успешно")
 
-            # Ищем выходной файл (может быть .out или .h5)
-            output_files = list(tmp_path.glob(f"*{script_id}*.out")) + \
-                           list(tmp_path.glob(f"*{script_id}*.h5"))
-            if not output_files:
-                base = script_filename.stem
-                output_files = list(tmp_path.glob(f"{base}*.out")) + \
-                               list(tmp_path.glob(f"{base}*.h5"))
-
+            output_files = _collect_outputs(run_dir, script_id, script_filename.stem)
             if not output_files:
                 raise FileNotFoundError("Выходной файл не найден после моделирования")
 
-            main_output = None
-            for f in output_files:
-                if f.suffix == ".h5":
-                    main_output = f
-                    break
-            if main_output is None:
-                main_output = output_files[0]
-
-            # Создаём постоянную папку для результатов этого скрипта
-            result_dir = RESULTS_BASE_DIR / str(script_id)
-            result_dir.mkdir(parents=True, exist_ok=True)
-
-            # Копируем все сгенерированные файлы
-            saved_files = []
-            for f in output_files:
-                dest = result_dir / f.name
-                shutil.copy2(f, dest)
-                saved_files.append(str(dest))
-
-            script_backup = result_dir / f"script_{script_id}.in"
-            shutil.copy2(script_filename, script_backup)
-
-            log_file = result_dir / "gprmax.log"
-            with open(log_file, "w", encoding="utf-8") as f:
-                f.write("STDOUT:\n" + result.stdout + "\n\nSTDERR:\n" + result.stderr)
-
-            # Обновляем запись в БД
-            script.status = "completed"
-            script.error = None
-            # Если есть связанный ObjectPortrait, записываем путь в него
-            if script.result_portrait_id:
-                portrait = db.query(models.ObjectPortrait).get(script.result_portrait_id)
-                if portrait:
-                    portrait.result_file_path = str(main_output.absolute())
-            db.commit()
+            # Входной файл остаётся рядом с результатом
+            script_filename.replace(run_dir / f"script_{script_id}.in")
+
+            main_output = _merge_outputs(run_dir, script_id, _main_output(output_files))
+            _pack_outputs(run_dir, script)
+
+            # Публикуем директорию целиком одним rename
+            result_dir = storage.commit_run_dir(run_dir, script_id)
+            main_output = result_dir / main_output.name
+            _mark_completed(db, script, main_output)
 
             print(f"Результаты сохранены в: {result_dir}")
             return {
                 "status": "success",
-                "output_files": saved_files,
+                "output_files": [str(p) for p in sorted(result_dir.glob("*")) if p.suffix in (".out", ".h5")],
+                "result_file": str(main_output),
                 "result_directory": str(result_dir)
             }
+        finally:
+            storage.discard(run_dir)
 
-    except subprocess.TimeoutExpired:
-        error_msg = "Превышено время выполнения (1 час)"
+    except (subprocess.TimeoutExpired, SoftTimeLimitExceeded):
+        error_msg = f"Превышено время выполнения ({timeout_sec} с)"
         print(f"{error_msg}")
         if script:
-            script.status = "failed"
-            script.error = error_msg
-            db.commit()
+            _mark_failed(db, script, error_msg)
         return {"error": error_msg}
+    except storage.InsufficientSpaceError as e:
+        print(f"{e}")
+        if script:
+            _mark_failed(db, script, str(e))
+        return {"error": str(e)}
     except Exception as e:
         error_msg = f"Непредвиденная ошибка: {str(e)}"
         print(f"{error_msg}")
         if script:
-            script.status = "failed"
-            script.error = str(e)
+            _mark_failed(db, script, str(e))
+        return {"error": str(e)}
+    finally:
+        db.close()
+
+
+@celery_app.task(bind=True, name='app.tasks.run_trace_chunk')
+def run_trace_chunk(self, script_id, first_trace, count, timeout_sec=None):
+    """
+    Моделирование части B-скана: трассы first_trace .. first_trace + count - 1
+    (нумерация с 0). Выходные файлы сразу получают глобальные номера трасс,
+    как при обычном запуске, и складываются в ./results/{script_id}/.
+    """
+    timeout_sec = timeout_sec or DEFAULT_TIMEOUT_SEC
+    print(f" Трассы {first_trace}..{first_trace + count - 1} для script_id={script_id}")
+    db = SessionLocal()
+    try:
+        script = db.query(models.Script).get(script_id)
+        if not script:
+            return {"error": "Script not found", "first_trace": first_trace}
+        if script.status != "running":
+            script.status = "running"
             db.commit()
+        script_content = script.script_content
+        # Ожидаемый объём вывода части пропорционален числу её трасс
+        expected_bytes = _expected_output_bytes(script) * count // max(trace_count(script.config_json), 1)
+    finally:
+        db.close()
+
+    stem = script_input_name(script_id)
+    run_dir = None
+    try:
+        run_dir = storage.make_run_dir(f"{script_id}_part{first_trace}", expected_bytes)
+        part_stem = f"{stem}_part{first_trace}_"
+        script_filename = run_dir / f"{part_stem}.in"
+        with open(script_filename, "w", encoding="utf-8") as f:
+            f.write(offset_script(script_content, first_trace))
+
+        log_name = f"gprmax_part{first_trace}.log"
+        started = time.time()
+        result = _run_solver(script_filename, count, run_dir, timeout_sec, run_dir / log_name,
+                             on_progress=_progress_reporter(self, script_id=script_id, first_trace=first_trace))
+        runtime_sec = time.time() - started
+
+        if result.returncode != 0:
+            return {"error": f"gprMax error (code {result.returncode}): {result.tail}",
+                    "first_trace": first_trace}
+
+        # Части собираются в общей staging-директории рядом с хранилищем
+        staging = storage.staging_dir(script_id)
+        staging.mkdir(parents=True, exist_ok=True)
+
+        saved_files = []
+        for f in sorted(run_dir.glob(f"{part_stem}*")):
+            if f.suffix not in (".out", ".h5"):
+                continue
+            # …_part{first}_{n}.out -> …{first + n}.out (gprMax нумерует трассы с 1,
+            # а при -n 1 пишет файл без номера)
+            local = f.stem[len(part_stem):]
+            if local and not local.isdigit():
+                continue
+            index = first_trace + (int(local) if local else 1)
+            dest = staging / f"{stem}{index}{f.suffix}"
+            storage.move(f, dest)
+            saved_files.append(str(dest))
+
+        storage.move(run_dir / log_name, staging / log_name)
+
+        return {
+            "first_trace": first_trace,
+            "count": count,
+            "output_files": saved_files,
+            "runtime_sec": runtime_sec
+        }
+    except (subprocess.TimeoutExpired, SoftTimeLimitExceeded):
+        return {"error": f"Превышено время выполнения ({timeout_sec} с)", "first_trace": first_trace}
+    except Exception as e:
+        return {"error": str(e), "first_trace": first_trace}
+    finally:
+        if run_dir is not None:
+            storage.discard(run_dir)
+
+
+@celery_app.task(bind=True, name='app.tasks.merge_trace_chunks')
+def merge_trace_chunks(self, chunk_results, script_id):
+    """Завершающий шаг chord: проверка всех частей и сборка единого результата."""
+    db = SessionLocal()
+    script = None
+    try:
+        script = db.query(models.Script).get(script_id)
+        if not script:
+            return {"error": "Script not found"}
+
+        errors = [r for r in chunk_results if r.get("error")]
+        if errors:
+            error_msg = "; ".join(f"трассы с {r['first_trace']}: {r['error']}" for r in errors)
+            storage.discard(storage.staging_dir(script_id))
+            _mark_failed(db, script, error_msg)
+            return {"error": error_msg}
+
+        chunk_results = sorted(chunk_results, key=lambda r: r["first_trace"])
+        output_files = [Path(p) for r in chunk_results for p in r["output_files"]]
+        expected = sum(r["count"] for r in chunk_results)
+        if len(output_files) < expected:
+            raise FileNotFoundError(f"Найдено {len(output_files)} выходных файлов из {expected}")
+
+        staging = storage.staging_dir(script_id)
+        (staging / f"script_{script_id}.in").write_text(script.script_content, encoding="utf-8")
+
+        # Суммарное время решателя по всем частям — для калибровки и отчёта кэша
+        script.runtime_sec = sum(r["runtime_sec"] for r in chunk_results)
+        main_output = _merge_outputs(staging, script_id, _main_output(output_files))
+        _pack_outputs(staging, script)
+        result_dir = storage.commit_run_dir(staging, script_id)
+        main_output = result_dir / main_output.name
+        _mark_completed(db, script, main_output)
+
+        print(f"B-скан собран из {len(chunk_results)} частей: {result_dir}")
+        return {
+            "status": "success",
+            "chunks": len(chunk_results),
+            "result_file": str(main_output),
+            "result_directory": str(result_dir)
+        }
+    except Exception as e:
+        print(f"Непредвиденная ошибка при сборке B-скана: {e}")
+        if script:
+            _mark_failed(db, script, str(e))
+        return {"error": str(e)}
+    finally:
+        db.close()
+
+
+@celery_app.task(name='app.tasks.fail_trace_chunks')
+def fail_trace_chunks(request, exc, traceback, script_id):
+    """
+    Обработчик ошибки chord (link_error на merge_trace_chunks): часть не вернула
+    результат — превышен жёсткий time_limit или потерян воркер, — и сборка
+    не запустится. Скрипт и ожидающие его дубликаты помечаются ошибкой.
+    """
+    db = SessionLocal()
+    try:
+        script = db.query(models.Script).get(script_id)
+        if not script or script.status == "completed":
+            return
+        storage.discard(storage.staging_dir(script_id))
+        _mark_failed(db, script, f"Часть B-скана не завершилась: {exc!r}")
+        print(f"B-скан script_id={script_id} не собран: {exc!r}")
+    finally:
+        db.close()
+
+
+@celery_app.task(name='app.tasks.render_portrait_preview')
+def render_portrait_preview(portrait_id):
+    """Миниатюра и пирамида тайлов портрета (app.preview)."""
+    db = SessionLocal()
+    try:
+        portrait = db.query(models.ObjectPortrait).get(portrait_id)
+        if not portrait or not portrait.result_file_path:
+            return {"error": "Portrait result not found"}
+        result_file_path = portrait.result_file_path
+    finally:
+        db.close()
+    try:
+        return preview.render_portrait(result_file_path) or {"error": "Result file not found"}
+    except Exception as e:
+        print(f"Ошибка рендера превью портрета {portrait_id}: {e}")
+        return {"error": str(e)}
+
+
+@celery_app.task(name='app.tasks.process_simulation_result')
+def process_simulation_result(script_id):
+    """
+    Обработка результата (app.processing): dewow, нулевое время, удаление фона,
+    полосовой фильтр, усиление. Пишет ./results/{script_id}/processed.h5.
+    """
+    db = SessionLocal()
+    try:
+        script = db.query(models.Script).get(script_id)
+        if not script or script.status != "completed":
+            return {"error": "Completed script not found"}
+        config_json = script.config_json
+        antenna_id = (config_json.get("gpr_config") or {}).get("antenna_id")
+        antenna = get_catalog(db).antenna(antenna_id) if antenna_id else None
+    finally:
+        db.close()
+
+    result_dir = storage.result_dir(script_id)
+    source = find_result_file(result_dir)
+    if source is None:
+        return {"error": "Result file not found"}
+    try:
+        summary = processing.process_result_dir(result_dir, source, config_json, antenna)
+    except Exception as e:
+        print(f"Ошибка обработки результата script_id={script_id}: {e}")
+        return {"error": str(e)}
+    print(f"Результат обработан: {result_dir / processing.PROCESSED_FILENAME}")
+    return summary
+
+
+@celery_app.task(name='app.tasks.index_portrait_signature')
+def index_portrait_signature(portrait_id):
+    """Сигнатура B-скана портрета для поиска по сигналу (app.similarity)."""
+    db = SessionLocal()
+    try:
+        portrait = db.query(models.ObjectPortrait).get(portrait_id)
+        if not portrait:
+            return {"error": "Portrait not found"}
+        if not similarity.index_portrait(db, portrait):
+            return {"error": "Result file not found"}
+        db.commit()
+        return {"portrait_id": portrait_id, "signature_version": similarity.SIGNATURE_VERSION}
+    except Exception as e:
+        db.rollback()
+        print(f"Ошибка индексации портрета {portrait_id}: {e}")
         return {"error": str(e)}
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,66 @@
+from typing import List, Tuple
+
+# Разбиение B-скана на диапазоны трасс для параллельного запуска.
+# Для диапазона, начинающегося с трассы first, источник и приёмник во входном
+# файле сдвигаются на first шагов #src_steps / #rx_steps, а gprMax запускается
+# с -n равным длине диапазона.
+
+SOURCE_COMMANDS = ("#hertzian_dipole:", "#magnetic_dipole:", "#voltage_source:")
+RX_COMMANDS = ("#rx:",)
+
+
+def split_traces(num_traces: int, chunks: int) -> List[Tuple[int, int]]:
+    """Диапазоны (первая трасса, число трасс) почти равной длины; трассы с 0."""
+    chunks = max(1, min(chunks, num_traces))
+    base, extra = divmod(num_traces, chunks)
+    ranges = []
+    first = 0
+    for i in range(chunks):
+        count = base + (1 if i < extra else 0)
+        ranges.append((first, count))
+        first += count
+    return ranges
+
+
+def _steps(script_content: str, command: str) -> Tuple[float, float, float]:
+    for line in script_content.splitlines():
+        line = line.strip()
+        if line.startswith(command):
+            values = line[len(command):].split()
+            return float(values[0]), float(values[1]), float(values[2])
+    return 0.0, 0.0, 0.0
+
+
+def _fmt(value: float) -> str:
+    return repr(round(value, 9))
+
+
+def _shift_line(line: str, coord_index: int, offset: Tuple[float, float, float]) -> str:
+    command, _, args = line.partition(":")
+    values = args.split()
+    for axis in range(3):
+        i = coord_index + axis
+        values[i] = _fmt(float(values[i]) + offset[axis])
+    return f"{command}: {' '.join(values)}"
+
+
+def offset_script(script_content: str, first_trace: int) -> str:
+    """Входной файл, в котором первой трассой становится трасса first_trace."""
+    if first_trace == 0:
+        return script_content
+    src_steps = _steps(script_content, "#src_steps:")
+    rx_steps = _steps(script_content, "#rx_steps:")
+    src_offset = tuple(step * first_trace for step in src_steps)
+    rx_offset = tuple(step * first_trace for step in rx_steps)
+
+    lines = []
+    for line in script_content.splitlines():
+        stripped = line.strip()
+        if stripped.startswith(SOURCE_COMMANDS):
+            # #hertzian_dipole: polarisation x y z waveform
+            line = _shift_line(stripped, 1, src_offset)
+        elif stripped.startswith(RX_COMMANDS):
+            # #rx: x y z [id components]
+            line = _shift_line(stripped, 0, rx_offset)
+        lines.append(line)
+    return "\n".join(lines)
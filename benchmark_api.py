@@ -0,0 +1,85 @@
+# benchmark_api.py
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+# Нагрузочный тест эндпоинтов чтения: N одновременных клиентов в течение
+# заданного времени запрашивают списки и отдельные записи каталога, скриптов
+# и портретов. Для сравнения «до/после» тот же прогон делается против сервера,
+# запущенного из предыдущей версии кода.
+# Пример: uvicorn main:app --workers 1 &
+#         python benchmark_api.py --url http://localhost:8000 --clients 64 --duration 20
+
+DEFAULT_PATHS = [
+    "/soil-types/",
+    "/soil-types/1",
+    "/materials/",
+    "/target-types/",
+    "/antennas/",
+    "/pulse-types/",
+    "/object-portraits/?limit=100",
+    "/scripts/?limit=100",
+    "/scripts/1",
+]
+
+
+async def client_loop(client: httpx.AsyncClient, paths, deadline: float, latencies, errors, offset: int):
+    i = offset
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(url: str, paths, clients: int, duration: float):
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        # Прогрев: соединения, кэши БД
+        for path in paths:
+            await client.get(path)
+        latencies, errors = [], []
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(
+            client_loop(client, paths, deadline, latencies, errors, n) for n in range(clients)
+        ))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Запросов в секунду на эндпоинтах чтения")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=64, help="Одновременных клиентов")
+    parser.add_argument("--duration", type=float, default=20.0, help="Длительность, с")
+    parser.add_argument("--path", action="append", help="Эндпоинт (можно несколько раз), по умолчанию — набор чтения")
+    args = parser.parse_args()
+
+    paths = args.path or DEFAULT_PATHS
+    latencies, errors, elapsed = asyncio.run(run(args.url, paths, args.clients, args.duration))
+    if not latencies:
+        raise SystemExit(f"Нет успешных ответов, ошибки: {errors[:10]}")
+    latencies.sort()
+    print(f"Клиентов: {args.clients}, эндпоинтов: {len(paths)}, длительность {elapsed:.1f} с")
+    print(f"Запросов в секунду: {len(latencies) / elapsed:.1f}")
+    print(f"Задержка: медиана {1000 * statistics.median(latencies):.1f} мс, "
+          f"p95 {1000 * latencies[int(0.95 * (len(latencies) - 1))]:.1f} мс, "
+          f"p99 {1000 * latencies[int(0.99 * (len(latencies) - 1))]:.1f} мс")
+    if errors:
+        print(f"Ошибок: {len(errors)} (например {errors[:5]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmark_bulk_upload.py
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Загрузка большого файла каталога движком /bulk-upload/ (app/bulk_upload.py).
+# Генерируется JSON-файл (по умолчанию 500 тыс. портретов и справочники к ним),
+# затем загружается в отдельную БД; печатаются время, скорость и пик памяти
+# процесса. Можно также отправить файл в работающий API (--url).
+# Пример: python benchmark_bulk_upload.py --portraits 500000
+#         python benchmark_bulk_upload.py --file catalog.json --url http://localhost:8000
+
+SOILS = ["песок", "глина", "суглинок", "торф"]
+
+
+def generate(path: Path, portraits: int):
+    rng = random.Random(0)
+    soils = [{"name": f"{name}_{i}", "description": "синтетика",
+              "parameters": {"epsilon": round(rng.uniform(3, 30), 2), "sigma": round(rng.uniform(1e-4, 0.1), 5)}}
+             for i, name in enumerate(SOILS * 5)]
+    materials = [{"name": f"материал_{i}", "parameters": {"epsilon": rng.randint(1, 10)}} for i in range(10)]
+    targets = [{"name": f"цель_{i}", "shape": rng.choice(["disk", "box"]), "material_id": None} for i in range(20)]
+    antennas = [{"name": f"антенна_{i}", "frequency": 100.0 * (i + 1), "parameters": {}} for i in range(3)]
+    pulses = [{"name": f"импульс_{i}", "waveform": "ricker", "parameters": {}} for i in range(3)]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{")
+        for key, records in [("soil_types", soils), ("materials", materials), ("target_types", targets),
+                             ("antennas", antennas), ("pulse_types", pulses)]:
+            f.write(f'"{key}": {json.dumps(records, ensure_ascii=False)},\n')
+        f.write('"object_portraits": [\n')
+        for i in range(portraits):
+            # id справочников: загрузка идёт в пустую БД, нумерация с 1
+            record = {
+                "target_type_id": rng.randint(1, len(targets)), "soil_type_id": rng.randint(1, len(soils)),
+                "antenna_id": rng.randint(1, len(antennas)), "pulse_id": rng.randint(1, len(pulses)),
+                "simulation_params": {"traces": 60, "time_window": 3e-8}, "result_file_path": f"results/{i}/merged.out",
+            }
+            f.write(("," if i else "") + json.dumps(record) + "\n")
+        f.write("]}")
+
+
+def peak_rss_mb() -> float:
+    # Linux: ru_maxrss в КБ
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка большого каталога через /bulk-upload/")
+    parser.add_argument("--portraits", type=int, default=500_000)
+    parser.add_argument("--file", help="Готовый файл вместо синтетического")
+    parser.add_argument("--database-url", help="Пустая БД для теста (по умолчанию временный SQLite)")
+    parser.add_argument("--url", help="Отправить файл в API вместо загрузки в процессе")
+    parser.add_argument("--batch-size", type=int)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="gpr_bulk_"))
+    path = Path(args.file) if args.file else workdir / "catalog.json"
+    if not args.file:
+        started = time.perf_counter()
+        generate(path, args.portraits)
+        print(f"Файл: {path.stat().st_size / 2**20:.1f} МБ, {time.perf_counter() - started:.1f} с")
+
+    if args.url:
+        import httpx
+        started = time.perf_counter()
+        with open(path, "rb") as f:
+            response = httpx.post(f"{args.url}/bulk-upload/", files={"file": (path.name, f, "application/json")},
+                                  timeout=None)
+        print(f"HTTP {response.status_code} за {time.perf_counter() - started:.1f} с")
+        print(json.dumps(response.json(), ensure_ascii=False, indent=2)[:2000])
+        return
+
+    if not args.database_url:
+        args.database_url = f"sqlite:///{workdir / 'bench.db'}"
+    os.environ["DATABASE_URL"] = args.database_url
+    sys.path.insert(0, str(Path(__file__).parent))
+    from app.database import SessionLocal, engine
+    from app.db_migrations import upgrade_database
+    from app import bulk_upload
+
+    upgrade_database()
+    rss_before = peak_rss_mb()
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            report = bulk_upload.load(db, f, batch_size=args.batch_size)
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - started
+
+    print(f"Загружено {report['total_records']} записей за {elapsed:.1f} с "
+          f"({report['total_records'] / elapsed:,.0f} записей/с), ошибок: {report['failed']}")
+    print(f"Пик памяти процесса: {peak_rss_mb():.0f} МБ (до загрузки {rss_before:.0f} МБ)")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
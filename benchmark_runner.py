@@ -0,0 +1,82 @@
+# benchmark_runner.py
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from app.database import SessionLocal
+from app import models, solver
+from app.execution import ExecutionProfile
+from app.tasks import _run_solver, script_input_name
+
+# Сравнение режимов запуска gprMax: новый интерпретатор на задачу (subprocess)
+# и прогретый процесс воркера с fork на задачу (warm). Скрипт запускается
+# несколько раз подряд в каждом режиме; разница среднего времени — накладные
+# расходы на задачу, которые экономит режим warm.
+# Пример: python benchmark_runner.py --script-id 1 --runs 10 --traces 1
+
+
+def run_mode(runner: str, script_content: str, name: str, runs: int, traces: int, device: str):
+    profile = ExecutionProfile(device=device, runner=runner)
+    times = []
+    work_dir = Path(tempfile.mkdtemp(prefix=f"gprmax_bench_{runner}_"))
+    try:
+        for i in range(runs):
+            run_dir = work_dir / str(i)
+            run_dir.mkdir()
+            script_filename = run_dir / f"{name}.in"
+            script_filename.write_text(script_content, encoding="utf-8")
+            started = time.perf_counter()
+            result = _run_solver(script_filename, traces, run_dir, None, run_dir / "gprmax.log",
+                                 profile=profile, slot=0)
+            times.append(time.perf_counter() - started)
+            if result.returncode != 0:
+                raise RuntimeError(f"gprMax error (code {result.returncode}): {result.tail[-500:]}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Накладные расходы на задачу: subprocess против warm")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--script-id", type=int, help="Скрипт из БД")
+    source.add_argument("--input", type=Path, help="Входной файл gprMax")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--traces", type=int, default=1, help="Трасс в одном запуске (A-скан — 1)")
+    parser.add_argument("--device", choices=["cpu", "gpu"], default="cpu")
+    args = parser.parse_args()
+
+    if args.input:
+        script_content, name = args.input.read_text(encoding="utf-8"), args.input.stem
+    else:
+        db = SessionLocal()
+        try:
+            script = db.query(models.Script).get(args.script_id)
+            if not script:
+                raise SystemExit(f"Скрипт {args.script_id} не найден")
+            script_content, name = script.script_content, script_input_name(script.id)
+        finally:
+            db.close()
+
+    started = time.perf_counter()
+    solver.load_gprmax_api()
+    warmup = time.perf_counter() - started
+
+    results = {}
+    for runner in ("subprocess", "warm"):
+        times = run_mode(runner, script_content, name, args.runs, args.traces, args.device)
+        results[runner] = times
+        print(f"{runner:>10}: среднее {statistics.mean(times):.3f} с, медиана {statistics.median(times):.3f} с "
+              f"({args.runs} запусков по {args.traces} трасс)")
+
+    saved = statistics.mean(results["subprocess"]) - statistics.mean(results["warm"])
+    print(f"\nИмпорт gprMax в процессе воркера (один раз): {warmup:.3f} с")
+    print(f"Экономия на задачу: {saved:.3f} с "
+          f"({100 * saved / statistics.mean(results['subprocess']):.0f}% времени короткого запуска)")
+
+
+if __name__ == "__main__":
+    main()
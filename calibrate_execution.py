@@ -0,0 +1,93 @@
+# calibrate_execution.py
+import argparse
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.database import SessionLocal
+from app import models
+from app.execution import ExecutionProfile, available_cpus
+from app.tasks import _run_solver, script_input_name
+
+# Подбор числа потоков OpenMP на задачу для этого узла: для каждого варианта
+# одновременно запускается (ядра ÷ потоки) копий эталонного скрипта, каждая на
+# своём наборе ядер, и измеряется пропускная способность узла в трассах в час.
+# Пример: python calibrate_execution.py --script-id 1 --traces 2
+
+
+def candidate_threads(cores: int):
+    options = {cores}
+    threads = 1
+    while threads < cores:
+        options.add(threads)
+        threads *= 2
+    return sorted(options)
+
+
+def run_variant(script, profile: ExecutionProfile, traces: int, timeout_sec: float):
+    concurrency = profile.concurrency()
+    work_dir = Path(tempfile.mkdtemp(prefix="gprmax_calibrate_"))
+    try:
+        def run(slot):
+            slot_dir = work_dir / str(slot)
+            slot_dir.mkdir()
+            script_filename = slot_dir / f"{script_input_name(script.id)}.in"
+            script_filename.write_text(script.script_content, encoding="utf-8")
+            result = _run_solver(script_filename, traces, slot_dir, timeout_sec, slot_dir / "gprmax.log",
+                                 profile=profile, slot=slot)
+            if result.returncode != 0:
+                raise RuntimeError(f"gprMax error (code {result.returncode}): {result.tail[-500:]}")
+
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(run, range(concurrency)))
+        wall = time.time() - started
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        "threads": profile.threads,
+        "concurrency": concurrency,
+        "wall_sec": wall,
+        "traces_per_hour": concurrency * traces * 3600.0 / wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Подбор потоков на задачу для gprMax на этом узле")
+    parser.add_argument("--script-id", type=int, required=True, help="Эталонный скрипт из БД")
+    parser.add_argument("--traces", type=int, default=2, help="Сколько трасс считать в каждом запуске")
+    parser.add_argument("--threads", type=int, nargs="*", help="Варианты потоков на задачу")
+    parser.add_argument("--device", choices=["cpu", "gpu"], default="cpu")
+    parser.add_argument("--timeout", type=float, default=3600)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        script = db.query(models.Script).get(args.script_id)
+        if not script:
+            raise SystemExit(f"Скрипт {args.script_id} не найден")
+    finally:
+        db.close()
+
+    cores = len(available_cpus())
+    results = []
+    for threads in args.threads or candidate_threads(cores):
+        profile = ExecutionProfile(device=args.device, threads=threads)
+        print(f"Потоков на задачу: {profile.threads}, задач одновременно: {profile.concurrency()}")
+        result = run_variant(script, profile, args.traces, args.timeout)
+        print(f"  {result['wall_sec']:.1f} с, {result['traces_per_hour']:.0f} трасс/ч")
+        results.append(result)
+
+    best = max(results, key=lambda r: r["traces_per_hour"])
+    print("\nПотоки  Задач  Время, с  Трасс/ч")
+    for r in results:
+        mark = " <-" if r is best else ""
+        print(f"{r['threads']:>6}  {r['concurrency']:>5}  {r['wall_sec']:>8.1f}  {r['traces_per_hour']:>7.0f}{mark}")
+    print(f"\nРекомендуется: GPRMAX_DEVICE={args.device} GPRMAX_OMP_THREADS={best['threads']} "
+          f"(concurrency воркера = {best['concurrency']})")
+
+
+if __name__ == "__main__":
+    main()
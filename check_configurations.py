@@ -7,21 +7,18 @@ sys.path.insert(0, str(Path(__file__).parent))
 from sqlalchemy import func
 from app.database import SessionLocal
 from app import models
+from app.statistics import collect
 
 def main():
     db = SessionLocal()
     try:
-        # Общая статистика
-        total_scripts = db.query(models.Script).count()
-        generated = db.query(models.Script).filter(
-            models.Script.status == "generated"
-        ).count()
-        completed = db.query(models.Script).filter(
-            models.Script.status == "completed"
-        ).count()
-        failed = db.query(models.Script).filter(
-            models.Script.status == "failed"
-        ).count()
+        # Общая статистика — одним запросом (app/statistics.py)
+        stats = collect(db)
+        by_status = stats["scripts"]["by_status"]
+        total_scripts = stats["scripts"]["total"]
+        generated = by_status.get("generated", 0)
+        completed = by_status.get("completed", 0)
+        failed = by_status.get("failed", 0)
         
         print("=" * 60)
         print(" Статистика скриптов в БД")
@@ -45,13 +42,13 @@ def main():
         
         # Группировка по глубинам
         print("\n Распределение по глубинам:")
-        scripts = db.query(models.Script).filter(
+        names = db.query(models.Script.name).filter(
             models.Script.name.like('sim_%')
         ).limit(1000).all()
         
         depth_count = {}
-        for script in scripts:
-            for part in script.name.split('_'):
+        for (name,) in names:
+            for part in name.split('_'):
                 if 'cm' in part:
                     depth = part.replace('cm', '')
                     depth_count[depth] = depth_count.get(depth, 0) + 1
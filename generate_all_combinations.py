@@ -1,7 +1,7 @@
 # generate_all_combinations.py
 import sys
+import argparse
 import itertools
-import time
 from pathlib import Path
 
 print("Скрипт запущен. Импорт модулей...")
@@ -18,54 +18,53 @@ try:
         SoilLayer, TargetObject
     )
     from app.gprmax_generator import generate_script
+    from app.catalog import CatalogSnapshot, load_catalog
+    from app.campaign import generate_campaign, DEFAULT_CHUNK_SIZE
     print("Импорты выполнены успешно.")
 except Exception as e:
     print(f"Ошибка импорта: {e}")
     sys.exit(1)
 
 
-def get_ids(db: Session):
-    """Получить id нужных сущностей из БД."""
-    print("Получение ID из БД...")
+def get_ids(catalog: CatalogSnapshot):
+    """Получить id нужных сущностей из снимка справочников."""
+    print("Получение ID из справочников...")
+
+    def soil(name):
+        return catalog.find_by_name("soil_types", name).id
+
+    def target(name):
+        return catalog.find_by_name("target_types", name).id
+
     soil_map = {
         "песок": {
-            0: db.query(models.SoilType).filter_by(name="песок_сухой").first().id,
-            40: db.query(models.SoilType).filter_by(name="песок_средний").first().id,
-            80: db.query(models.SoilType).filter_by(name="песок_влажный").first().id,
+            0: soil("песок_сухой"),
+            40: soil("песок_средний"),
+            80: soil("песок_влажный"),
         },
         "глина": {
-            0: db.query(models.SoilType).filter_by(name="глина_сухая").first().id,
-            40: db.query(models.SoilType).filter_by(name="глина_средняя").first().id,
-            80: db.query(models.SoilType).filter_by(name="глина_влажная").first().id,
+            0: soil("глина_сухая"),
+            40: soil("глина_средняя"),
+            80: soil("глина_влажная"),
         },
         "лёд": {
-            0: db.query(models.SoilType).filter_by(name="лёд_сухой").first().id,
-            40: db.query(models.SoilType).filter_by(name="лёд_средний").first().id,
-            80: db.query(models.SoilType).filter_by(name="лёд_влажный").first().id,
+            0: soil("лёд_сухой"),
+            40: soil("лёд_средний"),
+            80: soil("лёд_влажный"),
         },
     }
 
-    antenna_id = db.query(models.Antenna).filter_by(
-        name="PlastRam (1 sect)"
-    ).first().id
+    antenna_id = catalog.find_by_name("antennas", "PlastRam (1 sect)").id
 
-    pulse_id = db.query(models.PulseType).filter_by(
-        name="ricker_1.1GHz"
-    ).first().id
+    pulse_id = catalog.find_by_name("pulse_types", "ricker_1.1GHz").id
 
     target_types = {
-        ("disk", "металл"): db.query(models.TargetType).filter_by(
-            name="диск_металлический").first().id,
-        ("disk", "камень"): db.query(models.TargetType).filter_by(
-            name="диск_каменный").first().id,
-        ("disk", "пластик"): db.query(models.TargetType).filter_by(
-            name="диск_пластиковый").first().id,
-        ("box", "металл"): db.query(models.TargetType).filter_by(
-            name="брусок_металлический").first().id,
-        ("box", "камень"): db.query(models.TargetType).filter_by(
-            name="брусок_каменный").first().id,
-        ("box", "пластик"): db.query(models.TargetType).filter_by(
-            name="брусок_пластиковый").first().id,
+        ("disk", "металл"): target("диск_металлический"),
+        ("disk", "камень"): target("диск_каменный"),
+        ("disk", "пластик"): target("диск_пластиковый"),
+        ("box", "металл"): target("брусок_металлический"),
+        ("box", "камень"): target("брусок_каменный"),
+        ("box", "пластик"): target("брусок_пластиковый"),
     }
 
     return soil_map, antenna_id, pulse_id, target_types
@@ -73,7 +72,7 @@ def get_ids(db: Session):
 
 def build_config(soil_type_id, target_type_id, depth_m,
                  orientation_params, name_suffix, db,
-                 antenna_id, pulse_id):
+                 antenna_id, pulse_id, auto_sizing=False):
     domain_z = max(2.0, depth_m + 1.0)
     domain_size = Coordinate3D(x=1.4, y=0.5, z=domain_z)
     discret = Coordinate3D(x=0.005, y=0.005, z=0.005)
@@ -130,81 +129,109 @@ def build_config(soil_type_id, target_type_id, depth_m,
             save_intermediate=False
         ),
         soil_layers=[soil_layer],
-        targets=[target]
+        targets=[target],
+        custom_parameters={"auto_sizing": auto_sizing}
     )
     return config
 
 
+SOIL_TYPES = ["песок", "глина", "лёд"]
+HUMIDITIES = [0, 40, 80]
+DEPTHS = [0.0, 0.5, 1.0]
+MATERIALS = ["металл", "камень", "пластик"]
+SHAPES = ["disk", "box"]
+
+ORIENTATIONS = {
+    "disk": [
+        {"name": "flat", "rotation": (0, 0, 0)},
+        {"name": "tilt45", "rotation": (45, 0, 0)},
+        {"name": "on_edge", "rotation": (90, 0, 0)},
+        {"name": "edge_along", "rotation": (90, 0, 0), "mov_dir": "along"},
+        {"name": "edge_across", "rotation": (90, 0, 90), "mov_dir": "across"},
+        {"name": "edge_45deg", "rotation": (90, 0, 45), "mov_dir": "45deg"},
+    ],
+    "box": [
+        {"name": "flat", "rotation": (0, 0, 0)},
+        {"name": "on_edge", "rotation": (0, 90, 0)},
+        {"name": "on_end", "rotation": (90, 0, 0)},
+        {"name": "edge_along", "rotation": (0, 90, 0), "mov_dir": "along"},
+        {"name": "edge_across", "rotation": (0, 90, 90), "mov_dir": "across"},
+        {"name": "edge_45deg", "rotation": (0, 90, 45), "mov_dir": "45deg"},
+        {"name": "rot45_xy", "rotation": (45, 45, 0)},
+        {"name": "rot45_xz", "rotation": (45, 0, 45)},
+        {"name": "rot45_yz", "rotation": (0, 45, 45)},
+    ]
+}
+
+
+def count_combinations():
+    return sum(
+        len(ORIENTATIONS[shape])
+        for _, _, shape, _, _ in itertools.product(
+            SOIL_TYPES, HUMIDITIES, SHAPES, MATERIALS, DEPTHS)
+    )
+
+
+def iter_combinations(soil_map, antenna_id, pulse_id, target_types, auto_sizing=False):
+    """Комбинации в формате движка кампаний: (имя скрипта, аргументы build_config)."""
+    for soil_name, hum, shape, material, depth in itertools.product(
+            SOIL_TYPES, HUMIDITIES, SHAPES, MATERIALS, DEPTHS):
+        soil_id = soil_map[soil_name][hum]
+        target_id = target_types[(shape, material)]
+        for orient in ORIENTATIONS[shape]:
+            rot = Coordinate3D(x=orient["rotation"][0], y=orient["rotation"][1], z=orient["rotation"][2])
+            suffix = f"{soil_name}_{hum}pct_{shape}_{material}_d{depth*100:.0f}cm_{orient['name']}"
+            yield f"sim_{suffix}", {
+                "soil_type_id": soil_id,
+                "target_type_id": target_id,
+                "depth_m": depth,
+                "orientation_params": {"rotation": rot},
+                "name_suffix": suffix,
+                "db": None,
+                "antenna_id": antenna_id,
+                "pulse_id": pulse_id,
+                "auto_sizing": auto_sizing,
+            }
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Генерация скриптов для всех комбинаций")
+    parser.add_argument("--campaign", default="portraits_v1",
+                        help="имя кампании (повторный запуск продолжает прерванную генерацию)")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов рендера")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="размер пачки для записи в БД")
+    parser.add_argument("--auto-sizing", action="store_true",
+                        help="подбирать сетку, домен и временное окно по физике задачи")
+    args = parser.parse_args()
+
     print("\n=== Запуск генерации ===")
     db = SessionLocal()
     try:
-        soil_map, antenna_id, pulse_id, target_types = get_ids(db)
-
-        soil_types = ["песок", "глина", "лёд"]
-        humidities = [0, 40, 80]
-        depths = [0.0, 0.5, 1.0]
-        materials = ["металл", "камень", "пластик"]
-        shapes = ["disk", "box"]
-
-        orientations = {
-            "disk": [
-                {"name": "flat", "rotation": (0, 0, 0)},
-                {"name": "tilt45", "rotation": (45, 0, 0)},
-                {"name": "on_edge", "rotation": (90, 0, 0)},
-                {"name": "edge_along", "rotation": (90, 0, 0), "mov_dir": "along"},
-                {"name": "edge_across", "rotation": (90, 0, 90), "mov_dir": "across"},
-                {"name": "edge_45deg", "rotation": (90, 0, 45), "mov_dir": "45deg"},
-            ],
-            "box": [
-                {"name": "flat", "rotation": (0, 0, 0)},
-                {"name": "on_edge", "rotation": (0, 90, 0)},
-                {"name": "on_end", "rotation": (90, 0, 0)},
-                {"name": "edge_along", "rotation": (0, 90, 0), "mov_dir": "along"},
-                {"name": "edge_across", "rotation": (0, 90, 90), "mov_dir": "across"},
-                {"name": "edge_45deg", "rotation": (0, 90, 45), "mov_dir": "45deg"},
-                {"name": "rot45_xy", "rotation": (45, 45, 0)},
-                {"name": "rot45_xz", "rotation": (45, 0, 45)},
-                {"name": "rot45_yz", "rotation": (0, 45, 45)},
-            ]
-        }
-
-        total = 0
-        for soil_name, hum, shape, material, depth in itertools.product(
-                soil_types, humidities, shapes, materials, depths):
-            for orient in orientations[shape]:
-                total += 1
+        # Справочники читаются один раз на всю кампанию
+        catalog = load_catalog(db)
+        ids = get_ids(catalog)
 
+        total = count_combinations()
         print(f"Всего комбинаций: {total}")
-        saved = 0
-        for soil_name, hum, shape, material, depth in itertools.product(
-                soil_types, humidities, shapes, materials, depths):
-            soil_id = soil_map[soil_name][hum]
-            target_id = target_types[(shape, material)]
-            for orient in orientations[shape]:
-                rot = Coordinate3D(x=orient["rotation"][0], y=orient["rotation"][1], z=orient["rotation"][2])
-                suffix = f"{soil_name}_{hum}pct_{shape}_{material}_d{depth*100:.0f}cm_{orient['name']}"
-                try:
-                    config = build_config(soil_id, target_id, depth, {"rotation": rot}, suffix, db, antenna_id, pulse_id)
-                    script_content = generate_script(config, db)
-                    db_script = models.Script(
-                        name=config.name,
-                        description=config.description,
-                        config_json=config.model_dump(),
-                        script_content=script_content,
-                        status="generated"
-                    )
-                    db.add(db_script)
-                    db.commit()
-                    saved += 1
-                    print(f" {saved}/{total} - {suffix}")
-                except Exception as e:
-                    print(f" {suffix}: {e}")
-                    db.rollback()
-        print("Генерация завершена.")
+
+        report = generate_campaign(
+            db,
+            args.campaign,
+            iter_combinations(*ids, auto_sizing=args.auto_sizing),
+            build_config,
+            catalog,
+            total=total,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+        )
+        for name, error in report["errors"]:
+            print(f" {name}: {error}")
+        print(f"Генерация завершена: новых {report['saved']}, пропущено {report['skipped']}, "
+              f"ошибок {report['failed']} за {report['elapsed_sec']} с.")
     finally:
         db.close()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,10 +1,10 @@
 from fastapi import FastAPI
-from app.database import engine, Base
-from app import models
+from app.db_migrations import upgrade_database
 from app.api import router
 
 
-Base.metadata.create_all(bind=engine)
+# Схема БД и индексы — миграциями (migrations/)
+upgrade_database()
 
 app = FastAPI(
     title="GPR Database API",
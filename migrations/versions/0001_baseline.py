@@ -0,0 +1,162 @@
+"""Исходная схема — та, что создавал Base.metadata.create_all до появления миграций.
+
+Существующие базы без таблицы alembic_version помечаются этой ревизией
+без изменений (app/db_migrations.py), дальше применяются только новые.
+Колонки и таблицы, добавленные после, — в 0002.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('antennas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('frequency', sa.Float(), nullable=True),
+    sa.Column('manufacturer', sa.String(), nullable=True),
+    sa.Column('parameters', sa.JSON(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('antennas', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_antennas_id'), ['id'], unique=False)
+
+    op.create_table('materials',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('drawing', sa.Text(), nullable=True),
+    sa.Column('material_id', sa.Integer(), nullable=True),
+    sa.Column('parameters', sa.JSON(), nullable=True),
+    sa.ForeignKeyConstraint(['material_id'], ['materials.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('materials', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_materials_id'), ['id'], unique=False)
+
+    op.create_table('pulse_types',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('waveform', sa.String(), nullable=True),
+    sa.Column('parameters', sa.JSON(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('pulse_types', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_pulse_types_id'), ['id'], unique=False)
+
+    op.create_table('soil_types',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('parameters', sa.JSON(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    with op.batch_alter_table('soil_types', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_soil_types_id'), ['id'], unique=False)
+
+    op.create_table('soil_boundaries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('angle', sa.Float(), nullable=True),
+    sa.Column('roughness', sa.Float(), nullable=True),
+    sa.Column('humidity', sa.Float(), nullable=True),
+    sa.Column('soil_type_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['soil_type_id'], ['soil_types.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('soil_boundaries', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_soil_boundaries_id'), ['id'], unique=False)
+
+    op.create_table('target_types',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('shape', sa.String(), nullable=True),
+    sa.Column('drawing', sa.Text(), nullable=True),
+    sa.Column('material_id', sa.Integer(), nullable=True),
+    sa.Column('dimensions', sa.JSON(), nullable=True),
+    sa.ForeignKeyConstraint(['material_id'], ['materials.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('target_types', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_target_types_id'), ['id'], unique=False)
+
+    op.create_table('object_portraits',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('target_type_id', sa.Integer(), nullable=True),
+    sa.Column('soil_type_id', sa.Integer(), nullable=True),
+    sa.Column('antenna_id', sa.Integer(), nullable=True),
+    sa.Column('pulse_id', sa.Integer(), nullable=True),
+    sa.Column('simulation_params', sa.JSON(), nullable=True),
+    sa.Column('result_file_path', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['antenna_id'], ['antennas.id'], ),
+    sa.ForeignKeyConstraint(['pulse_id'], ['pulse_types.id'], ),
+    sa.ForeignKeyConstraint(['soil_type_id'], ['soil_types.id'], ),
+    sa.ForeignKeyConstraint(['target_type_id'], ['target_types.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('object_portraits', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_object_portraits_id'), ['id'], unique=False)
+
+    op.create_table('scripts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('config_json', sa.JSON(), nullable=False),
+    sa.Column('script_content', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('celery_task_id', sa.String(), nullable=True),
+    sa.Column('result_portrait_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['result_portrait_id'], ['object_portraits.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('scripts', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_scripts_id'), ['id'], unique=False)
+
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('scripts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_scripts_id'))
+
+    op.drop_table('scripts')
+    with op.batch_alter_table('object_portraits', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_object_portraits_id'))
+
+    op.drop_table('object_portraits')
+    with op.batch_alter_table('target_types', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_target_types_id'))
+
+    op.drop_table('target_types')
+    with op.batch_alter_table('soil_boundaries', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_soil_boundaries_id'))
+
+    op.drop_table('soil_boundaries')
+    with op.batch_alter_table('soil_types', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_soil_types_id'))
+
+    op.drop_table('soil_types')
+    with op.batch_alter_table('pulse_types', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_pulse_types_id'))
+
+    op.drop_table('pulse_types')
+    with op.batch_alter_table('materials', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_materials_id'))
+
+    op.drop_table('materials')
+    with op.batch_alter_table('antennas', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_antennas_id'))
+
+    op.drop_table('antennas')
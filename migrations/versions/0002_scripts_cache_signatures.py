@@ -0,0 +1,88 @@
+"""Колонки scripts и таблица portrait_signatures, добавленные после исходной схемы.
+
+scripts: кампания и уникальность (campaign, name), кэш результатов
+(content_hash, solver_version, result_source_id, runtime_sec), прогресс
+решателя, степень упаковки результатов, размер сетки и число итераций.
+portrait_signatures: сигнатуры B-сканов для поиска портретов по сигналу.
+
+Базы, созданные через create_all уже после появления части колонок, тоже
+помечаются ревизией 0001 — поэтому добавляется только то, чего ещё нет.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SCRIPT_COLUMNS = [
+    sa.Column('campaign', sa.String(), nullable=True),
+    sa.Column('content_hash', sa.String(length=64), nullable=True),
+    sa.Column('solver_version', sa.String(), nullable=True),
+    sa.Column('result_source_id', sa.Integer(), nullable=True),
+    sa.Column('runtime_sec', sa.Float(), nullable=True),
+    sa.Column('progress', sa.Float(), nullable=True),
+    sa.Column('progress_eta_sec', sa.Float(), nullable=True),
+    sa.Column('compression_ratio', sa.Float(), nullable=True),
+    sa.Column('cell_count', sa.BigInteger(), nullable=True),
+    sa.Column('iteration_count', sa.Integer(), nullable=True),
+]
+
+RESULT_SOURCE_FK = 'fk_scripts_result_source_id_scripts'
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns = {c['name'] for c in inspector.get_columns('scripts')}
+    indexes = {i['name'] for i in inspector.get_indexes('scripts')}
+    uniques = {u['name'] for u in inspector.get_unique_constraints('scripts')}
+    has_source_fk = any(fk['constrained_columns'] == ['result_source_id']
+                        for fk in inspector.get_foreign_keys('scripts'))
+
+    with op.batch_alter_table('scripts', schema=None) as batch_op:
+        for column in SCRIPT_COLUMNS:
+            if column.name not in columns:
+                batch_op.add_column(column.copy())
+        if not has_source_fk:
+            batch_op.create_foreign_key(RESULT_SOURCE_FK, 'scripts', ['result_source_id'], ['id'])
+        if 'uq_scripts_campaign_name' not in uniques:
+            batch_op.create_unique_constraint('uq_scripts_campaign_name', ['campaign', 'name'])
+        if 'ix_scripts_content_hash' not in indexes:
+            batch_op.create_index(batch_op.f('ix_scripts_content_hash'), ['content_hash'], unique=False)
+
+    if not inspector.has_table('portrait_signatures'):
+        op.create_table('portrait_signatures',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('portrait_id', sa.Integer(), nullable=False),
+        sa.Column('signature_version', sa.Integer(), nullable=False),
+        sa.Column('vector', sa.LargeBinary(), nullable=False),
+        sa.Column('source_file', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['portrait_id'], ['object_portraits.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('portrait_id')
+        )
+        with op.batch_alter_table('portrait_signatures', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_portrait_signatures_id'), ['id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('portrait_signatures', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_portrait_signatures_id'))
+
+    op.drop_table('portrait_signatures')
+    with op.batch_alter_table('scripts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_scripts_content_hash'))
+        batch_op.drop_constraint('uq_scripts_campaign_name', type_='unique')
+        batch_op.drop_constraint(RESULT_SOURCE_FK, type_='foreignkey')
+        for column in reversed(SCRIPT_COLUMNS):
+            batch_op.drop_column(column.name)
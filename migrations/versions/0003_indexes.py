@@ -0,0 +1,55 @@
+"""Индексы для фильтров скриптов и портретов.
+
+scripts: статус с id (фильтр + пагинация по ключу), частичный индекс по
+незавершённым статусам, префикс имени, дата создания, внешние ключи.
+object_portraits: набор из четырёх внешних ключей и каждый ключ с id.
+На PostgreSQL индексы строятся CONCURRENTLY — без блокировки записи в таблицу.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE_FILTER = sa.text("status IN ('generated', 'pending', 'running', 'waiting')")
+
+INDEXES = [
+    ('ix_materials_material_id', 'materials', ['material_id'], {}),
+    ('ix_target_types_material_id', 'target_types', ['material_id'], {}),
+    ('ix_soil_boundaries_soil_type_id', 'soil_boundaries', ['soil_type_id'], {}),
+    ('ix_object_portraits_params', 'object_portraits', ['target_type_id', 'soil_type_id', 'antenna_id', 'pulse_id'], {}),
+    ('ix_object_portraits_target_type_id_id', 'object_portraits', ['target_type_id', 'id'], {}),
+    ('ix_object_portraits_soil_type_id_id', 'object_portraits', ['soil_type_id', 'id'], {}),
+    ('ix_object_portraits_antenna_id_id', 'object_portraits', ['antenna_id', 'id'], {}),
+    ('ix_object_portraits_pulse_id_id', 'object_portraits', ['pulse_id', 'id'], {}),
+    ('ix_scripts_status_id', 'scripts', ['status', 'id'], {}),
+    ('ix_scripts_active', 'scripts', ['status', 'content_hash'],
+     {'postgresql_where': ACTIVE_FILTER, 'sqlite_where': ACTIVE_FILTER}),
+    ('ix_scripts_name', 'scripts', ['name'], {'postgresql_ops': {'name': 'text_pattern_ops'}}),
+    ('ix_scripts_created_at', 'scripts', ['created_at'], {}),
+    ('ix_scripts_result_portrait_id', 'scripts', ['result_portrait_id'], {}),
+    ('ix_scripts_result_source_id', 'scripts', ['result_source_id'], {}),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, **options)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,113 @@
+"""Индексы поиска по каталогу (app/search.py).
+
+PostgreSQL: pg_trgm — GIN-индексы триграмм для ILIKE '%q%' и GIN-индексы
+tsvector ('simple') по тексту грунтов, материалов и типов целей.
+SQLite: таблица FTS5 search_fts (токенизатор trigram, нужен SQLite 3.34+),
+которую поддерживают триггеры на soil_types, materials и target_types.
+Обе БД: индексы по выражениям epsilon/sigma из parameters грунтов и материалов
+(на PostgreSQL нечисловые значения индексируются как NULL).
+Выражения должны совпадать с app/search.py (SEARCH_TEXT, param_expr).
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARAMETERS = ('epsilon', 'sigma')
+PARAMETER_TABLES = ('soil_types', 'materials')
+
+# Таблица -> (код в rowid search_fts, текст записи через NEW./OLD.)
+SEARCH_TEXT = {
+    'soil_types': (1, "{row}.name || ' ' || coalesce({row}.description, '')"),
+    'materials': (2, "{row}.name"),
+    'target_types': (3, "{row}.name || ' ' || coalesce({row}.shape, '')"),
+}
+FTS_ROWID_STRIDE = 8
+
+
+def _pg_param(table, key):
+    # parameters — свободный JSON: без проверки типа нечисловое значение
+    # ("4-6") ломало бы построение индекса и каждую запись такой строки
+    return (f"(CASE WHEN json_typeof({table}.parameters -> '{key}') = 'number' "
+            f"THEN CAST({table}.parameters ->> '{key}' AS DOUBLE PRECISION) END)")
+
+
+def _sqlite_param(key):
+    # SQLite не допускает имя таблицы в выражении индекса; запрос с
+    # table.parameters при этом индекс использует
+    return f"json_extract(parameters, '$.{key}')"
+
+
+def _upgrade_postgresql():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        for table, (_, document) in SEARCH_TEXT.items():
+            document = document.format(row=table)
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_search_{table}_trgm "
+                       f"ON {table} USING gin (({document}) gin_trgm_ops)")
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_search_{table}_tsv "
+                       f"ON {table} USING gin (to_tsvector('simple', {document}))")
+        for table in PARAMETER_TABLES:
+            for key in PARAMETERS:
+                # Индекс, оставшийся INVALID после прерванного запуска или построенный
+                # по другому выражению, пересоздаётся (таблицы справочников небольшие)
+                op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS ix_search_{table}_{key}")
+                op.execute(f"CREATE INDEX CONCURRENTLY ix_search_{table}_{key} "
+                           f"ON {table} ({_pg_param(table, key)})")
+
+
+def _upgrade_sqlite():
+    # DDL в SQLite здесь не откатывается при ошибке — повторный запуск миграции
+    # должен доделать то, что не создалось
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(body, tokenize='trigram')")
+    for table, (code, document) in SEARCH_TEXT.items():
+        rowid = f"{{row}}.id * {FTS_ROWID_STRIDE} + {code}"
+        insert = (f"INSERT INTO search_fts (rowid, body) "
+                  f"VALUES ({rowid.format(row='NEW')}, {document.format(row='NEW')});")
+        delete = f"DELETE FROM search_fts WHERE rowid = {rowid.format(row='OLD')};"
+        op.execute(f"CREATE TRIGGER IF NOT EXISTS search_fts_{table}_insert AFTER INSERT ON {table} BEGIN {insert} END")
+        op.execute(f"CREATE TRIGGER IF NOT EXISTS search_fts_{table}_update AFTER UPDATE ON {table} BEGIN {delete} {insert} END")
+        op.execute(f"CREATE TRIGGER IF NOT EXISTS search_fts_{table}_delete AFTER DELETE ON {table} BEGIN {delete} END")
+        op.execute(f"INSERT OR REPLACE INTO search_fts (rowid, body) "
+                   f"SELECT {rowid.format(row=table)}, {document.format(row=table)} FROM {table}")
+    for table in PARAMETER_TABLES:
+        for key in PARAMETERS:
+            op.execute(f"CREATE INDEX IF NOT EXISTS ix_search_{table}_{key} ON {table} ({_sqlite_param(key)})")
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        _upgrade_postgresql()
+    elif dialect == 'sqlite':
+        _upgrade_sqlite()
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        with op.get_context().autocommit_block():
+            for table in PARAMETER_TABLES:
+                for key in PARAMETERS:
+                    op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS ix_search_{table}_{key}")
+            for table in SEARCH_TEXT:
+                op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS ix_search_{table}_tsv")
+                op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS ix_search_{table}_trgm")
+    elif dialect == 'sqlite':
+        for table in PARAMETER_TABLES:
+            for key in PARAMETERS:
+                op.execute(f"DROP INDEX IF EXISTS ix_search_{table}_{key}")
+        for table in SEARCH_TEXT:
+            for event in ('insert', 'update', 'delete'):
+                op.execute(f"DROP TRIGGER IF EXISTS search_fts_{table}_{event}")
+        op.execute("DROP TABLE IF EXISTS search_fts")
@@ -31,12 +31,18 @@ if tables:
         else:
             # Для других БД (SQLite, MySQL)
             Base.metadata.drop_all(bind=engine)
+            # Версия схемы тоже сбрасывается, иначе миграции посчитают БД актуальной
+            conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+            # Таблица полнотекстового поиска (миграция 0005) не описана в моделях
+            conn.execute(text("DROP TABLE IF EXISTS search_fts"))
+            conn.commit()
             print("✓ Таблицы удалены через SQLAlchemy")
 else:
     print("ℹ️  Таблиц не найдено, создаем новые...")
 
-# Создаем таблицы заново
-Base.metadata.create_all(bind=engine)
+# Создаем таблицы заново — всеми миграциями (migrations/)
+from app.db_migrations import upgrade_database
+upgrade_database()
 print("✓ Таблицы созданы заново")
 
 # Заполняем начальными данными
@@ -1,31 +1,26 @@
 # run_all_simulations.py
 import requests
 import time
-from concurrent.futures import ThreadPoolExecutor
 
 API_URL = "http://localhost:8000/simulate"
-TOTAL_SCRIPTS = 1215        # общее количество сгенерированных скриптов
-SEND_WORKERS = 20           # количество одновременных HTTP‑запросов (не путать с Celery concurrency)
-
-def send_task(script_id):
-    try:
-        resp = requests.post(f"{API_URL}/{script_id}", timeout=5)
-        if resp.status_code == 200:
-            data = resp.json()
-            print(f"✅ {script_id:4d} -> task {data['task_id'][:8]}...")
-        else:
-            print(f"❌ {script_id:4d} -> HTTP {resp.status_code}: {resp.text[:50]}")
-    except Exception as e:
-        print(f"⚠️ {script_id:4d} -> {e}")
+CAMPAIGN = "portraits_v1"   # кампания из generate_all_combinations.py
 
 def main():
-    print(f"🚀 Отправка {TOTAL_SCRIPTS} задач в Celery...")
+    # Один пакетный запрос: сервер сам упорядочит задачи по оценке стоимости
+    # (самые долгие первыми) и распределит их по очередям gprmax_heavy / gprmax_light
+    print(f"🚀 Отправка кампании {CAMPAIGN} в Celery...")
     start = time.time()
-    with ThreadPoolExecutor(max_workers=SEND_WORKERS) as executor:
-        executor.map(send_task, range(1, TOTAL_SCRIPTS + 1))
+    resp = requests.post(f"{API_URL}/batch", json={"campaign": CAMPAIGN}, timeout=600)
+    if resp.status_code != 200:
+        print(f"❌ HTTP {resp.status_code}: {resp.text[:200]}")
+        return
+    data = resp.json()
     elapsed = time.time() - start
-    print(f"\n✅ Все задачи отправлены за {elapsed:.1f} сек.")
-    print("📊 Проверить очередь: redis-cli LLEN celery")
+    print(f"\n✅ Отправлено задач: {data['submitted']}, взято из кэша: {data['cached']} за {elapsed:.1f} сек.")
+    for queue, count in data["queues"].items():
+        print(f"   • {queue}: {count}")
+    print(f"⏱  Оценка суммарного времени решателя: {data['estimated_runtime_hours']} ч")
+    print("📊 Проверить очереди: redis-cli LLEN gprmax_heavy; redis-cli LLEN gprmax_light")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()